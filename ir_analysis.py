@@ -0,0 +1,161 @@
+import argparse
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional
+
+from ir_metrics import metrics
+
+TOKENIZERS = ('nltk', 'regex')
+LEMMATIZERS = ('wordnet', 'none')
+
+DEFAULT_CACHE_SIZE = 200_000
+
+# Local NLTK data, searched before nltk's default locations. Nothing is downloaded implicitly;
+# fill it once (or vendor it) with: python ir_analysis.py --download
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+
+# NLTK resources, by the analysis step that needs them
+_NLTK_RESOURCES = {'stopwords': ('stopwords',), 'tokenizer': ('punkt', 'punkt_tab'), 'wordnet': ('wordnet',)}
+
+# Runs of letters; a fast stand-in for nltk.word_tokenize followed by isalpha().
+# Clitics after an apostrophe ("google's", "we'll") are dropped as word_tokenize would.
+_WORD_RE = re.compile(r"(?<!['\u2019])[^\W\d_]+")
+
+_nltk = None
+
+
+# Function to import nltk on first use (it takes longer to import than the rest of the
+# package together) with the local data directory first on its search path
+def _import_nltk():
+    global _nltk
+    if _nltk is None:
+        with metrics.stage('nltk_import'):
+            import nltk
+        if NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+        _nltk = nltk
+    return _nltk
+
+
+# Function to explain how to install the NLTK data an analysis step is missing
+def _missing(step: str) -> LookupError:
+    return LookupError(f"NLTK data not installed: {', '.join(_NLTK_RESOURCES[step])}; "
+                       f"fetch it once with 'python ir_analysis.py --download' (into {NLTK_DATA_DIR})")
+
+
+# Text analysis pipeline shared by indexing and querying:
+# case folding -> tokenization -> alphabetic filter -> stopword removal -> lemmatization.
+# The stopword set and lemmatizer are loaded once, on first use, and lemmas are
+# memoized per surface form in a bounded LRU cache (Zipf's law keeps hit rates high).
+# WordNet is only loaded when the lemmatizer is 'wordnet', and the Punkt models only
+# when the tokenizer is 'nltk'.
+class Analyzer:
+    def __init__(self, lemma_pos: str = 'n', tokenizer: str = 'nltk', cache_size: int = DEFAULT_CACHE_SIZE,
+                 lemmatizer: str = 'wordnet'):
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"unknown tokenizer {tokenizer!r}, expected one of {TOKENIZERS}")
+        if lemmatizer not in LEMMATIZERS:
+            raise ValueError(f"unknown lemmatizer {lemmatizer!r}, expected one of {LEMMATIZERS}")
+        self.lemma_pos = lemma_pos
+        self.tokenizer = tokenizer
+        self.lemmatizer = lemmatizer
+        self.cache_size = cache_size
+        self._stop_words = None
+        self._lemmatizer = None
+        self._normalize = lru_cache(maxsize=cache_size)(self._normalize_token)
+
+    # Identifies the analysis configuration; stored with an index so a change forces a rebuild
+    @property
+    def tag(self) -> str:
+        return f"{self.tokenizer}-{self.lemmatizer}-{self.lemma_pos}"
+
+    def _load(self):
+        nltk = _import_nltk()
+        with metrics.stage('stopwords_load'):
+            try:
+                stop_words = frozenset(nltk.corpus.stopwords.words('english'))
+            except LookupError:
+                raise _missing('stopwords') from None
+        if self.lemmatizer == 'wordnet':
+            with metrics.stage('wordnet_load'):
+                try:
+                    nltk.corpus.wordnet.ensure_loaded()
+                except LookupError:
+                    raise _missing('wordnet') from None
+                self._lemmatizer = nltk.stem.WordNetLemmatizer()
+        self._stop_words = stop_words
+
+    # Function to map one lowercase alphabetic token to its lemma, or None for stopwords
+    def _normalize_token(self, token: str) -> Optional[str]:
+        if self._stop_words is None:
+            self._load()
+        if token in self._stop_words:
+            return None
+        if self._lemmatizer is None:
+            return token
+        return self._lemmatizer.lemmatize(token, pos=self.lemma_pos)
+
+    def tokenize(self, text: str) -> List[str]:
+        text = text.lower()
+        if self.tokenizer == 'regex':
+            return _WORD_RE.findall(text)
+        try:
+            tokens = _import_nltk().word_tokenize(text)
+        except LookupError:
+            raise _missing('tokenizer') from None
+        return [word for word in tokens if word.isalpha()]
+
+    def analyze(self, text: str) -> List[str]:
+        normalize = self._normalize
+        words = []
+        for token in self.tokenize(text):
+            lemma = normalize(token)
+            if lemma is not None:
+                words.append(lemma)
+        return words
+
+    # Function to analyze a stream of documents, reusing the loaded resources and cache
+    def analyze_many(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        analyze = self.analyze
+        for text in texts:
+            yield analyze(text)
+
+    def cache_info(self):
+        return self._normalize.cache_info()
+
+    def clear_cache(self):
+        self._normalize.cache_clear()
+
+    # Pickle only the configuration; worker processes rebuild resources and cache lazily
+    def __getstate__(self):
+        return {'lemma_pos': self.lemma_pos, 'tokenizer': self.tokenizer, 'cache_size': self.cache_size,
+                'lemmatizer': self.lemmatizer}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+# Function to download the NLTK data the analyzers need into a local directory
+def download_nltk_data(directory: str = NLTK_DATA_DIR, steps: Iterable[str] = tuple(_NLTK_RESOURCES)):
+    nltk = _import_nltk()
+    for step in steps:
+        for resource in _NLTK_RESOURCES[step]:
+            if not nltk.download(resource, download_dir=directory, quiet=True):
+                raise OSError(f"could not download NLTK resource {resource!r}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Manage the NLTK data used by the text analyzers")
+    parser.add_argument('--download', action='store_true', help="download the stopwords, Punkt and WordNet data")
+    parser.add_argument('--dir', default=NLTK_DATA_DIR, help="data directory (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.download:
+        download_nltk_data(args.dir)
+        print(f"NLTK data saved in {args.dir}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
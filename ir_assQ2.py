@@ -1,274 +1,304 @@
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
 from collections import defaultdict, namedtuple
-from typing import List, Dict, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+import argparse
+import json
 import os
-import zipfile
-
-# Download necessary NLTK data
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('wordnet')
+import time
+
+from ir_analysis import LEMMATIZERS, TOKENIZERS, Analyzer
+from ir_cache import QueryCache
+from ir_corpus import iter_corpus
+from ir_dictionary import BiwordIndex, TermIds, pack_pair
+from ir_metrics import PROFILERS, format_record, metrics, profile, startup_report
+from ir_parallel import DEFAULT_MEMORY_BUDGET, parse_size, write_index_parallel
+from ir_phonetic import PHONETIC_ENCODERS, PhoneticIndex, phonetic_index_for, soundex
+from ir_positional import candidate_docs, near_search, phrase_search
+from ir_postings import PositionalPostingList, PostingList, compress_index, compress_positional_index
+from ir_query import QueryEvaluator, QuerySyntaxError, all_doc_ids, compile_query, known_doc_count
+from ir_ranking import DEFAULT_TOP_K, GlobalStats, ScoredDoc, top_k
+from ir_storage import DocumentStore, load_or_build_document_store, load_or_build_index, save_index
+from ir_terms import expand_postings, parse_expansion
 
 # Define a named tuple to store document metadata (name and content)
 Document = namedtuple('Document', ['name', 'content'])
 
-# Initialize the lemmatizer
-lemmatizer = WordNetLemmatizer()
+# Shared analyzer: documents and query terms are normalized by the same instance.
+# Verb lemmatization handles words like 'searching'.
+analyzer = Analyzer(lemma_pos='v')
+# Results of repeated queries and sub-expressions; emptied when the index changes
+query_cache = QueryCache()
 
 # Preprocessing function
 def preprocess(text: str) -> List[str]:
-    text = text.lower()
-    words = nltk.word_tokenize(text)
-    words = [word for word in words if word.isalpha()]
-    stop_words = set(stopwords.words('english'))
-    words = [word for word in words if word not in stop_words]
-    lemmatizer = WordNetLemmatizer()
-    words = [lemmatizer.lemmatize(word, pos='v') for word in words]  # Verb lemmatization to handle words like 'searching'
-    return words
-
-# Function to build the inverted index and biword index
-def build_inverted_index(docs: Dict[int, Document]) -> Tuple[Dict[str, Dict[int, List[int]]], Dict[str, Set[int]]]:
-    inverted_index = defaultdict(lambda: defaultdict(list))
-    biword_index = defaultdict(set)
-
-    for doc_id, document in docs.items():
-        words = preprocess(document.content)
-        for pos, word in enumerate(words):
-            inverted_index[word][doc_id].append(pos)
-            if pos < len(words) - 1:
-                biword = f"{word} {words[pos + 1]}"
-                biword_index[biword].add(doc_id)
-
-    return inverted_index, biword_index
-
-# Function to handle proximity queries
-def proximity_search(word1: str, word2: str, max_distance: int, inverted_index: Dict[str, Dict[int, List[int]]]) -> Set[int]:
-    docs_word1 = inverted_index.get(word1, {})
-    docs_word2 = inverted_index.get(word2, {})
-
-    result_docs = set()
-
-    for doc_id in docs_word1:
-        if doc_id in docs_word2:
-            positions_word1 = docs_word1[doc_id]
-            positions_word2 = docs_word2[doc_id]
-
-            for pos1 in positions_word1:
-                for pos2 in positions_word2:
-                    if abs(pos1 - pos2) <= max_distance:
-                        result_docs.add(doc_id)
-                        break
-
-    return result_docs
-
-# Function to handle Soundex matching
-def soundex(name: str) -> str:
-    name = name.upper()
-    code = {'A': '', 'E': '', 'I': '', 'O': '', 'U': '', 'H': '', 'W': '', 'Y': '',
-            'B': '1', 'F': '1', 'P': '1', 'V': '1',
-            'C': '2', 'G': '2', 'J': '2', 'K': '2', 'Q': '2', 'S': '2', 'X': '2', 'Z': '2',
-            'D': '3', 'T': '3',
-            'L': '4',
-            'M': '5', 'N': '5',
-            'R': '6'}
-    result = name[0]
-    prev_code = code.get(name[0], '')
-
-    for char in name[1:]:
-        new_code = code.get(char, '')
-        if new_code and new_code != prev_code:
-            result += new_code
-        prev_code = new_code
-
-    result = result[:4].ljust(4, '0')
-    return result
+    return analyzer.analyze(text)
+
+# Function to build the inverted index and biword index.
+# Accepts a {doc_id: Document} dict or a stream of (doc_id, content) pairs.
+# Terms are interned to integer IDs as they are seen, so positions are collected per ID and
+# biwords are keyed by packed ID pairs rather than a new "word1 word2" string per position.
+def build_inverted_index(docs: Union[Dict[int, Document], Iterable[Tuple[int, str]]]) -> Tuple[Dict[str, PositionalPostingList], BiwordIndex]:
+    term_ids = TermIds()
+    positions: List[Dict[int, List[int]]] = []
+    biword_docs = defaultdict(list)
+
+    if isinstance(docs, dict):
+        docs = ((doc_id, document.content) for doc_id, document in docs.items())
+    for doc_id, content in docs:
+        with metrics.stage('preprocess'):
+            words = analyzer.analyze(content)
+        metrics.count('documents_indexed')
+        metrics.count('tokens_indexed', len(words))
+        ids = term_ids.add_all(words)
+        while len(positions) < len(term_ids):
+            positions.append(defaultdict(list))
+        for pos, term_id in enumerate(ids):
+            positions[term_id][doc_id].append(pos)
+        for pair in set(map(pack_pair, ids, ids[1:])):
+            biword_docs[pair].append(doc_id)
+
+    # Freeze into compressed, sorted posting lists
+    inverted_index = compress_positional_index(dict(zip(term_ids.terms, positions)))
+    return inverted_index, BiwordIndex(term_ids, compress_index(biword_docs))
+
+# Function to map a query word to its index term (same preprocessing as the documents)
+def _query_term(word: str) -> str:
+    with metrics.stage('preprocess'):
+        words = preprocess(word)
+    return words[0] if words else ""
+
+# Function to get the documents of a query operand: a word, or a wildcard (goog*) or fuzzy (gogle~1)
+# term expanded through the term dictionary. Fuzzy words are preprocessed like the documents.
+def operand_postings(word: str, inverted_index: Dict[str, PositionalPostingList]) -> PostingList:
+    expansion = parse_expansion(word)
+    if expansion is None:
+        return inverted_index.get(_query_term(word), PostingList())
+    if expansion.kind == 'fuzzy':
+        expansion = expansion._replace(text=_query_term(expansion.text) or expansion.text)
+    return expand_postings(expansion, inverted_index)
+
+# Function to handle proximity queries: documents where both words occur within max_distance
+# positions of each other (in this order when `ordered`), using a linear merge of the positions
+def proximity_search(word1: str, word2: str, max_distance: int, inverted_index: Dict[str, PositionalPostingList],
+                     ordered: bool = False) -> PostingList:
+    terms = [_query_term(word1), _query_term(word2)]
+    if not all(terms):
+        return PostingList()
+    return near_search(terms, inverted_index, max_distance, ordered)
+
+# Function to handle boolean queries over the positional index, including NEAR/k and ONEAR/k operands
+def boolean_search(query: str, inverted_index: Dict[str, PositionalPostingList],
+                   cache: Optional[QueryCache] = query_cache) -> PostingList:
+    if cache is not None and not cache.validate(inverted_index):
+        cache = None
+    evaluator = QueryEvaluator(lambda word: operand_postings(word, inverted_index),
+                               lambda: all_doc_ids(inverted_index), cache,
+                               lambda: known_doc_count(inverted_index))
+    return evaluator.evaluate(compile_query(query))
 
 # Modified soundex_search function to return both document IDs and matching words
-def soundex_search_single(name: str, inverted_index: Dict[str, Dict[int, List[int]]]) -> Set[int]:
-    name_code = soundex(name)
-    result_docs = set()
-
-    for word, docs in inverted_index.items():
-        if soundex(word) == name_code:
-            result_docs.update(docs.keys())
-
-    return result_docs
+# Phonetic codes come from a precomputed PhoneticIndex (built once per index) instead of a vocabulary scan
+def soundex_search_single(name: str, inverted_index: Dict[str, Dict[int, List[int]]],
+                          phonetic_index: Optional[PhoneticIndex] = None) -> PostingList:
+    if phonetic_index is None:
+        phonetic_index = phonetic_index_for(inverted_index)
+    return phonetic_index.lookup(name)
 
 # Function to handle Soundex search with Boolean operators (AND, OR, NOT)
-def soundex_boolean_search(query: str, inverted_index: Dict[str, Dict[int, List[int]]]) -> Set[int]:
+def soundex_boolean_search(query: str, inverted_index: Dict[str, Dict[int, List[int]]],
+                           phonetic_index: Optional[PhoneticIndex] = None,
+                           cache: Optional[QueryCache] = query_cache) -> PostingList:
+    if phonetic_index is None:
+        phonetic_index = phonetic_index_for(inverted_index)
     query = query.lower()
     words = query.split()
 
-    # Separate operators and words
-    terms = []
-    operators = []
-    i = 0
-    while i < len(words):
-        if words[i] in {"and", "or", "not"}:
-            operators.append(words[i])
-        else:
-            terms.append(words[i])
-        i += 1
-
-    # Evaluate the first term
-    if terms:
-        result_docs = soundex_search_single(terms[0], inverted_index)
-    else:
-        return set()  # No terms to search
-
-    # Process the rest of the terms and operators
-    for idx, operator in enumerate(operators):
-        next_term_docs = soundex_search_single(terms[idx + 1], inverted_index)
-
-        if operator == "and":
-            result_docs &= next_term_docs  # Intersection of sets for AND
+    # Repeated queries are answered from the cache
+    key = ('soundex', phonetic_index.encoder, tuple(words))
+    if cache is not None and not cache.validate(inverted_index):
+        cache = None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    # Left to right: "and" / "or" combine with the result so far, "not" between two names is a
+    # difference, and "not" at the start or after another operator complements the next name
+    # against every live document (a bitmap operation for dense posting lists)
+    result_docs = None
+    operator = None
+    negate = False
+    for word in words:
+        if word == "not" and (result_docs is None or operator is not None):
+            negate = not negate
+            continue
+        if word in {"and", "or", "not"}:
+            operator = word
+            continue
+        # Wildcard and fuzzy names match the terms they expand to instead of a phonetic code
+        expansion = parse_expansion(word)
+        term_docs = phonetic_index.lookup(word) if expansion is None else operand_postings(word, inverted_index)
+        if negate and result_docs is not None and operator in (None, "and"):
+            operator = "not"  # "a and not b" is a difference, no complement needed
+        elif negate:
+            term_docs = all_doc_ids(inverted_index) - term_docs
+        negate = False
+
+        if result_docs is None:
+            result_docs = term_docs
         elif operator == "or":
-            result_docs |= next_term_docs  # Union of sets for OR
+            result_docs = result_docs | term_docs  # Union of sets for OR
         elif operator == "not":
-            result_docs -= next_term_docs  # Difference of sets for NOT
+            result_docs = result_docs - term_docs  # Difference of sets for NOT
+        else:
+            result_docs = result_docs & term_docs  # Intersection of sets for AND
+        operator = None
+
+    if result_docs is None:
+        return PostingList()  # No terms to search
 
+    if cache is not None:
+        cache.put(key, result_docs)
     return result_docs
 
-# Function to handle biword queries with sequence validation
-def biword_search(phrase: str, biword_index: Dict[str, Set[int]], docs: Dict[int, Document]) -> Dict[int, str]:
+# Function to rank documents for a free-text query with BM25 and return the k best,
+# optionally keeping only the documents that match a boolean query
+def ranked_search(query: str, inverted_index: Dict[str, PositionalPostingList], k: int = DEFAULT_TOP_K,
+                  boolean_filter: Optional[str] = None, global_stats: Optional[GlobalStats] = None) -> List[ScoredDoc]:
+    doc_filter = boolean_search(boolean_filter, inverted_index) if boolean_filter else None
+    return top_k(preprocess(query), inverted_index, k, doc_filter, global_stats=global_stats)
+
+# Function to find the documents containing a phrase, using the biword postings (when given) as a pre-filter
+def phrase_docs(phrase: str, inverted_index: Dict[str, PositionalPostingList],
+                biword_index: Optional[Dict[str, PostingList]] = None) -> PostingList:
     # Preprocess the input phrase
     words = preprocess(phrase)
 
-    if len(words) < 2:
-        print("Phrase is too short for biword search.")
+    candidates = None
+    if biword_index is not None and len(words) > 1:
+        # Construct biwords from the preprocessed words
+        biwords = {f"{words[i]} {words[i + 1]}" for i in range(len(words) - 1)}
+        candidates = candidate_docs(biwords, biword_index)
+    return phrase_search(words, inverted_index, candidates)
+
+# Function to handle exact phrase queries: biword postings (when given) pre-filter the candidates,
+# then a positional join over the inverted index verifies the phrase without reading any document
+def biword_search(phrase: str, biword_index: Optional[Dict[str, PostingList]],
+                  docs: Union[DocumentStore, Dict[int, Document]], inverted_index: Dict[str, PositionalPostingList]) -> Dict[int, str]:
+    if not preprocess(phrase):
+        print("Phrase has no searchable words.")
         return {}
 
-    # Construct biwords from the preprocessed words
-    biwords = [f"{words[i]} {words[i + 1]}" for i in range(len(words) - 1)]
-
-    # Find the initial set of documents matching the first biword
-    result_docs = set(biword_index.get(biwords[0], set()))
-
-    for biword in biwords[1:]:
-        result_docs &= biword_index.get(biword, set())
-
-    # Filter results to ensure all biwords appear in the exact order in the document
+    # Resolve names from the document store when available so document texts are not read
     valid_docs = {}
-    for doc_id in result_docs:
-        doc_content = preprocess(docs[doc_id].content)
-
-        doc_biwords = [f"{doc_content[i]} {doc_content[i + 1]}" for i in range(len(doc_content) - 1)]
-
-        # Check if biwords appear in sequence in the document
-        index = 0
-        for biword in biwords:
-            try:
-                index = doc_biwords.index(biword, index)
-            except ValueError:
-                break
-        else:
-            valid_docs[doc_id] = docs[doc_id].name
-
+    for doc_id in phrase_docs(phrase, inverted_index, biword_index):
+        valid_docs[doc_id] = docs.name(doc_id) if isinstance(docs, DocumentStore) else docs[doc_id].name
     return valid_docs
 
-# Extract the Corpus.zip file and load the documents
-def load_documents(zip_path: str, extract_to: str) -> Dict[int, Document]:
-    if not os.path.exists(extract_to):
-        os.makedirs(extract_to)
-
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
-
-    # Verify extraction
-    extracted_files = []
-    for root, dirs, files in os.walk(extract_to):
-        for file in files:
-            extracted_files.append(os.path.join(root, file))
-
-    # Load the documents
-    docs = {}
-    for i, file_path in enumerate(extracted_files):
-        if file_path.endswith('.txt'):
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read().strip()
-                if content:  # Only add non-empty files
-                    docs[i + 1] = Document(name=os.path.basename(file_path), content=content)
-
-    return docs
-
-def display_document(doc_id: int, docs: Dict[int, Document], file_id_mapping: Dict[int, str]):
-    doc = docs[doc_id]
-    lines = doc.content.split('\n')
-    first_two_lines = '\n'.join(lines[:2])
-    
-    # Get the file ID for the document
-    file_id = file_id_mapping.get(doc_id, None)
-    if file_id:
+# Function to stream non-empty documents out of the corpus (zip, tar or directory) without extracting it
+def iter_documents(corpus_path: str, doc_members: Optional[Dict[int, str]] = None) -> Iterator[Tuple[int, str]]:
+    for doc_id, name, content in iter_corpus(corpus_path):
+        content = content.strip()
+        if content:  # Only add non-empty files
+            if doc_members is not None:
+                doc_members[doc_id] = name
+            yield doc_id, content
+
+# Function to display a result: name, precomputed preview and Drive link, read from the document store
+def display_document(doc_id: int, docs: DocumentStore):
+    doc = docs.preview(doc_id)
+
+    # Get the Google Drive file ID stored with the document
+    if doc.drive_id:
         # Construct the Google Drive link for the individual file
-        link = f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
+        link = f"https://drive.google.com/file/d/{doc.drive_id}/view?usp=sharing"
     else:
         link = "Link not available"
-    
+
     print(f"  Document ID: {doc_id}")
     print(f"  Document Name: {doc.name}")
-    print(f"  Content Preview:\n{first_two_lines}")
+    print(f"  Content Preview:\n{doc.snippet}")
     print(f"  Link to Document: {link}")
     print("-" * 50)
 
 
-# Example mapping for file IDs
-file_id_mapping = {
-    1: '17gtGk9isJIjMOwJUhrvScWIkBeIivQvk', 
-    2: '1Bi7UM3yJfro4Tu3-g3fm5Y2XZ8YeZHg5', 
-    3: '1RDdQqOcbVrmzPYIDQ6R1t7QXWrvzI68P',
-    4: '1PRdJlT5wixJd_FTe3moFqTlHbanAo_5_',
-    5: '1EEjfP9vyh8uzq3-N-TF95i_T91ZOF1On', 
-    6: '1-zWgMQAwSOCsmQGYzkyAINNZdGZaG_9N',
-    7: '1iiaWgK1Ic8jxQCFTDoAJwfEPOCpBcHyb',
-    8: '1RHmqiyJN3dsr0eLJwZaN_7cqJf44u4mQ',
-    9: '10Iz3xS6CMbbkFkwDuENYEKoHrGh47WHZ',
-    10: '1i_XUVOQDZOvH21vVDAzPMFe3Db-60jIX',
-    11: '1Vyp9dRXbByFNjHUCWjx6IOT5fBSNSPSu',
-    12: '1SU3qe7WPduaiOWQiEWKjVgWWNJJG2P8l', #paypal
-    13: '1myzc16SQiItwv7Fu34xKPdzhEAg8WMf_', #ig
-    14: '1YdVx3j2U1QIUqjApzzu_7Vc0yhwdN4W0', #volkswagen
-    15: '1gym8q9fuilqyNOZ_MbdTriQKiF4fs21T', #hp
-    16: '1cfhbL9uugppmXFwqCtwpgvpbx7k8iQtC', #spotify
-    17: '1uRFepmUklcGoydXm7CNOCbyApWmyJ3zu', #uber
-    18: '1u32cxm6JkQXMttqcgpKtOaW9JF_io2HZ', #utube
-    19: '1jTtyGhZ5Nt0r5H5P4q9SCMM4EKNocFbq', #motorola
-    20: '1L8cqu31UdqfUlSl2BUPZm2WgcA7KWXhW', #yahoo
-    21: '1Yf9ypzXtV0GVRzSROA0Rf5lDlzEZdurG', #lenevo
-    22: '1q628g8gPoXhQwQophtXpa1EOfLTia6Yr', #dell
-    23: '1NXxLhKMWLjFZw-OHi2omCUHneE65MEKy', #levis
-    24: '1IKOAeE6R_lYM79KcCg1R69jaZqFESi4T', #whatsapp
-    25: '1eJefZuegIKYKtO_Ui6Ft613HjNy4gjNa', #bing
-    26: '1UM0HfKDquiYfQUYPM2w8zOhOodJ8mpXB', #hawai
-    27: '1W-hLebBkUgVqyvpPxrei8todpzcj2Zsf', #samsung
-    28: '1z8tNchwcY5fZpu9X5PTN_brt3TKn8jEA', #swiggy
-    29: '1M44nNmnO8tBORZJefBZDpsA4eRsAvK8u', #skype
-    30: '1Ow9GrppA1haCplAzpl8sQCwinar6Ynri', #messenger
-    31: '1c_wKzP_Kx9Sbu58ewhPSf8MyeX7C0OvK', #tele
-    32: '1FcptFYZQ7aLZYXl0kQXp5UluCXzLG-Q9', #steam
-    33: '1885pbtntJwW_FkqriJBi_3OP450H-4rA', #reliance
-    34: '1RAThPxqywa6QnsfOx7m1Ye12oD-FFb48', #canva
-    35: '1vd-v2IEBm3HEtCmQgEzlQTUixZrBFU-g', #puma
-    36: '1aeyAcBDBROKq0-oodl8ozOF_lKN0uQlV', #nokia
-    37: '1Mg_hDi642we5KCGW6ZL6flSiijWgXxLH', #reddit
-    38: '1Lg1DRlNH4JS2SMyysDMN60JyHWsi3Q6T', #sony
-    39: '1KWB-AIr2ThSdquUGLfKXf6V-6haWSWwV', #ola
-    40: '1gu9NXN9jW4Kr7O8XNaxfdtG7XVt3pG2V', #adobe
-    41: '1c9-7OnQuQo9ZuRzPRhSlqaDJUI57Cjbb', #blackberry
-
-}
-
-
-def main():
-    # Load documents from the Corpus.zip
-    zip_path = 'Corpus.zip'
-    extract_to = 'Corpus'
-    docs = load_documents(zip_path, extract_to)
-
-    # Build inverted index and biword index
-    inverted_index, biword_index = build_inverted_index(docs)
+# Function to load the persisted indexes of a corpus, rebuilding them only when the corpus changed
+def open_index(zip_path: str, index_path: Optional[str] = None, rebuild: bool = False, workers: int = 1,
+               memory_budget: int = DEFAULT_MEMORY_BUDGET):
+    index_path = index_path or f"{os.path.splitext(zip_path)[0]}.q2.idx"
+
+    def build(path, meta):
+        # Stream documents from the Corpus.zip into the inverted index and biword index
+        doc_members = {}
+        contents = iter_documents(zip_path, doc_members)
+        if workers > 1:
+            # Merged straight into the file: memory stays within the budget
+            write_index_parallel(path, contents, analyzer.analyze, doc_members, meta, workers, memory_budget,
+                                 spill_dir=os.path.dirname(os.path.abspath(path)))
+        else:
+            inverted_index, biword_index = build_inverted_index(contents)
+            with metrics.stage('index_save'):
+                save_index(path, inverted_index, doc_members, biword_index, meta=meta)
+
+    return load_or_build_index(index_path, zip_path, analyzer.tag, build, rebuild=rebuild)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Extended boolean retrieval over Corpus.zip")
+    parser.add_argument('--corpus', default='Corpus.zip', help="corpus to index: .zip, .tar(.gz) or a directory")
+    parser.add_argument('--index', default=None, help="on-disk index file (default: <corpus>.q2.idx)")
+    parser.add_argument('--rebuild', action='store_true', help="ignore the stored index and rebuild it")
+    parser.add_argument('--workers', type=int, default=1, help="processes used to build the index")
+    parser.add_argument('--memory-budget', type=parse_size, default=DEFAULT_MEMORY_BUDGET,
+                        help="partial-index memory before workers spill to disk, e.g. 512M")
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default=analyzer.tokenizer,
+                        help="nltk word_tokenize, or the faster regex tokenizer")
+    parser.add_argument('--lemmatizer', choices=LEMMATIZERS, default=analyzer.lemmatizer,
+                        help="WordNet lemmatization, or none (WordNet is then never loaded)")
+    parser.add_argument('--phonetic', choices=sorted(PHONETIC_ENCODERS), default='soundex',
+                        help="phonetic encoder used by the sound-alike searches")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help="documents shown by ranked search")
+    parser.add_argument('--metrics', action='store_true',
+                        help="print per-stage timings and counters after each search, and a summary on exit")
+    parser.add_argument('--profile', choices=PROFILERS, default=None,
+                        help="profile the index build and each search with cProfile or tracemalloc")
+    parser.add_argument('--profile-startup', nargs='?', const='google', default=None, metavar='QUERY',
+                        help="report where start-up time goes (imports, index loading, a first QUERY) and exit")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    analyzer.tokenizer = args.tokenizer
+    analyzer.lemmatizer = args.lemmatizer
+    if args.metrics or args.profile_startup is not None:
+        metrics.enable()
+
+    zip_path = args.corpus
+    with profile(args.profile) as profiled, metrics.query('index', zip_path) as record:
+        inverted_index = open_index(zip_path, args.index, args.rebuild, args.workers, args.memory_budget)
+    if record or profiled:
+        print(format_record(record, profiled))
+    biword_index = inverted_index.biword_index
+    # Phonetic code -> terms, computed on the first sound-alike search (not at start-up) and
+    # cached with the index, so later lookups skip the vocabulary scan
+    encoder = PHONETIC_ENCODERS[args.phonetic]
+    # Document texts, previews and Drive file IDs, memory-mapped from <corpus>.docs
+    with metrics.stage('docs_open'):
+        docs = load_or_build_document_store(f"{os.path.splitext(zip_path)[0]}.docs", zip_path, args.rebuild)
+
+    if args.profile_startup is not None:
+        try:
+            with metrics.stage('first_query'):
+                boolean_search(args.profile_startup, inverted_index)
+        except QuerySyntaxError as e:
+            parser.error(f"invalid --profile-startup query: {e}")
+        ready = time.perf_counter() - started
+        print(json.dumps(startup_report('ir_assQ2', os.path.dirname(os.path.abspath(__file__)), ready), indent=2))
+        return
+
+    # Function to run one search under --metrics / --profile and print what was collected
+    def measured(kind: str, text: str, search, *search_args):
+        with profile(args.profile) as profiled, metrics.query(kind, text) as record:
+            result = search(*search_args)
+        if record or profiled:
+            print(format_record(record, profiled))
+        return result
 
     
 
@@ -280,17 +310,19 @@ def main():
         print("2. Proximity Search")
         print("3. Soundex  Search")
         print("4. Soundex Boolean Search")
-        print("5. Exit")
-        search_type = input("Enter your choice (1-5): ")
+        print("5. Boolean / Proximity Search")
+        print("6. Ranked Search (BM25)")
+        print("7. Exit")
+        search_type = input("Enter your choice (1-7): ")
 
         if search_type == '1':
             print("Biword Search")
             phrase = input("Enter the phrase to search: ")
-            result_docs = biword_search(phrase, biword_index, docs)
+            result_docs = measured('phrase', phrase, biword_search, phrase, biword_index, docs, inverted_index)
             print(f"Biword search for phrase '{phrase}':")
             if result_docs:
                 for doc_id in result_docs:
-                    display_document(doc_id, docs, file_id_mapping)  # Pass file_id_mapping dictionary here
+                    display_document(doc_id, docs)
             else:
                 print("  No results found.")
 
@@ -299,40 +331,80 @@ def main():
             word1 = input("Enter the first word: ")
             word2 = input("Enter the second word: ")
             max_distance = int(input("Enter the maximum distance: "))
-            result_docs = proximity_search(word1, word2, max_distance, inverted_index)
+            result_docs = measured('proximity', f"{word1} {word2} {max_distance}",
+                                   proximity_search, word1, word2, max_distance, inverted_index)
             print(f"Proximity search for words '{word1}' and '{word2}' with max distance {max_distance}:")
             if result_docs:
                 for doc_id in result_docs:
-                    display_document(doc_id, docs, file_id_mapping)  # Pass file_id_mapping dictionary here
+                    display_document(doc_id, docs)
             else:
                 print("  No results found.")
 
         elif search_type == '3':
             print("Soundex Search")
             name = input("Enter the name to search: ")
-            result_docs = soundex_search_single(name, inverted_index)
+            result_docs = measured('soundex', name, soundex_search_single, name, inverted_index,
+                                   phonetic_index_for(inverted_index, encoder))
             print(f"Soundex search for name '{name}':")
             if result_docs:
                 for doc_id in result_docs:
-                    display_document(doc_id, docs, file_id_mapping)  # Pass file_id_mapping dictionary here
+                    display_document(doc_id, docs)
             else:
                 print("  No results found.")
 
         elif search_type == '4':
             print("Soundex Boolean Search (AND, OR, NOT)")
             query = input("Enter the Boolean query: ")
-            result_docs = soundex_boolean_search(query, inverted_index)
+            try:
+                result_docs = measured('soundex_boolean', query, soundex_boolean_search, query, inverted_index,
+                                       phonetic_index_for(inverted_index, encoder))
+            except QuerySyntaxError as error:
+                print(f"  Invalid query: {error}")
+                result_docs = []
             print(f"Soundex Boolean search for query '{query}':")
             if result_docs:
                 for doc_id in result_docs:
-                    display_document(doc_id, docs, file_id_mapping)  # Pass file_id_mapping dictionary here
-        
+                    display_document(doc_id, docs)
+    
         elif search_type == '5':
+            print("Boolean / Proximity Search (AND, OR, NOT, NEAR/k, ONEAR/k)")
+            query = input("Enter the query: ")
+            try:
+                result_docs = measured('boolean', query, boolean_search, query, inverted_index)
+            except QuerySyntaxError as error:
+                print(f"  Invalid query: {error}")
+                result_docs = []
+            print(f"Boolean search for query '{query}':")
+            if result_docs:
+                for doc_id in result_docs:
+                    display_document(doc_id, docs)
+            else:
+                print("  No results found.")
+
+        elif search_type == '6':
+            print("Ranked Search (BM25 top-k)")
+            query = input("Enter the query: ")
+            boolean_filter = input("Enter a boolean filter (optional, e.g. NOT yahoo): ").strip()
+            try:
+                ranked = measured('ranked', query, ranked_search, query, inverted_index, args.top_k,
+                                  boolean_filter or None)
+            except QuerySyntaxError as error:
+                print(f"  Invalid filter: {error}")
+                ranked = []
+            print(f"Top {args.top_k} documents for '{query}':")
+            if ranked:
+                for rank, hit in enumerate(ranked, 1):
+                    print(f"  #{rank}  score {hit.score:.3f}")
+                    display_document(hit.doc_id, docs)
+            else:
+                print("  No results found.")
+
+        elif search_type == '7':
             print("Exited.")
             break
 
         else:
-            print("Invalid choice. Please enter a number between 1 and 5.")
+            print("Invalid choice. Please enter a number between 1 and 7.")
 
 
       
@@ -341,6 +413,9 @@ def main():
         if cont.lower() != 'y':
             break
 
+    if args.metrics:
+        print(json.dumps(metrics.dump(), indent=2))
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,247 @@
+import argparse
+import json
+import math
+import sys
+import time
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from ir_analysis import LEMMATIZERS, TOKENIZERS
+from ir_engine import QUERY_TYPES, SearchEngine, init_worker, worker_engine
+from ir_metrics import brief, metrics
+from ir_phonetic import PHONETIC_ENCODERS
+from ir_query import QuerySyntaxError
+from ir_shards import DEFAULT_SHARD_TIMEOUT, ShardedEngine, ShardTimeoutError
+
+# Batch query replay: evaluates a file of tagged queries against one loaded index and
+# writes one JSON result per line, followed by a throughput / latency summary.
+#
+# Input, one query per line (blank lines and lines starting with '#' are skipped):
+#   {"type": "proximity", "query": "google engine", "distance": 5, "id": "q7"}
+#   phrase    search engine
+#   soundex   gogle AND serch
+#   google AND NOT yahoo                  (untagged lines use --default-type)
+#
+# A line that cannot be parsed is not evaluated; it gets an error record under its qid.
+
+# `error` is set when the line itself was malformed
+BatchQuery = namedtuple('BatchQuery', ['qid', 'type', 'query', 'distance', 'ordered', 'error'], defaults=(None,))
+
+POOLS = ('none', 'thread', 'process')
+
+# Function to parse one JSON query line; a malformed line yields a query carrying only its error
+def _json_query(line: str, qid: int, default_type: str) -> BatchQuery:
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as error:
+        return BatchQuery(qid, default_type, line, None, False, f"invalid JSON: {error}")
+    if not isinstance(record, dict):
+        return BatchQuery(qid, default_type, line, None, False, "a JSON query must be an object")
+    qid = record.get('id', qid)
+    query_type = record.get('type', default_type)
+    query = record.get('query')
+    distance = record.get('distance')
+    if not isinstance(query_type, str):
+        return BatchQuery(qid, default_type, line, None, False, "'type' must be a string")
+    if not isinstance(query, str):
+        return BatchQuery(qid, query_type, line, None, False, "missing or non-string 'query'")
+    if distance is not None and (isinstance(distance, bool) or not isinstance(distance, int)):
+        return BatchQuery(qid, query_type, query, None, False, "'distance' must be an integer")
+    return BatchQuery(qid, query_type, query, distance, bool(record.get('ordered', False)))
+
+
+# Function to parse query lines into BatchQuery records, numbering them from 1
+def read_queries(lines: Iterable[str], default_type: str = 'boolean') -> Iterator[BatchQuery]:
+    qid = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        qid += 1
+        if line.startswith('{'):
+            yield _json_query(line, qid, default_type)
+            continue
+        tag, _, rest = line.partition(' ')
+        if tag.lower() in QUERY_TYPES:
+            yield BatchQuery(qid, tag.lower(), rest.strip(), None, False)
+        else:
+            yield BatchQuery(qid, default_type, line, None, False)
+
+
+# Function to evaluate one query and describe the result as a JSON-serializable record
+def run_query(engine: SearchEngine, query: BatchQuery, limit: Optional[int] = None) -> dict:
+    record = {'id': query.qid, 'type': query.type, 'query': query.query}
+    start = time.perf_counter()
+    with metrics.query(query.type, query.query) as stats:
+        try:
+            if query.error is not None:
+                raise QuerySyntaxError(query.error)
+            result = engine.search(query.type, query.query, query.distance, query.ordered)
+        except (QuerySyntaxError, ShardTimeoutError) as error:
+            record['error'] = str(error)
+            result = []
+    latency = time.perf_counter() - start
+
+    doc_ids = list(result)
+    record['count'] = len(doc_ids)
+    if limit is not None:
+        doc_ids = doc_ids[:limit]
+    record['doc_ids'] = doc_ids
+    record['docs'] = [engine.name(doc_id) for doc_id in doc_ids]
+    record['latency_ms'] = round(latency * 1000, 3)
+    if stats is not None:
+        record['metrics'] = brief(stats)
+    return record
+
+
+def _run_in_worker(query: BatchQuery, limit: Optional[int]) -> dict:
+    return run_query(worker_engine(), query, limit)
+
+
+# Function to evaluate queries in input order, optionally on a thread or process pool.
+# Threads share `engine`; each process opens its own engine from `engine_options`.
+def run_batch(engine: SearchEngine, queries: Iterable[BatchQuery], pool: str = 'none', workers: int = 1,
+              limit: Optional[int] = None, engine_options: Optional[dict] = None) -> Iterator[dict]:
+    if pool == 'none' or workers <= 1:
+        for query in queries:
+            yield run_query(engine, query, limit)
+    elif pool == 'thread':
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from _ordered_map(executor, lambda query: run_query(engine, query, limit), queries, workers)
+    elif pool == 'process':
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(engine_options or {},)) as executor:
+            yield from _ordered_map(executor, partial(_run_in_worker, limit=limit), queries, workers)
+    else:
+        raise ValueError(f"unknown pool {pool!r}, expected one of {POOLS}")
+
+
+# Function to map over a stream in input order, keeping a bounded number of tasks in flight
+def _ordered_map(executor: Executor, fn: Callable, items: Iterable, workers: int) -> Iterator:
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= 4 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# Function to compute a nearest-rank percentile of sorted values
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+# Function to summarize result records: overall throughput plus latency percentiles per query type.
+# Per-type qps is the rate one worker sustains on that type (count / time spent evaluating it).
+def summarize(records: Iterable[dict], wall_seconds: float) -> dict:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    total = 0
+    for record in records:
+        total += 1
+        latencies[record['type']].append(record['latency_ms'])
+        if 'error' in record:
+            errors[record['type']] += 1
+
+    by_type = {}
+    for query_type, values in sorted(latencies.items()):
+        values.sort()
+        busy = sum(values) / 1000
+        by_type[query_type] = {
+            'count': len(values),
+            'errors': errors[query_type],
+            'qps': round(len(values) / busy, 1) if busy else None,
+            'mean_ms': round(sum(values) / len(values), 3),
+            'p50_ms': percentile(values, 0.50),
+            'p95_ms': percentile(values, 0.95),
+            'p99_ms': percentile(values, 0.99),
+        }
+    return {
+        'queries': total,
+        'wall_seconds': round(wall_seconds, 3),
+        'qps': round(total / wall_seconds, 1) if wall_seconds else None,
+        'by_type': by_type,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay a file of queries against the index and report throughput")
+    parser.add_argument('queries', nargs='?', default='-', help="query file, or - for stdin (default)")
+    parser.add_argument('--output', '-o', default='-', help="JSON Lines results file, or - for stdout (default)")
+    parser.add_argument('--summary', default=None, help="write the summary JSON here instead of stderr")
+    parser.add_argument('--default-type', choices=QUERY_TYPES, default='boolean',
+                        help="type of queries without a type tag")
+    parser.add_argument('--pool', choices=POOLS, default='none', help="evaluate queries on a thread or process pool")
+    parser.add_argument('--workers', type=int, default=4, help="pool size")
+    parser.add_argument('--limit', type=int, default=None, help="doc IDs to list per result (default: all)")
+    parser.add_argument('--corpus', default='Corpus.zip', help="corpus to index: .zip, .tar(.gz) or a directory")
+    parser.add_argument('--index', default=None, help="on-disk index file (default: <corpus>.q2.idx)")
+    parser.add_argument('--rebuild', action='store_true', help="ignore the stored index and rebuild it")
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default=None,
+                        help="nltk word_tokenize, or the faster regex tokenizer")
+    parser.add_argument('--lemmatizer', choices=LEMMATIZERS, default=None,
+                        help="WordNet lemmatization, or none (WordNet is then never loaded)")
+    parser.add_argument('--phonetic', choices=sorted(PHONETIC_ENCODERS), default='soundex',
+                        help="phonetic encoder used by soundex queries")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="split the index into this many shards, each queried by its own process")
+    parser.add_argument('--shard-timeout', type=float, default=DEFAULT_SHARD_TIMEOUT,
+                        help="seconds to wait for each shard before the query fails")
+    parser.add_argument('--metrics', action='store_true',
+                        help="add per-stage timings and counters to each result and to the summary")
+    args = parser.parse_args(argv)
+    if args.shards and args.pool == 'process':
+        parser.error("--shards already runs the shards in processes; use --pool thread")
+    if args.metrics:
+        metrics.enable()
+
+    engine_options = {'corpus_path': args.corpus, 'index_path': args.index, 'rebuild': args.rebuild,
+                      'tokenizer': args.tokenizer, 'lemmatizer': args.lemmatizer, 'phonetic': args.phonetic}
+    if args.shards:
+        engine = ShardedEngine.open(args.corpus, args.shards, rebuild=args.rebuild, tokenizer=args.tokenizer,
+                                    phonetic=args.phonetic, timeout=args.shard_timeout, lemmatizer=args.lemmatizer)
+    else:
+        engine = SearchEngine.open(**engine_options)
+    # Process workers collect metrics on their own; their per-query records are folded in here
+    absorb = args.metrics and args.pool == 'process' and args.workers > 1
+
+    source = sys.stdin if args.queries == '-' else open(args.queries, 'r', encoding='utf-8')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    records = []
+    try:
+        start = time.perf_counter()
+        for record in run_batch(engine, read_queries(source, args.default_type), args.pool, args.workers,
+                                args.limit, dict(engine_options, metrics=args.metrics)):
+            output.write(json.dumps(record) + '\n')
+            if absorb:
+                metrics.absorb(record['metrics'])
+            records.append({'type': record['type'], 'latency_ms': record['latency_ms'],
+                            **({'error': True} if 'error' in record else {})})
+        wall = time.perf_counter() - start
+    finally:
+        if args.shards:
+            engine.close()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    summary = summarize(records, wall)
+    if args.metrics:
+        summary['metrics'] = metrics.dump()
+    summary = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            file.write(summary + '\n')
+    else:
+        print(summary, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import accumulate
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import ir_assQ2
+from ir_analysis import TOKENIZERS
+from ir_batch import percentile
+from ir_parallel import DEFAULT_MEMORY_BUDGET, parse_size, write_index_parallel
+from ir_phonetic import PhoneticIndex
+from ir_positional import near_search
+from ir_storage import MappedIndex, save_index
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Scalability benchmark on synthetic corpora.
+#
+# Documents are drawn from a Zipfian vocabulary of pronounceable pseudo-words, so
+# term frequencies, posting-list lengths and phonetic collisions look like real
+# text. For each corpus size the harness builds the index with the same code as
+# ir_assQ2, saves and memory-maps it, then times every query operator on it. The
+# result is one JSON document that can be stored and diffed between versions.
+# With --workers the runs are merged straight into the index file, so memory is
+# bounded by --memory-budget rather than by the corpus size (the serial build holds
+# the whole index until it is saved).
+
+DEFAULT_VOCAB_SIZE = 50_000
+DEFAULT_DOC_LENGTH = 200
+DEFAULT_ZIPF_EXPONENT = 1.07
+DEFAULT_QUERIES = 200
+SAMPLE_DOCS = 500
+
+_CONSONANTS = 'bcdfghjklmnprstvwz'
+_VOWELS = 'aeiou'
+
+
+# Function to generate `size` distinct pseudo-words made of 1-4 consonant-vowel syllables
+def make_vocabulary(size: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    words = []
+    seen = set()
+    while len(words) < size:
+        syllables = rnd.choice((1, 2, 2, 3, 3, 4))
+        word = ''.join(rnd.choice(_CONSONANTS) + rnd.choice(_VOWELS) for _ in range(syllables))
+        if rnd.random() < 0.3:
+            word += rnd.choice(_CONSONANTS)
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+class ZipfCorpus:
+    def __init__(self, docs: int, vocab_size: int = DEFAULT_VOCAB_SIZE, doc_length: int = DEFAULT_DOC_LENGTH,
+                 exponent: float = DEFAULT_ZIPF_EXPONENT, seed: int = 0):
+        self.docs = docs
+        self.doc_length = doc_length
+        self.seed = seed
+        # Rank r is drawn with probability proportional to 1 / r^exponent
+        self.vocabulary = make_vocabulary(vocab_size, seed)
+        self.cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, vocab_size + 1)))
+        self.samples: List[str] = []
+
+    # Function to draw `k` words from the Zipf distribution
+    def words(self, rnd: random.Random, k: int) -> List[str]:
+        return rnd.choices(self.vocabulary, cum_weights=self.cum_weights, k=k)
+
+    # Function to stream (doc_id, text); a few documents are kept to draw phrase queries from
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        rnd = random.Random(self.seed)
+        keep_every = max(self.docs // SAMPLE_DOCS, 1)
+        self.samples = []
+        for doc_id in range(1, self.docs + 1):
+            length = max(int(rnd.gauss(self.doc_length, self.doc_length / 3)), 1)
+            text = ' '.join(self.words(rnd, length))
+            if doc_id % keep_every == 0:
+                self.samples.append(text)
+            yield doc_id, text
+
+
+# Function to read the process's peak resident set size (self and children) in bytes
+def _peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+# Function to time building the index into `path`, returning a report. The parallel
+# build writes the file as it merges, so its time includes the save.
+def bench_indexing(corpus: ZipfCorpus, path: str, workers: int, memory_budget: int,
+                   trace_memory: bool) -> dict:
+    doc_table = {doc_id: f"synthetic/{doc_id}.txt" for doc_id in range(1, corpus.docs + 1)}
+    tokens = 0
+
+    def counted():
+        nonlocal tokens
+        for doc_id, text in corpus:
+            tokens += text.count(' ') + 1
+            yield doc_id, text
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    save_seconds = None
+    if workers > 1:
+        write_index_parallel(path, counted(), ir_assQ2.analyzer.analyze, doc_table, workers=workers,
+                             memory_budget=memory_budget, spill_dir=os.path.dirname(path))
+        seconds = time.perf_counter() - start
+    else:
+        inverted_index, biword_index = ir_assQ2.build_inverted_index(counted())
+        seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        save_index(path, inverted_index, doc_table, biword_index)
+        save_seconds = time.perf_counter() - start
+        del inverted_index, biword_index
+    index = MappedIndex(path)
+    report = {
+        'seconds': round(seconds, 3),
+        'docs_per_second': round(corpus.docs / seconds, 1),
+        'tokens_per_second': round(tokens / seconds, 1),
+        'tokens': tokens,
+        'terms': len(index),
+        'biwords': len(index.biword_index),
+        'peak_rss_bytes': _peak_rss(),
+    }
+    if trace_memory:
+        report['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if save_seconds is not None:
+        report['save_seconds'] = round(save_seconds, 3)
+    report['index_bytes'] = os.path.getsize(path)
+    return report
+
+
+# Function to draw a benchmark workload: {operator: [(description, callable)]}
+def make_queries(corpus: ZipfCorpus, index, count: int, seed: int) -> Dict[str, List[Tuple[str, Callable]]]:
+    rnd = random.Random(seed + 1)
+    phonetic_index = PhoneticIndex(index)
+    analyze = ir_assQ2.analyzer.analyze
+    # Query terms follow the same Zipf law as the text, restricted to indexed terms
+    terms = [word for word in corpus.words(rnd, 4 * count) if analyze(word) and analyze(word)[0] in index]
+    if not terms:
+        # Nothing drawn survived analysis (e.g. a tiny vocabulary of stopwords): no workload
+        print("no sampled word is an indexed term; skipping the query benchmark", file=sys.stderr)
+        return {}
+    samples = [analyze(text) for text in corpus.samples]
+    samples = [words for words in samples if len(words) >= 4] or [[terms[0]] * 4]
+
+    def pair():
+        return rnd.choice(terms), rnd.choice(terms)
+
+    def window(size):
+        words = rnd.choice(samples)
+        start = rnd.randrange(len(words) - size + 1)
+        return words[start:start + size]
+
+    def misspell(word):
+        i = rnd.randrange(1, len(word)) if len(word) > 1 else 0
+        return word[:i] + rnd.choice(_VOWELS) + word[i + 1:]
+
+    search = ir_assQ2.boolean_search
+    workload: Dict[str, List[Tuple[str, Callable]]] = {op: [] for op in
+                                                       ('and', 'or', 'not', 'phrase', 'proximity', 'soundex')}
+    for _ in range(count):
+        a, b = pair()
+        workload['and'].append((f"{a} AND {b}", lambda q=f"{a} AND {b}": search(q, index, None)))
+        workload['or'].append((f"{a} OR {b}", lambda q=f"{a} OR {b}": search(q, index, None)))
+        workload['not'].append((f"{a} AND NOT {b}", lambda q=f"{a} AND NOT {b}": search(q, index, None)))
+        phrase = ' '.join(window(rnd.choice((2, 3))))
+        workload['phrase'].append((phrase, lambda q=phrase: ir_assQ2.phrase_docs(q, index, index.biword_index)))
+        near = window(3)[::2]
+        workload['proximity'].append((f"{near[0]} NEAR/5 {near[1]}",
+                                      lambda t=tuple(near): near_search(t, index, 5)))
+        query = f"{misspell(a)} and {misspell(b)}"
+        workload['soundex'].append((query, lambda q=query: ir_assQ2.soundex_boolean_search(
+            q, index, phonetic_index, None)))
+    return workload
+
+
+# Function to time each operator's queries and summarize their latencies
+def bench_queries(workload: Dict[str, List[Tuple[str, Callable]]]) -> dict:
+    report = {}
+    for operator, queries in workload.items():
+        latencies = []
+        results = 0
+        for _, run in queries:
+            start = time.perf_counter()
+            results += len(run())
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        report[operator] = {
+            'count': len(latencies),
+            'mean_ms': round(sum(latencies) / len(latencies), 4),
+            'p50_ms': round(percentile(latencies, 0.50), 4),
+            'p95_ms': round(percentile(latencies, 0.95), 4),
+            'p99_ms': round(percentile(latencies, 0.99), 4),
+            'mean_results': round(results / len(latencies), 1),
+        }
+    return report
+
+
+# Function to run the whole benchmark for one corpus size
+def bench_size(docs: int, args) -> dict:
+    corpus = ZipfCorpus(docs, args.vocab, args.doc_length, args.zipf, args.seed)
+    with tempfile.TemporaryDirectory(prefix='ir-bench-') as tmp:
+        path = os.path.join(tmp, 'bench.idx')
+        indexing = bench_indexing(corpus, path, args.workers, args.memory_budget, args.trace_memory)
+        index = MappedIndex(path)
+        workload = make_queries(corpus, index, args.queries, args.seed)
+        queries = bench_queries(workload)
+        del workload, index
+    return {'docs': docs, 'indexing': indexing, 'queries': queries}
+
+
+# Function to identify the code under test so results from different versions can be told apart
+def _version() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark indexing and queries on synthetic Zipfian corpora")
+    parser.add_argument('--docs', type=int, nargs='+', default=[1000, 10000], help="corpus sizes to run")
+    parser.add_argument('--vocab', type=int, default=DEFAULT_VOCAB_SIZE, help="vocabulary size")
+    parser.add_argument('--doc-length', type=int, default=DEFAULT_DOC_LENGTH, help="mean words per document")
+    parser.add_argument('--zipf', type=float, default=DEFAULT_ZIPF_EXPONENT, help="Zipf exponent")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="queries per operator")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=1, help="processes used to build the index")
+    parser.add_argument('--memory-budget', type=parse_size, default=DEFAULT_MEMORY_BUDGET,
+                        help="partial-index memory before workers spill to disk, e.g. 512M")
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default=ir_assQ2.analyzer.tokenizer,
+                        help="nltk word_tokenize, or the faster regex tokenizer")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also measure peak Python allocations with tracemalloc (slows indexing)")
+    parser.add_argument('--output', '-o', default='-', help="JSON results file, or - for stdout (default)")
+    args = parser.parse_args(argv)
+    ir_assQ2.analyzer.tokenizer = args.tokenizer
+
+    results = {
+        'version': _version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {'vocab': args.vocab, 'doc_length': args.doc_length, 'zipf': args.zipf,
+                   'queries': args.queries, 'seed': args.seed, 'workers': args.workers,
+                   'tokenizer': args.tokenizer, 'analyzer': ir_assQ2.analyzer.tag},
+        'runs': [],
+    }
+    for docs in args.docs:
+        print(f"benchmarking {docs} documents...", file=sys.stderr)
+        results['runs'].append(bench_size(docs, args))
+
+    text = json.dumps(results, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+
+
+if __name__ == "__main__":
+    main()
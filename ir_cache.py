@@ -0,0 +1,104 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from ir_postings import PostingList
+
+# Query result cache: evaluated posting lists keyed by canonical query (or sub-expression)
+# ASTs, evicted least-recently-used once either the entry or the byte budget is exceeded.
+# A cache serves one index at a time; when the index object or its generation (see
+# ir_segments.IndexSnapshot) changes, validate() drops every entry. Only indexes with a
+# generation are cached: a MappedIndex never changes, a snapshot's generation moves with
+# every update, but a plain dict can be modified in place without the cache noticing.
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Rough per-entry bookkeeping cost (key, OrderedDict node, PostingList object), in bytes
+_ENTRY_OVERHEAD = 200
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, PostingList]' = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        # Weak reference to the index the entries belong to, and its generation
+        self._index = None
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # Function to tie the cache to an index, dropping all entries if it is a different index or
+    # generation. Returns False, and the cache must not be used, for an index without a generation.
+    def validate(self, index) -> bool:
+        generation = getattr(index, 'generation', None)
+        if generation is None:
+            return False
+        with self._lock:
+            current = self._index() if self._index is not None else None
+            if current is not index or generation != self._generation:
+                if self._index is not None:
+                    self.invalidations += 1
+                self._clear()
+                self._index = weakref.ref(index)
+                self._generation = generation
+        return True
+
+    def get(self, key: Hashable) -> Optional[PostingList]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: PostingList) -> None:
+        size = _ENTRY_OVERHEAD + value.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes[key]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old)
+                self.evictions += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self._bytes = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
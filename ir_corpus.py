@@ -0,0 +1,144 @@
+import os
+import tarfile
+import zipfile
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional
+
+# One corpus document as produced by iter_corpus; `name` is the member path inside the
+# archive (or the path relative to the corpus directory), e.g. 'Corpus/google.txt'
+CorpusEntry = namedtuple('CorpusEntry', ['doc_id', 'name', 'text'])
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+# Google Drive file IDs of the shared Corpus.zip documents, keyed by file name
+DRIVE_FILE_IDS = {
+    'paypal.txt': '1SU3qe7WPduaiOWQiEWKjVgWWNJJG2P8l',
+    'instagram.txt': '1myzc16SQiItwv7Fu34xKPdzhEAg8WMf_',
+    'volkswagen.txt': '1YdVx3j2U1QIUqjApzzu_7Vc0yhwdN4W0',
+    'HP.txt': '1gym8q9fuilqyNOZ_MbdTriQKiF4fs21T',
+    'spotify.txt': '1cfhbL9uugppmXFwqCtwpgvpbx7k8iQtC',
+    'Uber.txt': '1uRFepmUklcGoydXm7CNOCbyApWmyJ3zu',
+    'youtube.txt': '1u32cxm6JkQXMttqcgpKtOaW9JF_io2HZ',
+    'motorola.txt': '1jTtyGhZ5Nt0r5H5P4q9SCMM4EKNocFbq',
+    'yahoo.txt': '1L8cqu31UdqfUlSl2BUPZm2WgcA7KWXhW',
+    'Lenovo.txt': '1Yf9ypzXtV0GVRzSROA0Rf5lDlzEZdurG',
+    'Dell.txt': '1q628g8gPoXhQwQophtXpa1EOfLTia6Yr',
+    'levis.txt': '1NXxLhKMWLjFZw-OHi2omCUHneE65MEKy',
+    'whatsapp.txt': '1IKOAeE6R_lYM79KcCg1R69jaZqFESi4T',
+    'bing.txt': '1eJefZuegIKYKtO_Ui6Ft613HjNy4gjNa',
+    'huawei.txt': '1UM0HfKDquiYfQUYPM2w8zOhOodJ8mpXB',
+    'samsung.txt': '1W-hLebBkUgVqyvpPxrei8todpzcj2Zsf',
+    'swiggy.txt': '1z8tNchwcY5fZpu9X5PTN_brt3TKn8jEA',
+    'skype.txt': '1M44nNmnO8tBORZJefBZDpsA4eRsAvK8u',
+    'messenger.txt': '1Ow9GrppA1haCplAzpl8sQCwinar6Ynri',
+    'telegram.txt': '1c_wKzP_Kx9Sbu58ewhPSf8MyeX7C0OvK',
+    'steam.txt': '1FcptFYZQ7aLZYXl0kQXp5UluCXzLG-Q9',
+    'reliance.txt': '1885pbtntJwW_FkqriJBi_3OP450H-4rA',
+    'canva.txt': '1RAThPxqywa6QnsfOx7m1Ye12oD-FFb48',
+    'puma.txt': '1vd-v2IEBm3HEtCmQgEzlQTUixZrBFU-g',
+    'nokia.txt': '1aeyAcBDBROKq0-oodl8ozOF_lKN0uQlV',
+    'reddit.txt': '1Mg_hDi642we5KCGW6ZL6flSiijWgXxLH',
+    'sony.txt': '1Lg1DRlNH4JS2SMyysDMN60JyHWsi3Q6T',
+    'Ola.txt': '1KWB-AIr2ThSdquUGLfKXf6V-6haWSWwV',
+    'Adobe.txt': '1gu9NXN9jW4Kr7O8XNaxfdtG7XVt3pG2V',
+    'blackberry.txt': '1c9-7OnQuQo9ZuRzPRhSlqaDJUI57Cjbb',
+}
+
+# Drive IDs that were listed without a file name (formerly doc IDs 1-11); kept for reference
+UNATTRIBUTED_DRIVE_FILE_IDS = [
+    '17gtGk9isJIjMOwJUhrvScWIkBeIivQvk',
+    '1Bi7UM3yJfro4Tu3-g3fm5Y2XZ8YeZHg5',
+    '1RDdQqOcbVrmzPYIDQ6R1t7QXWrvzI68P',
+    '1PRdJlT5wixJd_FTe3moFqTlHbanAo_5_',
+    '1EEjfP9vyh8uzq3-N-TF95i_T91ZOF1On',
+    '1-zWgMQAwSOCsmQGYzkyAINNZdGZaG_9N',
+    '1iiaWgK1Ic8jxQCFTDoAJwfEPOCpBcHyb',
+    '1RHmqiyJN3dsr0eLJwZaN_7cqJf44u4mQ',
+    '10Iz3xS6CMbbkFkwDuENYEKoHrGh47WHZ',
+    '1i_XUVOQDZOvH21vVDAzPMFe3Db-60jIX',
+    '1Vyp9dRXbByFNjHUCWjx6IOT5fBSNSPSu',
+]
+
+
+# Function to decode archive bytes with universal newlines, matching text-mode reads from disk
+def _decode(data: bytes, encoding: str) -> str:
+    return data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _is_tar(path: str) -> bool:
+    return path.lower().endswith(TAR_SUFFIXES)
+
+
+# Function to list the document members of a zip archive or directory in sorted order
+def _sorted_members(corpus_path: str, suffix: str) -> List[str]:
+    if os.path.isdir(corpus_path):
+        members = []
+        for root, dirs, files in os.walk(corpus_path):
+            for file in files:
+                members.append(os.path.relpath(os.path.join(root, file), corpus_path).replace(os.sep, '/'))
+    else:
+        with zipfile.ZipFile(corpus_path, 'r') as zip_ref:
+            members = [info.filename for info in zip_ref.infolist() if not info.is_dir()]
+    return sorted(member for member in members if member.endswith(suffix))
+
+
+# Function to stream (doc_id, name, text) for every document in a zip, tar or directory corpus.
+# Only one document is held in memory at a time. Doc IDs start at 1 and are stable across
+# runs: zip and directory members are numbered in sorted path order, tar members (which can
+# only be read sequentially) in archive order.
+def iter_corpus(corpus_path: str, suffix: str = '.txt', encoding: str = 'utf-8') -> Iterator[CorpusEntry]:
+    if not os.path.exists(corpus_path):
+        raise FileNotFoundError(corpus_path)
+
+    if _is_tar(corpus_path):
+        with tarfile.open(corpus_path, 'r|*') as tar:
+            doc_id = 0
+            for member in tar:
+                if member.isfile() and member.name.endswith(suffix):
+                    doc_id += 1
+                    text = _decode(tar.extractfile(member).read(), encoding)
+                    yield CorpusEntry(doc_id, member.name, text)
+        return
+
+    members = _sorted_members(corpus_path, suffix)
+    if os.path.isdir(corpus_path):
+        for doc_id, member in enumerate(members, start=1):
+            with open(os.path.join(corpus_path, member), 'r', encoding=encoding) as file:
+                yield CorpusEntry(doc_id, member, file.read())
+    else:
+        with zipfile.ZipFile(corpus_path, 'r') as zip_ref:
+            for doc_id, member in enumerate(members, start=1):
+                yield CorpusEntry(doc_id, member, _decode(zip_ref.read(member), encoding))
+
+
+# Function to count the documents of a corpus without reading them (doc IDs run from 1 to the count)
+def count_documents(corpus_path: str, suffix: str = '.txt') -> int:
+    if not os.path.exists(corpus_path):
+        raise FileNotFoundError(corpus_path)
+    if _is_tar(corpus_path):
+        with tarfile.open(corpus_path, 'r|*') as tar:
+            return sum(1 for member in tar if member.isfile() and member.name.endswith(suffix))
+    return len(_sorted_members(corpus_path, suffix))
+
+
+# Function to read a single document back out of the corpus by member name
+def read_document(corpus_path: str, member: str, encoding: str = 'utf-8') -> str:
+    if os.path.isdir(corpus_path):
+        with open(os.path.join(corpus_path, member), 'r', encoding=encoding) as file:
+            return file.read()
+    if _is_tar(corpus_path):
+        with tarfile.open(corpus_path, 'r:*') as tar:
+            return _decode(tar.extractfile(member).read(), encoding)
+    with zipfile.ZipFile(corpus_path, 'r') as zip_ref:
+        return _decode(zip_ref.read(member), encoding)
+
+
+# Function to map doc IDs to Google Drive file IDs through the documents' file names
+def drive_file_ids(doc_table: Dict[int, str], file_ids: Optional[Dict[str, str]] = None) -> Dict[int, str]:
+    file_ids = DRIVE_FILE_IDS if file_ids is None else file_ids
+    mapping = {}
+    for doc_id, member in doc_table.items():
+        file_id = file_ids.get(os.path.basename(member))
+        if file_id:
+            mapping[doc_id] = file_id
+    return mapping
@@ -0,0 +1,231 @@
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ir_postings import vbyte_decode, vbyte_encode
+
+# Integer term IDs and biwords keyed by term-ID pairs.
+#
+# While an index is built, TermIds interns every term once and hands out dense IDs in
+# order of first appearance, so a token costs one dict lookup and biwords can be keyed by
+# the packed 64-bit pair (first ID << 32 | second ID) instead of a "word1 word2" string per
+# position. When the index is saved the IDs become the terms' positions in sorted order and
+# the dictionary is frozen into front-coded blocks (FrozenTerms): every block stores its
+# first term in full and each following term as the length of the prefix it shares with
+# the previous term plus the remaining bytes. A lookup is a binary search over the block
+# heads followed by a scan of one block. Stored biwords are a sorted array of packed pairs.
+#
+# Front-coded layout: term count, block count, uint64 block offsets, then the blocks;
+# each block is vbyte(length) + bytes for its head, then vbyte(shared) + vbyte(length) +
+# bytes for every other term.
+
+FRONT_CODING_BLOCK = 16
+
+_PAIR_SHIFT = 32
+_PAIR_MASK = (1 << _PAIR_SHIFT) - 1
+_FROZEN_HEADER = struct.Struct('<QQ')
+
+
+# Function to pack two term IDs into one biword key
+def pack_pair(first_id: int, second_id: int) -> int:
+    return first_id << _PAIR_SHIFT | second_id
+
+
+def unpack_pair(key: int) -> Tuple[int, int]:
+    return key >> _PAIR_SHIFT, key & _PAIR_MASK
+
+
+# Interns terms while an index is built: term <-> dense integer ID in order of first appearance
+class TermIds:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.terms: List[str] = []
+
+    def add(self, term: str) -> int:
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    # Function to intern a document's tokens, returning their IDs in order
+    def add_all(self, terms: List[str]) -> List[int]:
+        ids = self.ids
+        for term in dict.fromkeys(terms):
+            if term not in ids:
+                ids[term] = len(self.terms)
+                self.terms.append(term)
+        return list(map(ids.__getitem__, terms))
+
+    def term_id(self, term: str) -> int:
+        return self.ids.get(term, -1)
+
+    def term(self, term_id: int) -> str:
+        return self.terms[term_id]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
+# Function to front-code sorted, unique UTF-8 terms
+def encode_terms(terms: List[bytes]) -> bytes:
+    blocks = bytearray()
+    offsets = array('Q')
+    previous = b''
+    for i, term in enumerate(terms):
+        if i % FRONT_CODING_BLOCK == 0:
+            offsets.append(len(blocks))
+            vbyte_encode([len(term)], blocks)
+        else:
+            shared = 0
+            limit = min(len(previous), len(term))
+            while shared < limit and previous[shared] == term[shared]:
+                shared += 1
+            vbyte_encode([shared, len(term) - shared], blocks)
+            term = term[shared:]
+            blocks += term
+            previous = previous[:shared] + term
+            continue
+        blocks += term
+        previous = term
+    return _FROZEN_HEADER.pack(len(terms), len(offsets)) + offsets.tobytes() + bytes(blocks)
+
+
+# Read-only front-coded dictionary over a buffer: term ID (sorted position) <-> term
+class FrozenTerms:
+    def __init__(self, data):
+        data = memoryview(data)
+        self._count, block_count = _FROZEN_HEADER.unpack_from(data, 0)
+        table_end = _FROZEN_HEADER.size + 8 * block_count
+        self._offsets = data[_FROZEN_HEADER.size:table_end].cast('Q')
+        self._blocks = data[table_end:]
+        # Block heads, decoded on the first lookup (one term in every FRONT_CODING_BLOCK)
+        self._heads: Optional[List[bytes]] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _head(self, block: int) -> bytes:
+        (length,), pos = vbyte_decode(self._blocks, self._offsets[block], 1)
+        return bytes(self._blocks[pos:pos + length])
+
+    # Function to decode the terms of one block, in order
+    def _block(self, block: int) -> Iterator[bytes]:
+        blocks = self._blocks
+        (length,), pos = vbyte_decode(blocks, self._offsets[block], 1)
+        term = bytes(blocks[pos:pos + length])
+        pos += length
+        yield term
+        size = min(FRONT_CODING_BLOCK, self._count - block * FRONT_CODING_BLOCK)
+        for _ in range(size - 1):
+            shared, length = blocks[pos], blocks[pos + 1]
+            if shared < 0x80 and length < 0x80:
+                pos += 2
+            else:
+                (shared, length), pos = vbyte_decode(blocks, pos, 2)
+            term = term[:shared] + bytes(blocks[pos:pos + length])
+            pos += length
+            yield term
+
+    # Function to find the ID of a term, or -1
+    def term_id(self, term: str) -> int:
+        if self._heads is None:
+            self._heads = [self._head(block) for block in range(len(self._offsets))]
+        key = term.encode('utf-8')
+        # Last block whose head is <= key
+        block = bisect_right(self._heads, key) - 1
+        if block < 0:
+            return -1
+        for i, candidate in enumerate(self._block(block)):
+            if candidate == key:
+                return block * FRONT_CODING_BLOCK + i
+            if candidate > key:
+                break
+        return -1
+
+    def term(self, term_id: int) -> str:
+        if not 0 <= term_id < self._count:
+            raise IndexError(term_id)
+        block, i = divmod(term_id, FRONT_CODING_BLOCK)
+        for n, term in enumerate(self._block(block)):
+            if n == i:
+                return term.decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for block in range(len(self._offsets)):
+            for term in self._block(block):
+                yield term.decode('utf-8')
+
+
+# Read-only view of postings stored under sorted integer keys: key -> decoded posting list
+class PackedPostings(Mapping):
+    def __init__(self, keys, offsets, postings, decode: Callable):
+        self._keys = keys
+        self._offsets = offsets
+        self._postings = postings
+        self._decode = decode
+
+    def __getitem__(self, key: int):
+        i = bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            raise KeyError(key)
+        return self._decode(self._postings[self._offsets[i]:self._offsets[i + 1]])
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+# Biword index keyed by packed term-ID pairs. It is looked up and listed by "word1 word2"
+# like the string-keyed dicts, so phrase search and segment merges work on either.
+class BiwordIndex(Mapping):
+    def __init__(self, terms, postings: Mapping):
+        # `terms` maps both ways with term_id() / term() (TermIds or FrozenTerms)
+        self.terms = terms
+        self.postings = postings
+
+    def key(self, biword: str) -> int:
+        first, sep, second = biword.partition(' ')
+        first_id = self.terms.term_id(first)
+        second_id = self.terms.term_id(second)
+        if not sep or first_id < 0 or second_id < 0:
+            return -1
+        return pack_pair(first_id, second_id)
+
+    def __getitem__(self, biword: str):
+        key = self.key(biword) if isinstance(biword, str) else -1
+        if key < 0:
+            raise KeyError(biword)
+        return self.postings[key]
+
+    def __contains__(self, biword) -> bool:
+        key = self.key(biword) if isinstance(biword, str) else -1
+        return key >= 0 and key in self.postings
+
+    # Function to list (first term, second term, postings) without joining the two terms
+    def pairs(self) -> Iterator[Tuple[str, str, object]]:
+        for key, postings in self.postings.items():
+            first_id, second_id = unpack_pair(key)
+            yield self.terms.term(first_id), self.terms.term(second_id), postings
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.postings:
+            first_id, second_id = unpack_pair(key)
+            yield f"{self.terms.term(first_id)} {self.terms.term(second_id)}"
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+
+# Function to list the (first term, second term, postings) of a BiwordIndex or a "word1 word2"-keyed dict
+def biword_pairs(biword_index: Mapping) -> Iterator[Tuple[str, str, object]]:
+    if isinstance(biword_index, BiwordIndex):
+        yield from biword_index.pairs()
+        return
+    for biword, postings in biword_index.items():
+        first, _, second = biword.partition(' ')
+        yield first, second, postings
@@ -0,0 +1,96 @@
+import re
+from typing import Dict, List, Optional
+
+import ir_assQ2
+from ir_metrics import metrics
+from ir_parallel import DEFAULT_MEMORY_BUDGET
+from ir_phonetic import PHONETIC_ENCODERS, phonetic_index_for
+from ir_positional import near_search
+from ir_postings import PostingList
+from ir_query import QuerySyntaxError
+
+# One loaded index answering every query type of the extended model, for callers that are
+# not the interactive menu (batch replay, the query server). Queries are preprocessed with the
+# same Analyzer as the documents, exactly as ir_assQ2's search functions do.
+
+QUERY_TYPES = ('boolean', 'phrase', 'proximity', 'soundex')
+
+_DISTANCE_RE = re.compile(r'\d+')
+
+
+# Function to override the shared analyzer's configuration; None keeps the current setting
+def configure_analyzer(tokenizer: Optional[str] = None, lemmatizer: Optional[str] = None):
+    if tokenizer is not None:
+        ir_assQ2.analyzer.tokenizer = tokenizer
+    if lemmatizer is not None:
+        ir_assQ2.analyzer.lemmatizer = lemmatizer
+
+
+class SearchEngine:
+    def __init__(self, inverted_index, phonetic: str = 'soundex'):
+        self.inverted_index = inverted_index
+        self.biword_index = getattr(inverted_index, 'biword_index', None)
+        self.doc_table: Dict[int, str] = getattr(inverted_index, 'doc_table', {})
+        self.phonetic_index = phonetic_index_for(inverted_index, PHONETIC_ENCODERS[phonetic])
+
+    # Function to open (building if needed) the persisted index of a corpus
+    @classmethod
+    def open(cls, corpus_path: str = 'Corpus.zip', index_path: Optional[str] = None, rebuild: bool = False,
+             workers: int = 1, memory_budget: int = DEFAULT_MEMORY_BUDGET, tokenizer: Optional[str] = None,
+             phonetic: str = 'soundex', lemmatizer: Optional[str] = None) -> 'SearchEngine':
+        configure_analyzer(tokenizer, lemmatizer)
+        return cls(ir_assQ2.open_index(corpus_path, index_path, rebuild, workers, memory_budget), phonetic)
+
+    # Function to answer one query.
+    #   boolean   : AND / OR / NOT / NEAR/k / ONEAR/k expression
+    #   phrase    : exact phrase
+    #   proximity : "word1 word2 ... k", or the words with `distance` given separately
+    #   soundex   : sound-alike terms joined by AND / OR / NOT
+    def search(self, query_type: str, query: str, distance: Optional[int] = None,
+               ordered: bool = False) -> PostingList:
+        if query_type == 'boolean':
+            return ir_assQ2.boolean_search(query, self.inverted_index)
+        if query_type == 'phrase':
+            return ir_assQ2.phrase_docs(query, self.inverted_index, self.biword_index)
+        if query_type == 'proximity':
+            return self._proximity(query, distance, ordered)
+        if query_type == 'soundex':
+            return ir_assQ2.soundex_boolean_search(query, self.inverted_index, self.phonetic_index)
+        raise QuerySyntaxError(f"unknown query type {query_type!r}, expected one of {QUERY_TYPES}")
+
+    def _proximity(self, query: str, distance: Optional[int], ordered: bool) -> PostingList:
+        words = query.split()
+        if distance is None:
+            if not words or not _DISTANCE_RE.fullmatch(words[-1]):
+                raise QuerySyntaxError("proximity query needs a distance, e.g. 'google engine 5'")
+            distance = int(words.pop())
+        terms: List[str] = [ir_assQ2._query_term(word) for word in words]
+        if len(terms) < 2:
+            raise QuerySyntaxError("proximity query needs at least two words")
+        if not all(terms):
+            return PostingList()
+        return near_search(terms, self.inverted_index, distance, ordered)
+
+    # Function to get the file name of a document without reading it
+    def name(self, doc_id: int) -> str:
+        member = self.doc_table.get(doc_id)
+        return member.rsplit('/', 1)[-1] if member else str(doc_id)
+
+
+# Engine of a process-pool worker, opened once per process by init_worker
+_worker_engine: Optional[SearchEngine] = None
+
+
+# Pool initializer: open the engine in a worker process (the index file is memory-mapped,
+# so all workers share one page-cache copy of it). A true 'metrics' option turns on
+# instrumentation in the worker.
+def init_worker(engine_options: dict):
+    global _worker_engine
+    options = dict(engine_options, rebuild=False)
+    if options.pop('metrics', False):
+        metrics.enable()
+    _worker_engine = SearchEngine.open(**options)
+
+
+def worker_engine() -> SearchEngine:
+    return _worker_engine
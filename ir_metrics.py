@@ -0,0 +1,286 @@
+import io
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Lightweight instrumentation for the indexing and query paths.
+#
+#   with metrics.stage('lookup'):          time a stage (histogram of durations)
+#   metrics.count('postings_touched', n)   add to a counter
+#   metrics.observe('intermediate', n)     record a value (histogram of sizes)
+#   with metrics.query('boolean', q) as record:
+#                                          collect the stages and counters of one query
+#   with profile('cprofile'):              cProfile / tracemalloc one query or build
+#
+# Everything is off until enable() is called. While disabled, stage() returns a shared
+# no-op context manager and count() / observe() return immediately, so the hooks left
+# in hot paths cost one attribute check.
+
+# Histogram buckets: powers of two (microseconds for timings, units for sizes)
+_BUCKETS = 40
+
+
+class Histogram:
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.buckets[min(int(value).bit_length(), _BUCKETS - 1)] += 1
+
+    # Function to estimate a percentile as the upper bound of the bucket that holds it
+    def percentile(self, fraction: float) -> float:
+        rank = fraction * self.count
+        seen = 0
+        for b, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(float(2 ** b - 1) if b else 0.0, self.max)
+        return self.max or 0.0
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'min': None if self.min is None else round(self.min, 3),
+            'p50': round(self.percentile(0.50), 3),
+            'p95': round(self.percentile(0.95), 3),
+            'p99': round(self.percentile(0.99), 3),
+            'max': None if self.max is None else round(self.max, 3),
+        }
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record_stage(self.name, (time.perf_counter() - self.start) * 1e6)
+        return False
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.timers: Dict[str, Histogram] = {}
+        self.values: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.values.clear()
+            self.counters.clear()
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record_stage(self, name: str, micros: float):
+        with self._lock:
+            self.timers.setdefault(name, Histogram()).add(micros)
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            stages = record['stages_us']
+            stages[name] = round(stages.get(name, 0.0) + micros, 1)
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            record['counters'][name] = record['counters'].get(name, 0) + n
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.values.setdefault(name, Histogram()).add(value)
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            record['observed'].setdefault(name, []).append(value)
+
+    # Function to collect the stages and counters of one query (or build) on this thread
+    @contextmanager
+    def query(self, kind: str, text: str = '') -> Iterator[Optional[dict]]:
+        if not self.enabled:
+            yield None
+            return
+        record = {'kind': kind, 'query': text, 'stages_us': {}, 'counters': {}, 'observed': {}}
+        outer = getattr(self._local, 'record', None)
+        self._local.record = record
+        start = time.perf_counter()
+        try:
+            with self.stage(f'{kind}_total'):
+                yield record
+        finally:
+            record['total_us'] = round((time.perf_counter() - start) * 1e6, 1)
+            self._local.record = outer
+
+    # Function to fold a per-query record collected in another process (a pool worker) into these totals
+    def absorb(self, record: dict):
+        with self._lock:
+            for name, micros in record['stages_us'].items():
+                self.timers.setdefault(name, Histogram()).add(micros)
+            for name, value in record['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    # Function to total the time recorded by each stage, in milliseconds
+    def stage_totals(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(h.total / 1000, 3) for name, h in sorted(self.timers.items())}
+
+    def dump(self) -> dict:
+        with self._lock:
+            return {
+                'timers_us': {name: h.summary() for name, h in sorted(self.timers.items())},
+                'values': {name: h.summary() for name, h in sorted(self.values.items())},
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+
+# Process-wide metrics used by the instrumented modules
+metrics = Metrics()
+
+PROFILERS = ('cprofile', 'tracemalloc')
+
+_IMPORT_TIME_PREFIX = 'import time:'
+
+
+# Function to time importing `module` in a fresh interpreter (python -X importtime, run from
+# `directory`): returns the total in microseconds and the module's direct imports, slowest first
+def import_times(module: str, directory: str) -> Tuple[Optional[float], List[Tuple[str, float]]]:
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=directory, capture_output=True, text=True)
+    children: List[Tuple[str, float]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith(_IMPORT_TIME_PREFIX) or '[us]' in line:
+            continue
+        _, cumulative, name = line[len(_IMPORT_TIME_PREFIX):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            # A top-level import ends; the lines before it are its own imports
+            if name == module:
+                return float(cumulative), sorted(children, key=lambda child: -child[1])
+            children = []
+        elif depth == 1:
+            children.append((name, float(cumulative)))
+    return None, []
+
+
+# Function to report where start-up time goes: importing `module` (timed in a fresh interpreter)
+# and the stages recorded since, e.g. loading the index and running a first query. `ready_s` is
+# the time from entering main() to the first result.
+def startup_report(module: str, directory: str, ready_s: float, limit: int = 10) -> dict:
+    import_us, imports = import_times(module, directory)
+    return {
+        'import_ms': None if import_us is None else round(import_us / 1000, 3),
+        'slowest_imports_ms': {name: round(micros / 1000, 3) for name, micros in imports[:limit]},
+        'stages_ms': metrics.stage_totals(),
+        'main_to_first_result_ms': round(ready_s * 1000, 3),
+        'cold_start_ms': None if import_us is None else round(import_us / 1000 + ready_s * 1000, 3),
+    }
+
+
+# Function to profile one block (a query or an index build) and put the report in `result['report']`
+@contextmanager
+def profile(kind: Optional[str], result: Optional[dict] = None, limit: int = 15) -> Iterator[dict]:
+    result = {} if result is None else result
+    if kind is None:
+        yield result
+        return
+    # The profilers are imported here, not at start-up, as they are only needed with --profile
+    if kind == 'cprofile':
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+            result['report'] = out.getvalue()
+    elif kind == 'tracemalloc':
+        import tracemalloc
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        try:
+            yield result
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            lines: List[str] = [f"peak traced memory: {peak / 1024:.1f} KiB"]
+            for stat in tracemalloc.take_snapshot().compare_to(before, 'lineno')[:limit]:
+                lines.append(str(stat))
+            if started:
+                tracemalloc.stop()
+            result['report'] = '\n'.join(lines)
+    else:
+        raise ValueError(f"unknown profiler {kind!r}, expected one of {PROFILERS}")
+
+
+# Function to keep the JSON-friendly part of a per-query record (stage times and counters)
+def brief(record: dict) -> dict:
+    return {'total_us': record['total_us'], 'stages_us': record['stages_us'], 'counters': record['counters']}
+
+
+# Function to render one query's metrics record (and profiler report) for the terminal
+def format_record(record: Optional[dict], profiled: Optional[dict] = None) -> str:
+    lines = []
+    if record:
+        lines.append(f"[metrics] {record['kind']}: {record['total_us'] / 1000:.3f} ms")
+        for name, micros in sorted(record['stages_us'].items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<24} {micros / 1000:9.3f} ms")
+        for name, value in sorted(record['counters'].items()):
+            lines.append(f"  {name:<24} {value:9d}")
+    if profiled and profiled.get('report'):
+        lines.append(profiled['report'])
+    return '\n'.join(lines)
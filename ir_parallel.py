@@ -0,0 +1,315 @@
+import heapq
+import os
+import pickle
+import re
+import tempfile
+from array import array
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain, groupby, islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from ir_dictionary import BiwordIndex, TermIds, pack_pair, unpack_pair
+from ir_metrics import metrics
+from ir_postings import InvertedIndex, PositionalPostingList, PostingList, encode_postings
+from ir_storage import write_index
+
+# Parallel SPIMI-style index construction.
+#
+# Documents are cut into batches and inverted by a process pool. Each worker
+# interns the batch's terms to IDs (as build_inverted_index does), collects
+# biwords as packed ID pairs, and returns a sorted partial index (run) with an
+# estimate of its in-memory size; a biword becomes a (word1, word2) key once per
+# batch, not a string per position. The parent keeps the runs
+# it receives until their total size goes over the memory budget, then merges
+# them into one run spilled to disk. At the end the spilled runs are merged in
+# passes of at most MAX_MERGE_FAN_IN files (so the number of open files stays
+# bounded), then k-way merged with the runs still in memory, in term order,
+# freezing each merged posting list and keying biwords by packed pairs of the
+# final term IDs. This yields exactly the index the serial build_inverted_index
+# produces. write_index_parallel instead encodes the merged postings straight into
+# an index file, so the merged index is never held in memory.
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 64
+# Most spilled runs read at once by one merge pass
+MAX_MERGE_FAN_IN = 64
+
+# Rough per-entry costs of the in-memory partial index, in bytes
+_TERM_OVERHEAD = 120
+_POSTING_OVERHEAD = 64
+_POSITION_SIZE = 8
+
+# Run entries are keyed (kind, key) so one sorted stream carries both indexes
+_TERM = 0
+_BIWORD = 1
+
+# Run keys: (_TERM, term) or (_BIWORD, (first term, second term))
+Entry = Tuple[Tuple[int, Union[str, Tuple[str, str]]], list]
+Run = Union[str, List[Entry]]
+
+
+# Function to parse a human-readable size such as '512M' or '2g' into bytes
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)b?\s*', str(text).lower())
+    if not match:
+        raise ValueError(f"invalid size: {text!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' kmgt'.index(unit or ' '))
+
+
+# Function to write a sorted partial index to a spill file, one pickled entry per term
+def _spill(entries: Iterable[Entry], spill_dir: str) -> str:
+    fd, path = tempfile.mkstemp(prefix='run-', suffix='.spill', dir=spill_dir)
+    with os.fdopen(fd, 'wb') as file:
+        for entry in entries:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+# Function to stream the entries of an in-memory or spilled run
+def _iter_run(run: Run) -> Iterator[Entry]:
+    if not isinstance(run, str):
+        yield from run
+        return
+    with open(run, 'rb') as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                break
+    os.remove(run)
+
+
+# Function to turn a partial index (postings per batch-local term ID, biword doc IDs per
+# packed pair) into a run sorted by (kind, key)
+def _sorted_run(term_ids: TermIds, terms: List[list], biwords: Dict[int, list]) -> List[Entry]:
+    entries = [((_TERM, term), postings) for term, postings in zip(term_ids.terms, terms)]
+    for pair, doc_ids in biwords.items():
+        first_id, second_id = unpack_pair(pair)
+        entries.append(((_BIWORD, (term_ids.term(first_id), term_ids.term(second_id))), doc_ids))
+    entries.sort(key=itemgetter(0))
+    return entries
+
+
+# Preprocessing of a worker process, installed once by _init_worker (not sent with every batch)
+_worker_preprocess: Optional[Callable[[str], List[str]]] = None
+
+
+# Function to set up a worker process with the preprocessing used for all its batches
+def _init_worker(preprocess: Callable[[str], List[str]]) -> None:
+    global _worker_preprocess
+    _worker_preprocess = preprocess
+
+
+# Worker: invert one batch of documents with the worker's preprocessing
+def _invert_worker_batch(batch: List[Tuple[int, str]], positional: bool,
+                         with_biwords: bool) -> Tuple[List[Entry], List[Tuple[int, int]], int]:
+    return _invert_batch(batch, _worker_preprocess, positional, with_biwords)
+
+
+# Function to SPIMI-invert one batch of documents into a sorted run, the analyzed length of
+# each document and the run's estimated size in bytes
+def _invert_batch(batch: List[Tuple[int, str]], preprocess: Callable[[str], List[str]],
+                  positional: bool, with_biwords: bool) -> Tuple[List[Entry], List[Tuple[int, int]], int]:
+    term_ids = TermIds()
+    terms: List[list] = []
+    biwords = defaultdict(list)
+    lengths = []
+    size = 0
+
+    for doc_id, content in batch:
+        ids = term_ids.add_all(preprocess(content))
+        lengths.append((doc_id, len(ids)))
+        while len(terms) < len(term_ids):
+            size += _TERM_OVERHEAD + len(term_ids.term(len(terms)))
+            terms.append([])
+        positions = defaultdict(list)
+        for pos, term_id in enumerate(ids):
+            positions[term_id].append(pos)
+
+        for term_id, doc_positions in positions.items():
+            terms[term_id].append((doc_id, doc_positions) if positional else doc_id)
+            size += _POSTING_OVERHEAD + _POSITION_SIZE * len(doc_positions)
+
+        if with_biwords:
+            for pair in set(map(pack_pair, ids, ids[1:])):
+                if pair not in biwords:
+                    size += _TERM_OVERHEAD
+                biwords[pair].append(doc_id)
+                size += _POSTING_OVERHEAD
+
+    return _sorted_run(term_ids, terms, biwords), lengths, size
+
+
+# Function to k-way merge sorted runs into one sorted stream, one entry per key
+def _combine(runs: List[Run]) -> Iterator[Entry]:
+    merged = heapq.merge(*(_iter_run(run) for run in runs), key=itemgetter(0))
+    for key, group in groupby(merged, key=itemgetter(0)):
+        yield key, [posting for _, partial in group for posting in partial]
+
+
+# Function to merge spilled runs in passes until at most MAX_MERGE_FAN_IN files are left
+def _reduce_runs(runs: List[Run], spill_dir: str) -> List[Run]:
+    files = [run for run in runs if isinstance(run, str)]
+    in_memory = [run for run in runs if not isinstance(run, str)]
+    while len(files) > MAX_MERGE_FAN_IN:
+        group, files = files[:MAX_MERGE_FAN_IN], files[MAX_MERGE_FAN_IN:]
+        files.append(_spill(_combine(group), spill_dir))
+        metrics.count('merge_passes')
+    return files + in_memory
+
+
+# Function to k-way merge sorted runs into the final compressed indexes. Terms stream in
+# sorted order before any biword, so every biword's terms already have their final IDs.
+def _merge_runs(runs: List[Run], positional: bool) -> Tuple[Dict[str, PostingList], BiwordIndex]:
+    inverted_index = InvertedIndex()
+    term_ids = TermIds()
+    biword_postings = {}
+    for (kind, key), postings in _combine(runs):
+        if kind == _BIWORD:
+            first, second = key
+            pair = pack_pair(term_ids.ids[first], term_ids.ids[second])
+            biword_postings[pair] = PostingList.from_sorted(sorted(postings), compress=True)
+            continue
+        term_ids.add(key)
+        if positional:
+            postings.sort(key=itemgetter(0))
+            inverted_index[key] = PositionalPostingList(encode_postings([doc_id for doc_id, _ in postings],
+                                                                       [pos for _, pos in postings]))
+        else:
+            inverted_index[key] = PostingList.from_sorted(sorted(postings), compress=True)
+    return inverted_index, BiwordIndex(term_ids, biword_postings)
+
+
+# Function to stream the merged runs as ir_storage.write_index takes them: the terms with
+# their encoded postings and ranking bounds, then the biwords (which follow every term in
+# the merged stream, so the terms must be read first)
+def _stream_runs(runs: List[Run], positional: bool,
+                 doc_lengths: array) -> Tuple[Iterator[Tuple[str, bytes, Optional[Tuple[int, int]]]],
+                                              Iterator[Tuple[str, str, bytes]]]:
+    merged = _combine(runs)
+    # The first biword entry, read by terms() when it reaches the end of the terms
+    first_biword = []
+
+    def terms():
+        for (kind, key), postings in merged:
+            if kind == _BIWORD:
+                first_biword.append(((kind, key), postings))
+                return
+            if positional:
+                postings.sort(key=itemgetter(0))
+                bounds = (max(len(positions) for _, positions in postings),
+                          min(doc_lengths[doc_id] for doc_id, _ in postings))
+                yield key, encode_postings([doc_id for doc_id, _ in postings],
+                                           [positions for _, positions in postings]), bounds
+            else:
+                yield key, encode_postings(sorted(postings)), None
+
+    def biwords():
+        for (_, (first, second)), doc_ids in chain(first_biword, merged):
+            yield first, second, encode_postings(sorted(doc_ids))
+
+    return terms(), biwords()
+
+
+# Function to invert documents with a process pool into sorted runs, spilling them to
+# run_dir past the memory budget. Returns the runs left to merge (at most MAX_MERGE_FAN_IN
+# of them on disk) and the analyzed length of every document, indexed by doc ID.
+def _invert_runs(docs: Iterable[Tuple[int, str]], preprocess: Callable[[str], List[str]], workers: Optional[int],
+                 memory_budget: int, positional: bool, biwords: bool, batch_size: int,
+                 run_dir: str) -> Tuple[List[Run], array]:
+    workers = workers or os.cpu_count() or 1
+    docs = iter(docs)
+    runs: List[Run] = []
+    doc_lengths = array('I')
+    # Runs received since the last spill, and their estimated size
+    held: List[Run] = []
+    held_size = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(preprocess,)) as pool:
+        # Keep a bounded number of batches in flight so the corpus is never fully materialized
+        pending = set()
+        while True:
+            while len(pending) < 2 * workers:
+                batch = list(islice(docs, batch_size))
+                if not batch:
+                    break
+                pending.add(pool.submit(_invert_worker_batch, batch, positional, biwords))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                run, lengths, size = future.result()
+                for doc_id, length in lengths:
+                    if doc_id >= len(doc_lengths):
+                        doc_lengths.frombytes(bytes(doc_lengths.itemsize * (doc_id + 1 - len(doc_lengths))))
+                    doc_lengths[doc_id] = length
+                held.append(run)
+                held_size += size
+                if held_size > memory_budget:
+                    with metrics.stage('spill'):
+                        runs.append(_spill(_combine(held), run_dir))
+                    metrics.count('runs_spilled')
+                    held, held_size = [], 0
+
+    runs = _reduce_runs(runs + held, run_dir)
+    metrics.count('runs_merged', len(runs))
+    return runs, doc_lengths
+
+
+# Function to build the inverted (and optionally biword) index with a process pool.
+#   docs          : (doc_id, text) pairs, consumed lazily batch by batch
+#   preprocess    : picklable callable, e.g. ir_assQ2.analyzer.analyze; sent once to each
+#                   worker, which keeps it (and the analyzer's cache) for all its batches
+#   memory_budget : bytes of partial index the parent holds in memory; past it the
+#                   runs received so far are merged into one run spilled to disk
+def build_index_parallel(docs: Iterable[Tuple[int, str]],
+                         preprocess: Callable[[str], List[str]],
+                         workers: Optional[int] = None,
+                         memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                         positional: bool = True,
+                         biwords: bool = True,
+                         batch_size: int = DEFAULT_BATCH_SIZE,
+                         spill_dir: Optional[str] = None) -> Tuple[Dict[str, PostingList], Optional[BiwordIndex]]:
+    with tempfile.TemporaryDirectory(prefix='ir-spimi-', dir=spill_dir) as run_dir:
+        runs, _ = _invert_runs(docs, preprocess, workers, memory_budget, positional, biwords, batch_size, run_dir)
+        with metrics.stage('merge_runs'):
+            inverted_index, biword_index = _merge_runs(runs, positional)
+
+    return inverted_index, (biword_index if biwords else None)
+
+
+# Function to build the index with a process pool straight into an index file (see
+# ir_storage.write_index). The merged postings are encoded and written as the runs are
+# merged, so memory stays within the budget plus the term list and offset tables however
+# large the corpus. `doc_table` is read once `docs` is exhausted.
+def write_index_parallel(path: str,
+                         docs: Iterable[Tuple[int, str]],
+                         preprocess: Callable[[str], List[str]],
+                         doc_table: Dict[int, str],
+                         meta: Optional[Dict] = None,
+                         workers: Optional[int] = None,
+                         memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                         positional: bool = True,
+                         biwords: bool = True,
+                         batch_size: int = DEFAULT_BATCH_SIZE,
+                         spill_dir: Optional[str] = None) -> None:
+    with tempfile.TemporaryDirectory(prefix='ir-spimi-', dir=spill_dir) as run_dir:
+        runs, doc_lengths = _invert_runs(docs, preprocess, workers, memory_budget, positional, biwords,
+                                         batch_size, run_dir)
+        terms, biword_entries = _stream_runs(runs, positional, doc_lengths)
+        with metrics.stage('merge_runs'):
+            write_index(path, terms, doc_table, biword_entries if biwords else None,
+                        doc_lengths if positional else None, meta)
+
+
+# Function to invert a (small) set of documents in-process; same output as build_index_parallel
+def invert_documents(docs: Iterable[Tuple[int, str]],
+                     preprocess: Callable[[str], List[str]],
+                     positional: bool = True,
+                     biwords: bool = True) -> Tuple[Dict[str, PostingList], Optional[BiwordIndex]]:
+    run, _, _ = _invert_batch(list(docs), preprocess, positional, biwords)
+    inverted_index, biword_index = _merge_runs([run], positional)
+    return inverted_index, (biword_index if biwords else None)
@@ -0,0 +1,249 @@
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ir_metrics import metrics
+from ir_postings import PostingList, derived_cache
+
+# Phonetic term index: code -> vocabulary terms -> unioned posting list.
+# The code of every vocabulary term is computed once when the index is built,
+# so a phonetic lookup is one encoder call plus a dict lookup instead of a scan
+# over the whole vocabulary. Any str -> str encoder can be plugged in.
+
+VOWELS = set('AEIOU')
+
+
+# Function to handle Soundex matching
+def soundex(name: str) -> str:
+    name = name.upper()
+    if not name:
+        return ''
+    code = {'A': '', 'E': '', 'I': '', 'O': '', 'U': '', 'H': '', 'W': '', 'Y': '',
+            'B': '1', 'F': '1', 'P': '1', 'V': '1',
+            'C': '2', 'G': '2', 'J': '2', 'K': '2', 'Q': '2', 'S': '2', 'X': '2', 'Z': '2',
+            'D': '3', 'T': '3',
+            'L': '4',
+            'M': '5', 'N': '5',
+            'R': '6'}
+    result = name[0]
+    prev_code = code.get(name[0], '')
+
+    for char in name[1:]:
+        new_code = code.get(char, '')
+        if new_code and new_code != prev_code:
+            result += new_code
+        prev_code = new_code
+
+    result = result[:4].ljust(4, '0')
+    return result
+
+
+# Function to compute the NYSIIS code of a word (New York State Identification and Intelligence System)
+def nysiis(name: str) -> str:
+    word = ''.join(char for char in name.upper() if char.isalpha())
+    if not word:
+        return ''
+
+    for prefix, replacement in (('MAC', 'MCC'), ('KN', 'NN'), ('K', 'C'), ('PH', 'FF'), ('PF', 'FF'), ('SCH', 'SSS')):
+        if word.startswith(prefix):
+            word = replacement + word[len(prefix):]
+            break
+    for suffix, replacement in (('EE', 'Y'), ('IE', 'Y'), ('DT', 'D'), ('RT', 'D'), ('RD', 'D'), ('NT', 'D'), ('ND', 'D')):
+        if word.endswith(suffix):
+            word = word[:-len(suffix)] + replacement
+            break
+
+    key = word[0]
+    chars = list(word)
+    i = 1
+    while i < len(chars):
+        char = chars[i]
+        if char == 'E' and i + 1 < len(chars) and chars[i + 1] == 'V':
+            chars[i:i + 2] = ['A', 'F']
+        elif char in VOWELS:
+            chars[i] = 'A'
+        elif char == 'Q':
+            chars[i] = 'G'
+        elif char == 'Z':
+            chars[i] = 'S'
+        elif char == 'M':
+            chars[i] = 'N'
+        elif char == 'K':
+            if i + 1 < len(chars) and chars[i + 1] == 'N':
+                chars[i] = 'N'
+            else:
+                chars[i] = 'C'
+        elif char == 'S' and chars[i + 1:i + 3] == ['C', 'H']:
+            chars[i:i + 3] = ['S', 'S', 'S']
+        elif char == 'P' and i + 1 < len(chars) and chars[i + 1] == 'H':
+            chars[i:i + 2] = ['F', 'F']
+        elif char == 'H':
+            before = chars[i - 1]
+            after = chars[i + 1] if i + 1 < len(chars) else ''
+            if before not in VOWELS or (after and after not in VOWELS):
+                chars[i] = before
+        elif char == 'W' and chars[i - 1] in VOWELS:
+            chars[i] = chars[i - 1]
+        if chars[i] != key[-1]:
+            key += chars[i]
+        i += 1
+
+    if len(key) > 1 and key.endswith('S'):
+        key = key[:-1]
+    if key.endswith('AY'):
+        key = key[:-2] + 'Y'
+    if len(key) > 1 and key.endswith('A'):
+        key = key[:-1]
+    return key[:6]
+
+
+# Function to compute the (original, 1990) Metaphone code of a word
+def metaphone(name: str) -> str:
+    word = ''.join(char for char in name.upper() if char.isalpha())
+    if not word:
+        return ''
+
+    for prefix in ('AE', 'GN', 'KN', 'PN', 'WR'):
+        if word.startswith(prefix):
+            word = word[1:]
+            break
+    if word[0] == 'X':
+        word = 'S' + word[1:]
+    elif word.startswith('WH'):
+        word = 'W' + word[2:]
+
+    # Drop duplicate adjacent letters, except C
+    deduped = word[0]
+    for char in word[1:]:
+        if char != deduped[-1] or char == 'C':
+            deduped += char
+    word = deduped
+
+    def at(i: int) -> str:
+        return word[i] if 0 <= i < len(word) else ''
+
+    key = ''
+    for i, char in enumerate(word):
+        prev, nxt, after = at(i - 1), at(i + 1), at(i + 2)
+        if char in VOWELS:
+            if i == 0:
+                key += char
+        elif char == 'B':
+            if not (prev == 'M' and i == len(word) - 1):
+                key += 'B'
+        elif char == 'C':
+            if nxt == 'I' and after == 'A':
+                key += 'X'
+            elif nxt == 'H':
+                key += 'K' if prev == 'S' else 'X'
+            elif nxt in ('I', 'E', 'Y'):
+                if prev != 'S':
+                    key += 'S'
+            else:
+                key += 'K'
+        elif char == 'D':
+            key += 'J' if nxt == 'G' and after in ('E', 'Y', 'I') else 'T'
+        elif char == 'G':
+            if nxt == 'H' and not (i + 2 >= len(word) or after in VOWELS):
+                continue
+            if nxt == 'N' and (i + 2 == len(word) or word[i + 1:] == 'NED'):
+                continue
+            if nxt in ('I', 'E', 'Y') and prev != 'G':
+                key += 'J'
+            else:
+                key += 'K'
+        elif char == 'H':
+            if prev in ('C', 'S', 'P', 'T', 'G'):
+                continue
+            if prev in VOWELS and nxt not in VOWELS:
+                continue
+            key += 'H'
+        elif char == 'K':
+            if prev != 'C':
+                key += 'K'
+        elif char == 'P':
+            key += 'F' if nxt == 'H' else 'P'
+        elif char == 'Q':
+            key += 'K'
+        elif char == 'S':
+            if nxt == 'H' or (nxt == 'I' and after in ('O', 'A')):
+                key += 'X'
+            else:
+                key += 'S'
+        elif char == 'T':
+            if nxt == 'I' and after in ('O', 'A'):
+                key += 'X'
+            elif nxt == 'H':
+                key += '0'
+            elif not (nxt == 'C' and after == 'H'):
+                key += 'T'
+        elif char == 'V':
+            key += 'F'
+        elif char in ('W', 'Y'):
+            if nxt in VOWELS:
+                key += char
+        elif char == 'X':
+            key += 'KS'
+        elif char == 'Z':
+            key += 'S'
+        else:
+            key += char
+    return key
+
+
+PHONETIC_ENCODERS: Dict[str, Callable[[str], str]] = {
+    'soundex': soundex,
+    'metaphone': metaphone,
+    'nysiis': nysiis,
+}
+
+
+# Maps phonetic codes to vocabulary terms and caches the unioned posting list per code
+class PhoneticIndex:
+    def __init__(self, inverted_index, encoder: Callable[[str], str] = soundex,
+                 terms: Optional[Iterable[str]] = None):
+        self.inverted_index = inverted_index
+        self.encoder = encoder
+        self._codes: Dict[str, List[str]] = {}
+        self._postings: Dict[str, PostingList] = {}
+        for term in (inverted_index if terms is None else terms):
+            code = encoder(term)
+            if code:
+                self._codes.setdefault(code, []).append(term)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    # Function to list the vocabulary terms that share a word's phonetic code
+    def terms(self, word: str) -> List[str]:
+        return self._codes.get(self.encoder(word), [])
+
+    # Function to get the documents containing any term that sounds like `word`
+    def lookup(self, word: str) -> PostingList:
+        code = self.encoder(word)
+        postings = self._postings.get(code)
+        if postings is None:
+            with metrics.stage('phonetic_expand'):
+                postings = PostingList()
+                terms = self._codes.get(code, ())
+                for term in terms:
+                    postings = postings | self.inverted_index[term]
+                self._postings[code] = postings
+            metrics.count('phonetic_terms_expanded', len(terms))
+        metrics.count('phonetic_lookups')
+        return postings
+
+    # Function to union and cache the posting list of every code up front
+    def precompute(self) -> None:
+        for terms in self._codes.values():
+            self.lookup(terms[0])
+
+
+# Function to get (building once per index object when possible) the phonetic index of an index
+def phonetic_index_for(inverted_index, encoder: Callable[[str], str] = soundex) -> PhoneticIndex:
+    cache = derived_cache(inverted_index)
+    if cache is None:
+        # A plain dict has no attributes to keep the cache on; build a one-off index
+        return PhoneticIndex(inverted_index, encoder)
+    key = ('phonetic', encoder)
+    if key not in cache:
+        cache[key] = PhoneticIndex(inverted_index, encoder)
+    return cache[key]
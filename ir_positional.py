@@ -0,0 +1,153 @@
+import heapq
+from collections import deque
+from typing import Callable, List, Mapping, Optional, Sequence
+
+from ir_metrics import metrics
+from ir_postings import PostingList
+
+# Positional operators answered from the positional index alone.
+#
+# Candidate documents come from intersecting the terms' doc ID postings (rarest
+# first, using the skip tables); positions are then decoded only for those
+# candidates and joined with linear merges, so the cost depends on posting
+# sizes and never on document text or length.
+
+
+# Function to keep the positions p of `starts` for which p + offset occurs in `positions` (both sorted)
+def _offset_join(starts: List[int], positions: List[int], offset: int) -> List[int]:
+    result = []
+    i = j = 0
+    while i < len(starts) and j < len(positions):
+        target = starts[i] + offset
+        if positions[j] < target:
+            j += 1
+        elif positions[j] > target:
+            i += 1
+        else:
+            result.append(starts[i])
+            i += 1
+            j += 1
+    return result
+
+
+# Function to find the start positions of a phrase, given each phrase term's positions in one document
+def phrase_positions(position_lists: Sequence[List[int]]) -> List[int]:
+    if not position_lists:
+        return []
+    # Start from the rarest term, shifted back to the phrase start, and join the others onto it
+    order = sorted(range(len(position_lists)), key=lambda i: len(position_lists[i]))
+    first = order[0]
+    starts = [pos - first for pos in position_lists[first] if pos >= first]
+    for i in order[1:]:
+        if not starts:
+            break
+        starts = _offset_join(starts, position_lists[i], i)
+    return starts
+
+
+# Function to intersect the doc ID postings of some terms, smallest first
+def candidate_docs(terms: Sequence[str], inverted_index: Mapping[str, PostingList],
+                   candidates: Optional[PostingList] = None) -> PostingList:
+    postings = []
+    for term in set(terms):
+        if term not in inverted_index:
+            return PostingList()
+        postings.append(inverted_index[term])
+    postings.sort(key=len)
+    if candidates is not None:
+        postings.insert(0, candidates)
+    result = postings[0] if postings else PostingList()
+    for other in postings[1:]:
+        if not result:
+            break
+        result = result & other
+    return result
+
+
+# Function to find the documents containing the exact (preprocessed) phrase `terms`.
+#   candidates : optional pre-filter, e.g. the intersection of the phrase's biword postings
+def phrase_search(terms: Sequence[str], inverted_index: Mapping[str, PostingList],
+                  candidates: Optional[PostingList] = None) -> PostingList:
+    if not terms:
+        return PostingList()
+    with metrics.stage('candidates'):
+        docs = candidate_docs(terms, inverted_index, candidates)
+    if len(terms) == 1 or not docs:
+        return docs
+    return _verify(terms, inverted_index, docs, phrase_positions)
+
+
+# Function to keep the candidates whose per-term position lists satisfy `match`.
+# Positions are decoded for the candidate documents only, walking all terms in doc ID order.
+def _verify(terms: Sequence[str], inverted_index: Mapping[str, PostingList], docs: PostingList,
+            match: Callable[[List[List[int]]], object]) -> PostingList:
+    with metrics.stage('positional_join'):
+        streams = {term: inverted_index[term].positions_for(docs) for term in set(terms)}
+        matches = []
+        for doc_id in docs:
+            per_term = {term: next(stream)[1] for term, stream in streams.items()}
+            if match([per_term[term] for term in terms]):
+                matches.append(doc_id)
+    metrics.count('candidates_verified', len(docs))
+    return PostingList.from_sorted(matches)
+
+
+# Function to check whether one occurrence of every list lies within `distance` positions.
+# Unordered windows slide over the merged positions, ordered windows chain each list's next
+# occurrence after the previous one; both advance monotonically, so the cost is linear.
+def window_match(position_lists: Sequence[List[int]], distance: int, ordered: bool = False) -> bool:
+    if not position_lists or not all(position_lists):
+        return False
+    if len(position_lists) == 1:
+        return True
+
+    if ordered:
+        pointers = [0] * len(position_lists)
+        for start in position_lists[0]:
+            prev = start
+            for i in range(1, len(position_lists)):
+                positions = position_lists[i]
+                j = pointers[i]
+                while j < len(positions) and positions[j] <= prev:
+                    j += 1
+                pointers[i] = j
+                if j == len(positions):
+                    return False
+                prev = positions[j]
+                if prev - start > distance:
+                    break
+            else:
+                return True
+        return False
+
+    counts = [0] * len(position_lists)
+    covered = 0
+    window = deque()
+    for pos, i in heapq.merge(*([(pos, i) for pos in positions] for i, positions in enumerate(position_lists))):
+        window.append((pos, i))
+        counts[i] += 1
+        if counts[i] == 1:
+            covered += 1
+        while covered == len(position_lists):
+            first, k = window[0]
+            if pos - first <= distance:
+                return True
+            window.popleft()
+            counts[k] -= 1
+            if not counts[k]:
+                covered -= 1
+    return False
+
+
+# Function to find the documents where the (preprocessed) terms occur within `distance` positions
+# of each other (NEAR/k), in query order when `ordered`. Unordered windows need each distinct
+# term once; ordered windows need every listed occurrence, so "a ONEAR/3 a" asks for two a's.
+def near_search(terms: Sequence[str], inverted_index: Mapping[str, PostingList], distance: int,
+                ordered: bool = False, candidates: Optional[PostingList] = None) -> PostingList:
+    if not ordered:
+        terms = list(dict.fromkeys(terms))
+    with metrics.stage('candidates'):
+        docs = candidate_docs(terms, inverted_index, candidates)
+    if len(terms) < 2 or not docs:
+        return docs
+    return _verify(terms, inverted_index, docs, lambda lists: window_match(lists, distance, ordered))
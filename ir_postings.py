@@ -0,0 +1,549 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Set
+from heapq import merge
+from itertools import compress, repeat
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
+
+# Compressed posting lists.
+#
+# A posting list is a sorted run of doc IDs, split into blocks of BLOCK_SIZE.
+# Doc IDs are delta-encoded and written as variable-byte integers; positional
+# lists follow each block's doc IDs with (tf, position deltas...) per document.
+#
+#   header     : vbyte flags, doc count, block count
+#   skip table : vbyte (last doc ID delta, block byte length) per block
+#   blocks     : vbyte doc ID deltas [, tf and position deltas per doc]
+#
+# The skip table is decoded up front so that AND / NOT can jump straight to
+# the block that may hold a doc ID, decoding only the blocks they touch.
+#
+# Dense lists are combined as bitmaps instead: a Python int with bit i set for
+# doc ID i, so AND / OR / AND NOT run as single C-level word loops. A list is
+# dense when it holds more than one doc in DENSE_RATIO of its ID range (the
+# cut-off roaring bitmaps use, 4096 of 65536). Results of bitmap operations
+# stay bitmaps and only list their doc IDs when iterated. Conversions between
+# the two forms go through '0'/'1' digit strings so they also run in C (bin(),
+# int(..., 2), itertools.compress). A dense list keeps its bitmap once built,
+# so the live-document list of an index (its doc_ids) is converted only once
+# and every NOT after that is a single bitwise AND NOT.
+BLOCK_SIZE = 128
+
+DENSE_RATIO = 16
+
+FLAG_POSITIONS = 0x1
+
+# bin() digits -> 0/1 flags (present), or 1/0 flags (absent)
+_PRESENT = bytes.maketrans(b'01', b'\x00\x01')
+_ABSENT = bytes.maketrans(b'01', b'\x01\x00')
+
+# int.bit_count is Python 3.10+
+_popcount = getattr(int, 'bit_count', None) or (lambda bits: bin(bits).count('1'))
+
+
+# Function to append numbers to a buffer as variable-byte integers
+def vbyte_encode(numbers: Iterable[int], out: bytearray) -> bytearray:
+    for n in numbers:
+        while n >= 0x80:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+    return out
+
+
+# Function to decode `count` variable-byte integers starting at `pos`
+def vbyte_decode(data, pos: int, count: int) -> Tuple[List[int], int]:
+    values = []
+    n = 0
+    shift = 0
+    while len(values) < count:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(n)
+            n = 0
+            shift = 0
+    return values, pos
+
+
+# Function to delta-encode one block of doc IDs (and optionally their positions)
+def _encode_block(doc_ids, previous: int, positions: Optional[List[List[int]]]) -> bytearray:
+    out = bytearray()
+    deltas = []
+    for doc_id in doc_ids:
+        deltas.append(doc_id - previous)
+        previous = doc_id
+    vbyte_encode(deltas, out)
+    if positions is not None:
+        for doc_positions in positions:
+            last = 0
+            gaps = [len(doc_positions)]
+            for pos in doc_positions:
+                gaps.append(pos - last)
+                last = pos
+            vbyte_encode(gaps, out)
+    return out
+
+
+# Function to encode sorted doc IDs (and per-doc sorted positions) into the block format
+def encode_postings(doc_ids, positions: Optional[List[List[int]]] = None) -> bytes:
+    skip = bytearray()
+    blocks = []
+    previous = 0
+    for start in range(0, len(doc_ids), BLOCK_SIZE):
+        block_ids = doc_ids[start:start + BLOCK_SIZE]
+        block_positions = positions[start:start + BLOCK_SIZE] if positions is not None else None
+        block = _encode_block(block_ids, previous, block_positions)
+        vbyte_encode((block_ids[-1] - previous, len(block)), skip)
+        previous = block_ids[-1]
+        blocks.append(block)
+
+    flags = FLAG_POSITIONS if positions is not None else 0
+    header = vbyte_encode((flags, len(doc_ids), len(blocks)), bytearray())
+    return bytes(header + skip + b''.join(blocks))
+
+
+# Function to set one bit per doc ID (all IDs below `span`)
+def ids_to_bitmap(doc_ids: Iterable[int], span: int) -> int:
+    digits = bytearray(b'0') * span
+    deque(map(digits.__setitem__, doc_ids, repeat(0x31)), maxlen=0)
+    digits.reverse()
+    return int(digits, 2) if span else 0
+
+
+# Function to list the set bits of a bitmap in ascending order
+def bitmap_to_ids(bits: int) -> array:
+    flags = bin(bits)[:1:-1].encode('ascii').translate(_PRESENT)
+    return array('I', compress(range(len(flags)), flags))
+
+
+# Function to keep the sorted doc IDs whose bit is set in `bits` (or clear, when keep is False)
+def filter_by_bitmap(doc_ids: Iterable[int], last: int, bits: int, keep: bool = True) -> array:
+    if not isinstance(doc_ids, array):
+        doc_ids = array('I', doc_ids)
+    flags = bin(bits)[:1:-1].encode('ascii').translate(_PRESENT if keep else _ABSENT)
+    if len(flags) <= last:
+        flags += (b'\x00' if keep else b'\x01') * (last + 1 - len(flags))
+    return array('I', compress(doc_ids, map(flags.__getitem__, doc_ids)))
+
+
+# A sorted, compressed set of doc IDs with merge-based set operators
+class PostingList(Set):
+    __slots__ = ('_data', '_ids', '_n', '_block_last', '_block_start', '_bits')
+
+    # Wraps an encoded buffer (bytes or a memoryview over the index file)
+    def __init__(self, data=None):
+        self._data = data
+        self._ids = None
+        self._bits = None
+        if data is None:
+            self._n = 0
+            self._block_last = array('I')
+            self._block_start = array('Q')
+            return
+
+        (flags, n, block_count), pos = vbyte_decode(data, 0, 3)
+        skip, pos = vbyte_decode(data, pos, 2 * block_count)
+        block_last = array('I')
+        block_start = array('Q')
+        last = 0
+        for i in range(block_count):
+            last += skip[2 * i]
+            block_last.append(last)
+            block_start.append(pos)
+            pos += skip[2 * i + 1]
+        block_start.append(pos)
+        self._n = n
+        self._block_last = block_last
+        self._block_start = block_start
+
+    # Function to build an (uncompressed until needed) posting list from sorted unique doc IDs
+    @classmethod
+    def from_sorted(cls, doc_ids, compress: bool = False) -> 'PostingList':
+        if compress:
+            return PostingList(encode_postings(doc_ids))
+        plist = PostingList()
+        plist._set_ids(doc_ids if isinstance(doc_ids, array) else array('I', doc_ids))
+        return plist
+
+    # Function to wrap a bitmap (bit i set for doc ID i); the doc IDs are listed on first iteration
+    @classmethod
+    def from_bitmap(cls, bits: int, count: Optional[int] = None) -> 'PostingList':
+        plist = PostingList()
+        plist._bits = bits
+        plist._n = _popcount(bits) if count is None else count
+        return plist
+
+    def _set_ids(self, ids: array):
+        self._ids = ids
+        self._n = len(ids)
+        self._block_last = array('I', ids[BLOCK_SIZE - 1::BLOCK_SIZE])
+        if self._n % BLOCK_SIZE:
+            self._block_last.append(ids[-1])
+
+    # Function to list the doc IDs of a bitmap-only posting list, once
+    def _materialize(self):
+        if self._ids is None and self._data is None and self._n:
+            self._set_ids(bitmap_to_ids(self._bits))
+
+    @classmethod
+    def from_iterable(cls, doc_ids: Iterable[int], compress: bool = False) -> 'PostingList':
+        if isinstance(doc_ids, PostingList):
+            return doc_ids
+        return cls.from_sorted(sorted(set(doc_ids)), compress=compress)
+
+    # Used by the collections.abc.Set mixin methods (^, <=, ...)
+    @classmethod
+    def _from_iterable(cls, it: Iterable[int]) -> 'PostingList':
+        return PostingList.from_iterable(it)
+
+    # The encoded form, as written to disk
+    @property
+    def encoded(self) -> bytes:
+        if self._data is None:
+            self._materialize()
+            self._data = encode_postings(self._ids if self._ids is not None else [])
+        return bytes(self._data)
+
+    @property
+    def block_count(self) -> int:
+        self._materialize()
+        return len(self._block_last)
+
+    # Largest doc ID (-1 when empty)
+    @property
+    def last(self) -> int:
+        if self._ids is None and self._data is None:
+            return self._bits.bit_length() - 1 if self._bits else -1
+        return self._block_last[-1] if self._n else -1
+
+    # True when the list is (or already has) a bitmap, or covers more than 1 / DENSE_RATIO of its ID range
+    @property
+    def dense(self) -> bool:
+        return self._bits is not None or (self._n > 0 and self._n * DENSE_RATIO > self.last)
+
+    # The doc IDs as a bitmap; kept for dense lists so repeated operations reuse it
+    @property
+    def bits(self) -> int:
+        if self._bits is not None:
+            return self._bits
+        bits = ids_to_bitmap(self, self.last + 1)
+        if self.dense:
+            self._bits = bits
+        return bits
+
+    # Approximate memory held by the doc IDs (decoded array and/or encoded buffer) and skip table
+    @property
+    def nbytes(self) -> int:
+        size = self._block_last.itemsize * len(self._block_last)
+        if self._bits is not None:
+            size += (self._bits.bit_length() + 7) // 8
+        if self._ids is not None:
+            size += self._ids.itemsize * len(self._ids)
+        if self._data is not None:
+            size += len(self._data)
+        return size
+
+    # Function to decode the doc IDs of one block
+    def _block_docs(self, b: int) -> List[int]:
+        if self._ids is not None:
+            return self._ids[b * BLOCK_SIZE:(b + 1) * BLOCK_SIZE].tolist()
+        count = min(BLOCK_SIZE, self._n - b * BLOCK_SIZE)
+        deltas, _ = vbyte_decode(self._data, self._block_start[b], count)
+        doc_id = self._block_last[b - 1] if b else 0
+        docs = []
+        for delta in deltas:
+            doc_id += delta
+            docs.append(doc_id)
+        return docs
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __iter__(self) -> Iterator[int]:
+        self._materialize()
+        if self._ids is not None:
+            return iter(self._ids)
+        return (doc_id for b in range(self.block_count) for doc_id in self._block_docs(b))
+
+    def __contains__(self, doc_id) -> bool:
+        if not isinstance(doc_id, int):
+            return False
+        return _Cursor(self).seek(doc_id) == doc_id
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self)!r})"
+
+    def __reduce__(self):
+        if self._ids is None and self._data is None and self._n:
+            return (PostingList.from_bitmap, (self._bits, self._n))
+        return (PostingList.from_sorted, (array('I', self),))
+
+    # Intersection: bitwise for two dense lists, a bitmap probe for a sparse list against a bitmap,
+    # otherwise a merge in which blocks that cannot overlap are never decoded
+    def __and__(self, other) -> 'PostingList':
+        if not isinstance(other, PostingList):
+            if not isinstance(other, Iterable):
+                return NotImplemented
+            other = PostingList.from_iterable(other)
+        if self.dense and other.dense:
+            return PostingList.from_bitmap(self.bits & other.bits)
+        if self._bits is not None or other._bits is not None:
+            sparse, bitmap = (other, self) if self._bits is not None else (self, other)
+            return PostingList.from_sorted(filter_by_bitmap(sparse, sparse.last, bitmap._bits))
+        small, large = (self, other) if len(self) <= len(other) else (other, self)
+        cursor = _Cursor(large)
+        out = array('I')
+        for b in range(small.block_count):
+            target = cursor.seek(small._block_first_bound(b))
+            if target is None:
+                break
+            if target > small._block_last[b]:
+                continue
+            for doc_id in small._block_docs(b):
+                found = cursor.seek(doc_id)
+                if found is None:
+                    break
+                if found == doc_id:
+                    out.append(doc_id)
+        return PostingList.from_sorted(out)
+
+    __rand__ = __and__
+
+    def __or__(self, other) -> 'PostingList':
+        if not isinstance(other, PostingList):
+            if not isinstance(other, Iterable):
+                return NotImplemented
+            other = PostingList.from_iterable(other)
+        if (self.dense and other.dense) or self._bits is not None or other._bits is not None:
+            return PostingList.from_bitmap(self.bits | other.bits)
+        out = array('I')
+        last = -1
+        for doc_id in merge(self, other):
+            if doc_id != last:
+                out.append(doc_id)
+                last = doc_id
+        return PostingList.from_sorted(out)
+
+    __ror__ = __or__
+
+    # Difference (AND NOT): a dense list (e.g. every live document, for NOT) clears the other's bits,
+    # a sparse one is probed against a bitmap or merged
+    def __sub__(self, other) -> 'PostingList':
+        if not isinstance(other, PostingList):
+            if not isinstance(other, Iterable):
+                return NotImplemented
+            other = PostingList.from_iterable(other)
+        if self.dense:
+            return PostingList.from_bitmap(self.bits & ~other.bits)
+        if other._bits is not None:
+            return PostingList.from_sorted(filter_by_bitmap(self, self.last, other._bits, keep=False))
+        cursor = _Cursor(other)
+        out = array('I')
+        for b in range(self.block_count):
+            docs = self._block_docs(b)
+            for i, doc_id in enumerate(docs):
+                found = cursor.seek(doc_id)
+                if found is None:
+                    out.extend(docs[i:])
+                    break
+                if found != doc_id:
+                    out.append(doc_id)
+        return PostingList.from_sorted(out)
+
+    def __rsub__(self, other) -> 'PostingList':
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return PostingList.from_iterable(other) - self
+
+    def intersection(self, *others: Iterable[int]) -> 'PostingList':
+        result = self
+        for other in others:
+            result = result & other
+        return result
+
+    def union(self, *others: Iterable[int]) -> 'PostingList':
+        result = self
+        for other in others:
+            result = result | other
+        return result
+
+    def difference(self, *others: Iterable[int]) -> 'PostingList':
+        result = self
+        for other in others:
+            result = result - other
+        return result
+
+    # Smallest doc ID that block b can hold
+    def _block_first_bound(self, b: int) -> int:
+        return self._block_last[b - 1] + 1 if b else 0
+
+    # Function to get a forward-only cursor: seek(target) moves to the first doc ID >= target
+    def cursor(self) -> '_Cursor':
+        return _Cursor(self)
+
+
+# Forward-only cursor used by the merge operators; seeks via the skip table
+class _Cursor:
+    __slots__ = ('plist', 'block', 'docs', 'i')
+
+    def __init__(self, plist: PostingList):
+        plist._materialize()
+        self.plist = plist
+        self.block = -1
+        self.docs = []
+        self.i = 0
+
+    # Function to advance to the first doc ID >= target (None when exhausted)
+    def seek(self, target: int) -> Optional[int]:
+        docs = self.docs
+        if docs and docs[-1] >= target:
+            self.i = bisect_left(docs, target, self.i)
+            return docs[self.i]
+        b = bisect_left(self.plist._block_last, target, self.block + 1)
+        if b >= self.plist.block_count:
+            return None
+        self.block = b
+        self.docs = docs = self._load(b)
+        self.i = bisect_left(docs, target)
+        return docs[self.i]
+
+    def _load(self, b: int) -> List[int]:
+        return self.plist._block_docs(b)
+
+
+# Cursor over a positional list that also reports the term frequency of the doc ID it is on
+class _FrequencyCursor(_Cursor):
+    __slots__ = ('tfs',)
+
+    def __init__(self, plist: 'PositionalPostingList'):
+        super().__init__(plist)
+        self.tfs = []
+
+    def _load(self, b: int) -> List[int]:
+        docs, positions = self.plist._block_items(b)
+        self.tfs = [len(doc_positions) for doc_positions in positions]
+        return docs
+
+    @property
+    def tf(self) -> int:
+        return self.tfs[self.i]
+
+
+# A posting list that also stores term positions; indexable like {doc_id: [positions]}
+class PositionalPostingList(PostingList):
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, postings: Mapping[int, List[int]]) -> 'PositionalPostingList':
+        doc_ids = sorted(postings)
+        return PositionalPostingList(encode_postings(doc_ids, [sorted(postings[d]) for d in doc_ids]))
+
+    def __reduce__(self):
+        return (PositionalPostingList, (self.encoded,))
+
+    # Function to decode the doc IDs and position lists of one block
+    def _block_items(self, b: int) -> Tuple[List[int], List[List[int]]]:
+        count = min(BLOCK_SIZE, self._n - b * BLOCK_SIZE)
+        deltas, pos = vbyte_decode(self._data, self._block_start[b], count)
+        doc_id = self._block_last[b - 1] if b else 0
+        docs = []
+        for delta in deltas:
+            doc_id += delta
+            docs.append(doc_id)
+        positions = []
+        for _ in docs:
+            (tf,), pos = vbyte_decode(self._data, pos, 1)
+            gaps, pos = vbyte_decode(self._data, pos, tf)
+            last = 0
+            doc_positions = []
+            for gap in gaps:
+                last += gap
+                doc_positions.append(last)
+            positions.append(doc_positions)
+        return docs, positions
+
+    def __getitem__(self, doc_id: int) -> List[int]:
+        b = bisect_left(self._block_last, doc_id)
+        if b < self.block_count:
+            docs, positions = self._block_items(b)
+            i = bisect_left(docs, doc_id)
+            if i < len(docs) and docs[i] == doc_id:
+                return positions[i]
+        raise KeyError(doc_id)
+
+    def get(self, doc_id: int, default=None):
+        try:
+            return self[doc_id]
+        except KeyError:
+            return default
+
+    # Function to stream the positions of the given (ascending) doc IDs, decoding each block at most once
+    def positions_for(self, doc_ids: Iterable[int]) -> Iterator[Tuple[int, List[int]]]:
+        block = -1
+        docs: List[int] = []
+        positions: List[List[int]] = []
+        for doc_id in doc_ids:
+            b = bisect_left(self._block_last, doc_id)
+            if b >= self.block_count:
+                break
+            if b != block:
+                block = b
+                docs, positions = self._block_items(b)
+            i = bisect_left(docs, doc_id)
+            if i < len(docs) and docs[i] == doc_id:
+                yield doc_id, positions[i]
+
+    # Function to get a forward-only cursor that also reports term frequencies (cursor.tf)
+    def frequency_cursor(self) -> '_FrequencyCursor':
+        return _FrequencyCursor(self)
+
+    def keys(self) -> PostingList:
+        return self
+
+    def items(self) -> Iterator[Tuple[int, List[int]]]:
+        for b in range(self.block_count):
+            docs, positions = self._block_items(b)
+            yield from zip(docs, positions)
+
+    def values(self) -> Iterator[List[int]]:
+        for _, positions in self.items():
+            yield positions
+
+
+# Function to wrap an encoded buffer in the matching posting list type
+def decode_postings(data) -> PostingList:
+    (flags,), _ = vbyte_decode(data, 0, 1)
+    if flags & FLAG_POSITIONS:
+        return PositionalPostingList(data)
+    return PostingList(data)
+
+
+# The dict the index builders return: term -> posting list. Unlike a plain dict it can carry
+# attributes, so what is derived from an index (the phonetic index, the term dictionary) is
+# built once per index and kept on it. It is not meant to be modified once built.
+class InvertedIndex(dict):
+    pass
+
+
+# Function to get the cache of structures derived from an index, kept on the index object so it
+# lives exactly as long as the index; None for an index without attributes, such as a plain dict
+def derived_cache(index) -> Optional[dict]:
+    try:
+        return vars(index).setdefault('_derived', {})
+    except TypeError:
+        return None
+
+
+# Function to freeze {term: doc IDs} into compressed posting lists
+def compress_index(index: Mapping[str, Iterable[int]]) -> InvertedIndex:
+    return InvertedIndex((term, PostingList.from_iterable(doc_ids, compress=True)) for term, doc_ids in index.items())
+
+
+# Function to freeze {term: {doc_id: [positions]}} into compressed positional posting lists
+def compress_positional_index(index: Mapping[str, Mapping[int, List[int]]]) -> InvertedIndex:
+    return InvertedIndex((term, PositionalPostingList.from_dict(postings)) for term, postings in index.items())
@@ -0,0 +1,422 @@
+import re
+import sys
+from collections import namedtuple
+from operator import and_, or_, sub
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ir_metrics import metrics
+from ir_positional import near_search
+from ir_postings import PositionalPostingList, PostingList
+
+# Boolean query AST. Children of And / Or are tuples so nodes stay hashable.
+Term = namedtuple('Term', ['text'])
+Not = namedtuple('Not', ['child'])
+And = namedtuple('And', ['children'])
+Or = namedtuple('Or', ['children'])
+# Proximity: all terms within `distance` positions (NEAR/k), in query order when `ordered` (ONEAR/k)
+Near = namedtuple('Near', ['terms', 'distance', 'ordered'])
+
+OPERATORS = {'AND', 'OR', 'NOT'}
+
+_TOKEN_RE = re.compile(r'\(|\)|[^\s()]+')
+_PROXIMITY_RE = re.compile(r'(O?NEAR)/(\d+)', re.IGNORECASE)
+# Wildcard (goog*) and fuzzy (gogle~1) operands, expanded into several terms by ir_terms
+_EXPANSION_RE = re.compile(r'[*~]')
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+# Function to split a query into terms, operators and parentheses
+def tokenize_query(query: str) -> List[str]:
+    return _TOKEN_RE.findall(query)
+
+
+# Function to read a NEAR/k or ONEAR/k operator token as (distance, ordered), or None
+def _proximity_operator(token: Optional[str]) -> Optional[Tuple[int, bool]]:
+    match = _PROXIMITY_RE.fullmatch(token) if token is not None else None
+    if match is None:
+        return None
+    return int(match.group(2)), match.group(1).upper() == 'ONEAR'
+
+
+# Recursive-descent parser; precedence is NEAR > NOT > AND > OR.
+#   or_expr  := and_expr (OR and_expr)*
+#   and_expr := not_expr ((AND)? not_expr)*        "a NOT b" reads as "a AND NOT b"
+#   not_expr := NOT not_expr | '(' or_expr ')' | near
+#   near     := TERM (NEAR/k TERM)*                 one k and direction per chain
+class _Parser:
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.i = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def peek_operator(self) -> Optional[str]:
+        token = self.peek()
+        return token.upper() if token is not None and token.upper() in OPERATORS else None
+
+    def next(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise QuerySyntaxError("unexpected end of query")
+        self.i += 1
+        return token
+
+    def parse(self):
+        node = self.or_expr()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f"unexpected {self.peek()!r}")
+        return node
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.peek_operator() == 'OR':
+            self.next()
+            children.append(self.and_expr())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def and_expr(self):
+        children = [self.not_expr()]
+        while True:
+            operator = self.peek_operator()
+            token = self.peek()
+            if operator == 'AND':
+                self.next()
+            elif operator == 'OR' or token is None or token == ')':
+                break
+            # NOT, '(' or a bare term after an operand is an implicit AND
+            children.append(self.not_expr())
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def not_expr(self):
+        token = self.next()
+        operator = token.upper()
+        if operator == 'NOT':
+            return Not(self.not_expr())
+        if operator in OPERATORS or _proximity_operator(token):
+            raise QuerySyntaxError(f"operator {token!r} is missing an operand")
+        if token == '(':
+            node = self.or_expr()
+            if self.next() != ')':
+                raise QuerySyntaxError("expected ')'")
+            return node
+        if token == ')':
+            raise QuerySyntaxError("unbalanced ')'")
+        return self.near(token)
+
+    def near(self, token: str):
+        terms = [token]
+        proximity = None
+        while _proximity_operator(self.peek()):
+            operator = self.next()
+            if proximity is not None and _proximity_operator(operator) != proximity:
+                raise QuerySyntaxError(f"cannot chain {operator!r} with a different proximity operator")
+            proximity = _proximity_operator(operator)
+            term = self.next()
+            if term in ('(', ')') or term.upper() in OPERATORS or _proximity_operator(term):
+                raise QuerySyntaxError(f"operator {operator!r} needs a term on both sides")
+            terms.append(term)
+        if proximity is None:
+            return Term(token)
+        if any(_EXPANSION_RE.search(term) for term in terms):
+            raise QuerySyntaxError("wildcard and fuzzy terms cannot be used with NEAR/ONEAR")
+        return Near(tuple(terms), *proximity)
+
+
+# Function to parse a query string into an AST
+def parse_query(query: str):
+    tokens = tokenize_query(query)
+    if not tokens:
+        return None
+    return _Parser(tokens).parse()
+
+
+# Function to normalize an AST: push NOT down with De Morgan's laws, drop double
+# negation, flatten nested AND / OR into n-ary nodes and drop duplicate operands.
+# Inside a conjunction NOT (b AND c) stays whole when a sibling is positive: it is then one
+# difference, where De Morgan's NOT b OR NOT c would complement b and c against every document.
+def normalize(node, negate: bool = False):
+    if node is None:
+        return None
+    if isinstance(node, (Term, Near)):
+        return Not(node) if negate else node
+    if isinstance(node, Not):
+        return normalize(node.child, not negate)
+
+    # De Morgan: NOT (a AND b) == NOT a OR NOT b, NOT (a OR b) == NOT a AND NOT b
+    node_type = type(node)
+    if negate:
+        node_type = Or if node_type is And else And
+
+    children = []
+    negated_conjunctions = []
+
+    def add(child):
+        flattened = child.children if type(child) is node_type else (child,)
+        for grandchild in flattened:
+            if grandchild not in children:
+                children.append(grandchild)
+
+    for child in node.children:
+        inner, inner_negate = child, negate
+        while isinstance(inner, Not):
+            inner, inner_negate = inner.child, not inner_negate
+        if node_type is And and inner_negate and isinstance(inner, And):
+            negated_conjunctions.append(inner)
+        else:
+            add(normalize(inner, inner_negate))
+
+    if negated_conjunctions and not any(not isinstance(child, Not) for child in children):
+        # No positive operand to subtract from: the first one becomes NOT b OR NOT c
+        add(normalize(negated_conjunctions.pop(0), True))
+    for inner in negated_conjunctions:
+        inner = normalize(inner)
+        add(inner.child if isinstance(inner, Not) else Not(inner))
+    return children[0] if len(children) == 1 else node_type(tuple(children))
+
+
+# Function to order the operands of every AND / OR so that equivalent queries compare equal
+def canonical(node):
+    if isinstance(node, Not):
+        return Not(canonical(node.child))
+    if isinstance(node, (And, Or)):
+        return type(node)(tuple(sorted((canonical(child) for child in node.children), key=to_query_string)))
+    return node
+
+
+# Function to parse and normalize a query in one step
+def compile_query(query: str):
+    return normalize(parse_query(query))
+
+
+# Function to render an AST back into a fully parenthesized query string
+def to_query_string(node) -> str:
+    if node is None:
+        return ''
+    if isinstance(node, Term):
+        return node.text
+    if isinstance(node, Near):
+        operator = f" {'ONEAR' if node.ordered else 'NEAR'}/{node.distance} "
+        return '(' + operator.join(node.terms) + ')'
+    if isinstance(node, Not):
+        return f"NOT {to_query_string(node.child)}"
+    joiner = ' AND ' if isinstance(node, And) else ' OR '
+    return '(' + joiner.join(to_query_string(child) for child in node.children) + ')'
+
+
+# Size estimate of a complement whose document count is not known while planning
+UNKNOWN_SIZE = sys.maxsize
+
+
+# Evaluates normalized ASTs against posting lists.
+#   lookup   : term -> PostingList (the caller decides how terms are preprocessed)
+#   universe : () -> PostingList of every live doc ID; only used for pure negations
+#   doc_count: () -> number of live doc IDs when it is known without building the universe
+#              (else None); it bounds the plan's size estimates
+# NEAR nodes need positional postings from `lookup`.
+# Conjunctions are intersected smallest-first and NOT operands inside a
+# conjunction become differences, so "a AND NOT b" never touches the universe.
+# With a cache (an ir_cache.QueryCache already validated against the index), the results of
+# composite nodes, of the first pair of every conjunction and of the universe are reused.
+class QueryEvaluator:
+    def __init__(self, lookup: Callable[[str], PostingList], universe: Callable[[], PostingList],
+                 cache=None, doc_count: Optional[Callable[[], Optional[int]]] = None):
+        self._lookup = lookup
+        self._universe_fn = universe
+        self._doc_count = doc_count
+        self._universe = None
+        self._terms: Dict[str, PostingList] = {}
+        self.cache = cache
+
+    def postings(self, text: str) -> PostingList:
+        if text not in self._terms:
+            with metrics.stage('lookup'):
+                self._terms[text] = self._lookup(text)
+            metrics.count('terms_looked_up')
+            metrics.count('postings_touched', len(self._terms[text]))
+        return self._terms[text]
+
+    # Function to apply one set operation, timed and counted when metrics are enabled
+    def _apply(self, operator, left: PostingList, right: PostingList) -> PostingList:
+        if not metrics.enabled:
+            return operator(left, right)
+        with metrics.stage('set_algebra'):
+            result = operator(left, right)
+        metrics.count('postings_merged', len(left) + len(right))
+        metrics.observe('intermediate_size', len(result))
+        return result
+
+    def universe(self) -> PostingList:
+        if self._universe is None:
+            self._universe = self._cached(('universe',), self._universe_fn)
+        return self._universe
+
+    # Function to fetch a result from the cache, computing and storing it on a miss
+    def _cached(self, key, compute: Callable[[], PostingList]) -> PostingList:
+        if self.cache is None:
+            return compute()
+        result = self.cache.get(key)
+        if result is None:
+            result = compute()
+            self.cache.put(key, result)
+        return result
+
+    # Function to get the number of live documents if it is known without building the universe
+    def _known_doc_count(self) -> Optional[int]:
+        if self._universe is not None:
+            return len(self._universe)
+        return self._doc_count() if self._doc_count is not None else None
+
+    # Function to estimate the result size of a node from posting-list lengths. Planning never
+    # builds the universe: without a known document count a complement is UNKNOWN_SIZE.
+    def estimate(self, node) -> int:
+        if isinstance(node, Term):
+            return len(self.postings(node.text))
+        if isinstance(node, Near):
+            return min(len(self.postings(text)) for text in node.terms)
+        doc_count = self._known_doc_count()
+        if isinstance(node, Not):
+            if doc_count is None:
+                return UNKNOWN_SIZE
+            return max(doc_count - self.estimate(node.child), 0)
+        if isinstance(node, And):
+            positives = [self.estimate(c) for c in node.children if not isinstance(c, Not)]
+            if positives:
+                return min(positives)
+            if doc_count is None:
+                return UNKNOWN_SIZE
+            return max(doc_count - sum(self.estimate(c.child) for c in node.children), 0)
+        return min(sum(self.estimate(c) for c in node.children), UNKNOWN_SIZE if doc_count is None else doc_count)
+
+    def evaluate(self, node, trace: Optional[List[list]] = None, depth: int = 0) -> PostingList:
+        if node is None:
+            return PostingList()
+
+        entry = None
+        if trace is not None:
+            entry = [depth, _describe(node), self.estimate(node), None]
+            trace.append(entry)
+
+        key = None
+        if self.cache is not None and not isinstance(node, Term):
+            # Namedtuples compare as plain tuples (And(x) == Or(x)), so key on the rendered string
+            key = to_query_string(canonical(node))
+            result = self.cache.get(key)
+            if result is not None:
+                metrics.count('cache_hits')
+                if entry is not None:
+                    entry[1] += ' [cached]'
+                    entry[3] = len(result)
+                return result
+
+        if isinstance(node, Term):
+            result = self.postings(node.text)
+        elif isinstance(node, Near):
+            result = self._evaluate_near(node)
+        elif isinstance(node, Not):
+            result = self._apply(sub, self.universe(), self.evaluate(node.child, trace, depth + 1))
+        elif isinstance(node, Or):
+            # Union cost is linear in the inputs, so order only affects the intermediate sizes
+            result = PostingList()
+            for child in sorted(node.children, key=self.estimate):
+                result = self._apply(or_, result, self.evaluate(child, trace, depth + 1))
+        else:
+            result = self._evaluate_and(node, trace, depth)
+
+        if key is not None:
+            self.cache.put(key, result)
+        if entry is not None:
+            entry[3] = len(result)
+        return result
+
+    def _evaluate_near(self, node: Near) -> PostingList:
+        postings = {text: self.postings(text) for text in node.terms}
+        if not all(postings.values()):
+            return PostingList()
+        if not all(isinstance(p, PositionalPostingList) for p in postings.values()):
+            raise QuerySyntaxError(f"{to_query_string(node)} needs a positional index")
+        return near_search(node.terms, postings, node.distance, node.ordered)
+
+    def _evaluate_and(self, node: And, trace: Optional[List[list]], depth: int) -> PostingList:
+        positives = [c for c in node.children if not isinstance(c, Not)]
+        negatives = [c.child for c in node.children if isinstance(c, Not)]
+        positives.sort(key=self.estimate)
+        # Subtract the biggest exclusions first; they shrink the candidates the most
+        negatives.sort(key=self.estimate, reverse=True)
+
+        if len(positives) > 2 and self.cache is not None:
+            # Popular pairs recur inside longer conjunctions; evaluating the pair as its own
+            # node caches it and lets later queries start from the cached intersection
+            result = self.evaluate(And(tuple(positives[:2])), trace, depth + 1)
+            remaining = positives[2:]
+        elif positives:
+            result = self.evaluate(positives[0], trace, depth + 1)
+            remaining = positives[1:]
+        else:
+            # Only negations: NOT a AND NOT b == universe - (a OR b)
+            result = self.universe()
+            remaining = []
+            if trace is not None:
+                trace.append([depth + 1, 'UNIVERSE', len(result), len(result)])
+
+        for child in remaining:
+            if not result:
+                break
+            result = self._apply(and_, result, self.evaluate(child, trace, depth + 1))
+        for child in negatives:
+            if not result:
+                break
+            if trace is not None:
+                trace.append([depth + 1, 'DIFFERENCE', None, None])
+            result = self._apply(sub, result, self.evaluate(child, trace, depth + 2))
+        return result
+
+
+# Function to label a plan node for explain output
+def _describe(node) -> str:
+    if isinstance(node, Term):
+        return f"TERM {node.text!r}"
+    if isinstance(node, Near):
+        return f"{'ONEAR' if node.ordered else 'NEAR'}/{node.distance} {list(node.terms)!r} (positional window)"
+    if isinstance(node, Not):
+        return "NOT (complement against all documents)"
+    if isinstance(node, And):
+        return f"AND x{len(node.children)} (smallest first)"
+    return f"OR x{len(node.children)}"
+
+
+# Function to evaluate a query and describe the plan with estimated and actual sizes
+def explain_query(query: str, evaluator: QueryEvaluator) -> Tuple[PostingList, str]:
+    node = compile_query(query)
+    trace: List[list] = []
+    result = evaluator.evaluate(node, trace)
+    lines = [f"Query: {query}", f"Plan:  {to_query_string(node)}"]
+    for depth, label, estimated, actual in trace:
+        sizes = ''
+        if estimated is not None:
+            shown = actual if actual is not None else 'skipped'
+            guess = 'unknown' if estimated == UNKNOWN_SIZE else estimated
+            sizes = f"  (estimated {guess}, actual {shown})"
+        lines.append('  ' * (depth + 1) + label + sizes)
+    lines.append(f"Result: {len(result)} documents")
+    return result, '\n'.join(lines)
+
+
+# Function to count the doc IDs of an index when it stores them, or None (counting would need the union)
+def known_doc_count(index) -> Optional[int]:
+    doc_ids = getattr(index, 'doc_ids', None)
+    return None if doc_ids is None else len(doc_ids)
+
+
+# Function to get every doc ID an index knows about (stored doc table, or the union of postings)
+def all_doc_ids(index) -> PostingList:
+    doc_ids = getattr(index, 'doc_ids', None)
+    if doc_ids is not None:
+        return doc_ids
+    result = PostingList()
+    for postings in index.values():
+        result = result | postings
+    return result
@@ -0,0 +1,239 @@
+import heapq
+import math
+import weakref
+from array import array
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from ir_metrics import metrics
+from ir_postings import PositionalPostingList, PostingList
+from ir_query import QuerySyntaxError
+
+# Ranked retrieval: BM25 scores over the positional index, top k only.
+#
+# Term frequencies are the lengths of the stored position lists, and document
+# lengths (analyzed tokens per document) are written next to the postings when
+# the index is saved. For every term the index also stores the largest tf and
+# the shortest document among its postings. Since the BM25 term score grows
+# with tf and shrinks with document length, idf * f(max tf, min length) bounds
+# the score the term can add to any document, for any k1 and b.
+#
+# Evaluation is document-at-a-time with MaxScore pruning: terms are ordered by
+# upper bound, and once the k-th best score exceeds the summed bounds of the
+# weakest terms, those terms can no longer produce a top-k document on their
+# own. Candidates are then drawn only from the remaining (essential) terms,
+# and the weak terms are probed with skip-table seeks only while the candidate
+# can still make the top k. A boolean filter restricts the candidates.
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+DEFAULT_TOP_K = 10
+
+ScoredDoc = namedtuple('ScoredDoc', ['doc_id', 'score'])
+
+# Document lengths and per-term bounds of the collection
+CollectionStats = namedtuple('CollectionStats', ['doc_count', 'avg_length', 'lengths', 'bounds'])
+
+# Collection-wide figures that override an index's own when it is one shard of a larger collection,
+# so that every shard scores on the same scale
+GlobalStats = namedtuple('GlobalStats', ['doc_count', 'avg_length', 'document_frequencies'])
+
+
+# Function to compute document lengths and per-term (max tf, min document length) from positional postings
+def index_statistics(inverted_index: Mapping) -> Tuple[Dict[int, int], Dict[str, Tuple[int, int]]]:
+    lengths: Dict[int, int] = defaultdict(int)
+    for postings in inverted_index.values():
+        for doc_id, positions in postings.items():
+            lengths[doc_id] += len(positions)
+    bounds = {}
+    for term, postings in inverted_index.items():
+        max_tf = 0
+        min_length = None
+        for doc_id, positions in postings.items():
+            max_tf = max(max_tf, len(positions))
+            length = lengths[doc_id]
+            min_length = length if min_length is None else min(min_length, length)
+        bounds[term] = (max_tf, min_length or 0)
+    return dict(lengths), bounds
+
+
+_STATS_CACHE = weakref.WeakKeyDictionary()
+
+
+# Function to get the collection statistics of an index: stored ones for a MappedIndex,
+# otherwise computed from the postings (once per index object when it can be weakly referenced)
+def collection_stats(inverted_index) -> CollectionStats:
+    lengths = getattr(inverted_index, 'doc_lengths', None)
+    if lengths is not None:
+        return CollectionStats(inverted_index.doc_count, inverted_index.avg_doc_length, lengths,
+                               inverted_index.term_bounds)
+    try:
+        stats = _STATS_CACHE.get(inverted_index)
+    except TypeError:
+        stats = None
+    if stats is None:
+        lengths, bounds = index_statistics(inverted_index)
+        doc_table = getattr(inverted_index, 'doc_table', None)
+        doc_count = len(doc_table) if doc_table is not None else len(lengths)
+        avg_length = sum(lengths.values()) / doc_count if doc_count else 0.0
+        stats = CollectionStats(doc_count, avg_length, lengths, bounds.get)
+        try:
+            _STATS_CACHE[inverted_index] = stats
+        except TypeError:
+            pass
+    return stats
+
+
+# Function to report what a shard contributes to the GlobalStats of a query:
+# (document count, total document length, {term: document frequency})
+def term_statistics(terms: Iterable[str], inverted_index) -> Tuple[int, int, Dict[str, int]]:
+    stats = collection_stats(inverted_index)
+    frequencies = {}
+    for term in dict.fromkeys(terms):
+        postings = inverted_index.get(term)
+        frequencies[term] = len(postings) if postings else 0
+    return stats.doc_count, round(stats.avg_length * stats.doc_count), frequencies
+
+
+# Function to combine the term_statistics of every shard into GlobalStats
+def merge_statistics(parts: Iterable[Tuple[int, int, Dict[str, int]]]) -> GlobalStats:
+    doc_count = 0
+    total_length = 0
+    frequencies: Dict[str, int] = defaultdict(int)
+    for shard_docs, shard_length, shard_frequencies in parts:
+        doc_count += shard_docs
+        total_length += shard_length
+        for term, df in shard_frequencies.items():
+            frequencies[term] += df
+    return GlobalStats(doc_count, total_length / doc_count if doc_count else 0.0, dict(frequencies))
+
+
+# Function to merge per-shard top-k lists into the overall top k (ties to the smaller doc ID, as in top_k)
+def merge_top_k(results: Iterable[List[ScoredDoc]], k: int = DEFAULT_TOP_K) -> List[ScoredDoc]:
+    hits = (hit for result in results for hit in result)
+    return heapq.nsmallest(k, hits, key=lambda hit: (-hit.score, hit.doc_id))
+
+
+# Function to compute the BM25 inverse document frequency (never negative)
+def idf(doc_count: int, df: int) -> float:
+    return math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+
+# One query term during evaluation: its cursor, the doc ID it is on, its idf and score bound
+class _QueryTerm:
+    __slots__ = ('cursor', 'doc', 'idf', 'bound')
+
+    def __init__(self, postings: PositionalPostingList, term_idf: float, bound: float):
+        self.cursor = postings.frequency_cursor()
+        self.doc = self.cursor.seek(0)
+        self.idf = term_idf
+        self.bound = bound
+
+    def seek(self, target: int) -> Optional[int]:
+        if self.doc is not None and self.doc < target:
+            self.doc = self.cursor.seek(target)
+        return self.doc
+
+
+# Function to return the k best documents for the (already preprocessed) query terms by BM25,
+# optionally restricted to the documents of a boolean filter. A shard passes the GlobalStats of the
+# whole collection so its scores can be merged with the other shards'.
+def top_k(terms: Iterable[str], inverted_index, k: int = DEFAULT_TOP_K, doc_filter: Optional[PostingList] = None,
+          k1: float = DEFAULT_K1, b: float = DEFAULT_B, global_stats: Optional[GlobalStats] = None) -> List[ScoredDoc]:
+    if k <= 0:
+        return []
+    stats = collection_stats(inverted_index)
+    lengths = stats.lengths
+    doc_count = stats.doc_count
+    avg_length = stats.avg_length
+    if global_stats is not None:
+        doc_count = global_stats.doc_count
+        avg_length = global_stats.avg_length
+    avg_length = avg_length or 1.0
+
+    scoring = []
+    for term in dict.fromkeys(terms):
+        postings = inverted_index.get(term)
+        if not postings:
+            continue
+        if not isinstance(postings, PositionalPostingList):
+            raise QuerySyntaxError("ranked search needs a positional index")
+        df = len(postings)
+        if global_stats is not None:
+            df = global_stats.document_frequencies.get(term, df)
+        term_idf = idf(doc_count, df)
+        stored = stats.bounds(term)
+        if stored:
+            max_tf, min_length = stored
+            bound = term_idf * max_tf * (k1 + 1) / (max_tf + k1 * (1 - b + b * min_length / avg_length))
+        else:
+            bound = term_idf * (k1 + 1)
+        scoring.append(_QueryTerm(postings, term_idf, bound))
+    if not scoring:
+        return []
+
+    # Weakest terms first; prefix[i] is the most that scoring[0..i] can add together
+    scoring.sort(key=lambda query_term: query_term.bound)
+    prefix = []
+    total = 0.0
+    for query_term in scoring:
+        total += query_term.bound
+        prefix.append(total)
+
+    allowed = doc_filter.cursor() if doc_filter is not None else None
+    heap: List[Tuple[float, int]] = []
+    threshold = -1.0
+    first_essential = 0
+    scored = 0
+    while first_essential < len(scoring):
+        essential = scoring[first_essential:]
+        doc = min((query_term.doc for query_term in essential if query_term.doc is not None), default=None)
+        if doc is None:
+            break
+        if allowed is not None:
+            target = allowed.seek(doc)
+            if target is None:
+                break
+            if target != doc:
+                for query_term in essential:
+                    query_term.seek(target)
+                continue
+
+        norm = k1 * (1 - b + b * lengths[doc] / avg_length)
+        score = 0.0
+        for query_term in essential:
+            if query_term.doc == doc:
+                tf = query_term.cursor.tf
+                score += query_term.idf * tf * (k1 + 1) / (tf + norm)
+                query_term.seek(doc + 1)
+        # Probe the weak terms, strongest first, while the document can still make the top k
+        for i in range(first_essential - 1, -1, -1):
+            if score + prefix[i] <= threshold:
+                break
+            query_term = scoring[i]
+            if query_term.seek(doc) == doc:
+                tf = query_term.cursor.tf
+                score += query_term.idf * tf * (k1 + 1) / (tf + norm)
+        scored += 1
+
+        # Ties go to the smaller doc ID, which was seen first
+        if len(heap) < k:
+            heapq.heappush(heap, (score, -doc))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, -doc))
+        if len(heap) == k:
+            threshold = heap[0][0]
+            while first_essential < len(scoring) and prefix[first_essential] <= threshold:
+                first_essential += 1
+
+    metrics.count('documents_scored', scored)
+    return [ScoredDoc(-neg_doc, score) for score, neg_doc in sorted(heap, key=lambda e: (-e[0], -e[1]))]
+
+
+# Function to pack document lengths into an array indexed by doc ID (0 for missing IDs)
+def length_table(lengths: Mapping[int, int], doc_ids: Iterable[int] = ()) -> array:
+    size = max(max(lengths, default=0), max(doc_ids, default=0)) + 1
+    table = array('I', bytes(4 * size))
+    for doc_id, length in lengths.items():
+        table[doc_id] = length
+    return table
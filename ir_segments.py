@@ -0,0 +1,422 @@
+import json
+import math
+import os
+import threading
+from collections.abc import Mapping
+from heapq import merge
+from itertools import groupby
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ir_parallel import invert_documents
+from ir_postings import PositionalPostingList, PostingList, encode_postings
+from ir_storage import MappedIndex, save_index
+
+# Incremental indexing with immutable segments.
+#
+# New and updated documents are buffered and flushed into a new immutable
+# segment; deletions never touch a segment, they are recorded as tombstones
+# (deleted doc IDs per segment). A background thread merges segments of the
+# same size tier (log base `merge_factor` of their doc count) and segments that
+# are mostly tombstones into one compacted segment.
+#
+# Queries run against a snapshot(): an immutable view over the segment list
+# and tombstones at that instant, which behaves like the inverted index dict
+# (and exposes biword_index / doc_ids / doc_table), so boolean_search,
+# biword_search and proximity_search work on it unchanged while merges swap
+# segments underneath.
+#
+# The manifest (segment files, tombstones, next doc ID) is rewritten when the
+# segment list changes; a deletion in between is only appended to a tombstone
+# log, which is replayed on load and emptied by the next manifest write.
+
+MANIFEST = 'segments.json'
+TOMBSTONE_LOG = 'tombstones.log'
+
+DEFAULT_FLUSH_THRESHOLD = 1000
+DEFAULT_MERGE_FACTOR = 10
+
+# Merge a segment on its own once this fraction of its documents is deleted
+EXPUNGE_RATIO = 0.5
+
+
+# One immutable segment: inverted (and optional biword) index plus its doc table
+class Segment:
+    def __init__(self, seg_id: int, inverted_index, biword_index, doc_table: Dict[int, str],
+                 path: Optional[str] = None):
+        self.seg_id = seg_id
+        self.inverted_index = inverted_index
+        self.biword_index = biword_index
+        self.doc_table = doc_table
+        self.doc_ids = PostingList.from_iterable(doc_table)
+        self.path = path
+
+    @classmethod
+    def load(cls, seg_id: int, path: str) -> 'Segment':
+        index = MappedIndex(path)
+        return cls(seg_id, index, index.biword_index, index.doc_table, path)
+
+    def __len__(self) -> int:
+        return len(self.doc_table)
+
+
+# Function to merge one term's postings from several segments, dropping deleted docs
+def _merge_postings(parts: List[Tuple[PostingList, PostingList]]) -> PostingList:
+    if len(parts) == 1 and not parts[0][1]:
+        return parts[0][0]
+    if not any(isinstance(postings, PositionalPostingList) for postings, _ in parts):
+        result = PostingList()
+        for postings, deleted in parts:
+            result = result | (postings - deleted if deleted else postings)
+        return result
+
+    items = []
+    for postings, deleted in parts:
+        items.extend((doc_id, positions) for doc_id, positions in postings.items() if doc_id not in deleted)
+    items.sort()
+    return PositionalPostingList(encode_postings([doc_id for doc_id, _ in items],
+                                                 [positions for _, positions in items]))
+
+
+# Read-only view of one index kind (terms or biwords) across the segments of a snapshot
+class _SegmentView(Mapping):
+    def __init__(self, parts: List[Tuple[Mapping, PostingList]]):
+        self._parts = parts
+        self._cache: Dict[str, PostingList] = {}
+
+    def __getitem__(self, key: str) -> PostingList:
+        if key in self._cache:
+            return self._cache[key]
+        parts = [(index[key], deleted) for index, deleted in self._parts if key in index]
+        if not parts:
+            raise KeyError(key)
+        result = self._cache[key] = _merge_postings(parts)
+        return result
+
+    def __contains__(self, key) -> bool:
+        return any(key in index for index, _ in self._parts)
+
+    def __iter__(self) -> Iterator[str]:
+        keys = merge(*(sorted(index) for index, _ in self._parts))
+        return (key for key, _ in groupby(keys))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+# A consistent point-in-time view of a SegmentedIndex; usable anywhere an inverted index is
+class IndexSnapshot(_SegmentView):
+    def __init__(self, segments: Tuple[Segment, ...], deleted: Dict[int, PostingList], generation: int):
+        super().__init__([(segment.inverted_index, deleted[segment.seg_id]) for segment in segments])
+        self.segments = segments
+        self.generation = generation
+        self.doc_ids = PostingList()
+        self.doc_table = {}
+        for segment in segments:
+            self.doc_ids = self.doc_ids | (segment.doc_ids - deleted[segment.seg_id])
+            self.doc_table.update(segment.doc_table)
+        self.doc_table = {doc_id: self.doc_table[doc_id] for doc_id in self.doc_ids}
+        self.biword_index = None
+        if segments and all(segment.biword_index is not None for segment in segments):
+            self.biword_index = _SegmentView([(segment.biword_index, deleted[segment.seg_id])
+                                              for segment in segments])
+
+
+# An index that supports add / delete / update without a full rebuild.
+#   directory  : where segment files and the manifest are kept (None keeps segments in memory)
+#   preprocess : analyzer used to invert new documents, e.g. ir_assQ2.analyzer.analyze
+class SegmentedIndex:
+    def __init__(self, directory: Optional[str], preprocess: Callable[[str], List[str]],
+                 positional: bool = True, biwords: bool = True,
+                 flush_threshold: int = DEFAULT_FLUSH_THRESHOLD,
+                 merge_factor: int = DEFAULT_MERGE_FACTOR,
+                 background_merge: bool = True):
+        self.directory = directory
+        self.preprocess = preprocess
+        self.positional = positional
+        self.biwords = biwords
+        self.flush_threshold = flush_threshold
+        self.merge_factor = merge_factor
+
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._segments: Tuple[Segment, ...] = ()
+        self._deleted: Dict[int, PostingList] = {}
+        self._location: Dict[int, int] = {}  # doc ID -> segment ID holding its live copy
+        self._buffer: Dict[int, Tuple[str, str]] = {}  # doc ID -> (name, content) awaiting flush
+        self._next_segment = 1
+        # Doc IDs are handed out in increasing order and never reused, so a new document
+        # cannot pick up a tombstone left for a deleted one
+        self._next_doc_id = 1
+        self._tombstone_log = None
+        self.generation = 0
+        self._snapshot: Optional[IndexSnapshot] = None
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._load_manifest()
+
+        self._closed = False
+        self._dirty = False
+        self._wakeup = threading.Condition(self._lock)
+        self._merger = None
+        if background_merge:
+            self._merger = threading.Thread(target=self._merge_loop, name='segment-merger', daemon=True)
+            self._merger.start()
+
+    def _load_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+        segments = []
+        for entry in manifest['segments']:
+            segment = Segment.load(entry['id'], os.path.join(self.directory, entry['file']))
+            segments.append(segment)
+            self._deleted[segment.seg_id] = PostingList.from_iterable(entry['deleted'])
+            for doc_id in segment.doc_ids - self._deleted[segment.seg_id]:
+                self._location[doc_id] = segment.seg_id
+        self._segments = tuple(segments)
+        self._next_segment = manifest['next_segment']
+        self.generation = manifest['generation']
+        # Manifests written before next_doc_id was stored: continue after the largest ID seen
+        self._next_doc_id = manifest.get('next_doc_id') or max(
+            (max(segment.doc_table, default=0) for segment in segments), default=0) + 1
+        self._replay_tombstones()
+
+    # Function to apply the deletions logged since the manifest was last written
+    def _replay_tombstones(self):
+        path = os.path.join(self.directory, TOMBSTONE_LOG)
+        if not os.path.exists(path):
+            return
+        segment_ids = {segment.seg_id for segment in self._segments}
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) != 2:
+                    # A line cut short by a crash
+                    continue
+                seg_id, doc_id = map(int, fields)
+                # Tombstones of segments merged away since are already in the manifest
+                if seg_id in segment_ids and doc_id not in self._deleted[seg_id]:
+                    self._deleted[seg_id] = self._deleted[seg_id] | PostingList.from_sorted([doc_id])
+                    self._location.pop(doc_id, None)
+                    self.generation += 1
+
+    def _write_manifest(self):
+        if self.directory is None:
+            return
+        manifest = {
+            'generation': self.generation,
+            'next_segment': self._next_segment,
+            'next_doc_id': self._next_doc_id,
+            'segments': [{'id': segment.seg_id,
+                          'file': os.path.basename(segment.path),
+                          'deleted': list(self._deleted[segment.seg_id])}
+                         for segment in self._segments],
+        }
+        path = os.path.join(self.directory, MANIFEST)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, path)
+        # The manifest now holds every tombstone, so the log starts over
+        if self._tombstone_log is not None:
+            self._tombstone_log.seek(0)
+            self._tombstone_log.truncate()
+        elif os.path.exists(os.path.join(self.directory, TOMBSTONE_LOG)):
+            os.remove(os.path.join(self.directory, TOMBSTONE_LOG))
+
+    # Function to record one deletion without rewriting the manifest
+    def _log_tombstone(self, seg_id: int, doc_id: int):
+        if self.directory is None:
+            return
+        if self._tombstone_log is None:
+            self._tombstone_log = open(os.path.join(self.directory, TOMBSTONE_LOG), 'a', encoding='utf-8')
+        self._tombstone_log.write(f"{seg_id} {doc_id}\n")
+        self._tombstone_log.flush()
+
+    def _changed(self, write_manifest: bool = True):
+        self.generation += 1
+        self._snapshot = None
+        if write_manifest:
+            self._write_manifest()
+        self._dirty = True
+        self._wakeup.notify()
+
+    # Function to add a new document; returns its doc ID
+    def add_document(self, content: str, name: Optional[str] = None, doc_id: Optional[int] = None) -> int:
+        with self._lock:
+            if doc_id is None:
+                doc_id = self._next_doc_id
+            elif doc_id in self._location or doc_id in self._buffer:
+                raise ValueError(f"document {doc_id} already exists; use update_document")
+            self._next_doc_id = max(self._next_doc_id, doc_id + 1)
+            self._buffer[doc_id] = (name or str(doc_id), content)
+            if len(self._buffer) >= self.flush_threshold:
+                self.flush()
+            return doc_id
+
+    # Function to delete a document by recording a tombstone in the segment that holds it
+    def delete_document(self, doc_id: int) -> bool:
+        with self._lock:
+            if self._buffer.pop(doc_id, None) is not None:
+                return True
+            seg_id = self._location.pop(doc_id, None)
+            if seg_id is None:
+                return False
+            self._deleted[seg_id] = self._deleted[seg_id] | PostingList.from_sorted([doc_id])
+            self._log_tombstone(seg_id, doc_id)
+            self._changed(write_manifest=False)
+            return True
+
+    # Function to replace a document's content (tombstone the old copy, index the new one)
+    def update_document(self, doc_id: int, content: str, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                if doc_id in self._buffer:
+                    name = self._buffer[doc_id][0]
+                elif doc_id in self._location:
+                    name = self._segment(self._location[doc_id]).doc_table.get(doc_id)
+            self.delete_document(doc_id)
+            self.add_document(content, name, doc_id)
+
+    def _segment(self, seg_id: int) -> Segment:
+        return next(segment for segment in self._segments if segment.seg_id == seg_id)
+
+    def _allocate_segment_id(self) -> int:
+        with self._lock:
+            seg_id = self._next_segment
+            self._next_segment += 1
+            return seg_id
+
+    # Function to write a segment to disk (or keep it in memory) and return it
+    def _write_segment(self, seg_id: int, inverted_index, biword_index, doc_table: Dict[int, str]) -> Segment:
+        if self.directory is None:
+            return Segment(seg_id, inverted_index, biword_index, doc_table)
+        path = os.path.join(self.directory, f"seg-{seg_id:06d}.idx")
+        save_index(path, inverted_index, doc_table, biword_index, meta={'segment': seg_id})
+        return Segment.load(seg_id, path)
+
+    # Function to turn buffered documents into a new immutable segment
+    def flush(self) -> None:
+        with self._lock:
+            if not self._buffer:
+                return
+            buffer, self._buffer = self._buffer, {}
+            docs = ((doc_id, content) for doc_id, (_, content) in buffer.items())
+            inverted_index, biword_index = invert_documents(docs, self.preprocess, self.positional, self.biwords)
+            doc_table = {doc_id: name for doc_id, (name, _) in buffer.items()}
+            segment = self._write_segment(self._allocate_segment_id(), inverted_index, biword_index, doc_table)
+            self._segments = self._segments + (segment,)
+            self._deleted[segment.seg_id] = PostingList()
+            for doc_id in doc_table:
+                self._location[doc_id] = segment.seg_id
+            self._changed()
+
+    # Function to get a consistent view for queries (buffered documents are flushed first)
+    def snapshot(self) -> IndexSnapshot:
+        with self._lock:
+            self.flush()
+            if self._snapshot is None:
+                self._snapshot = IndexSnapshot(self._segments, dict(self._deleted), self.generation)
+            return self._snapshot
+
+    # Function to choose segments to merge: a full size tier, or a mostly-deleted segment
+    def _pick_merge(self) -> List[Segment]:
+        tiers: Dict[int, List[Segment]] = {}
+        for segment in self._segments:
+            live = len(segment) - len(self._deleted[segment.seg_id])
+            if len(segment) and live / len(segment) < 1 - EXPUNGE_RATIO:
+                return [segment]
+            tier = int(math.log(max(live, 1), self.merge_factor))
+            tiers.setdefault(tier, []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return tiers[tier][:self.merge_factor]
+        return []
+
+    # Function to merge segments into one compacted segment and atomically swap it in
+    def _merge(self, segments: List[Segment]) -> None:
+        with self._lock:
+            deleted_before = {segment.seg_id: self._deleted[segment.seg_id] for segment in segments}
+        # Build the merged segment outside the lock; queries and updates keep running
+        view = IndexSnapshot(tuple(segments), deleted_before, self.generation)
+        inverted_index = {term: view[term] for term in view}
+        biword_index = None
+        if view.biword_index is not None:
+            biword_index = {biword: view.biword_index[biword] for biword in view.biword_index}
+        inverted_index = {term: postings for term, postings in inverted_index.items() if postings}
+        if biword_index is not None:
+            biword_index = {biword: postings for biword, postings in biword_index.items() if postings}
+
+        merged = self._write_segment(self._allocate_segment_id(), inverted_index, biword_index, view.doc_table)
+
+        with self._lock:
+            # Carry over tombstones recorded while the merge was running
+            deleted = PostingList()
+            for segment in segments:
+                deleted = deleted | (self._deleted[segment.seg_id] - deleted_before[segment.seg_id])
+            merged_ids = {segment.seg_id for segment in segments}
+            position = min(i for i, segment in enumerate(self._segments) if segment.seg_id in merged_ids)
+            remaining = [segment for segment in self._segments if segment.seg_id not in merged_ids]
+            remaining.insert(position, merged)
+            self._segments = tuple(remaining)
+            self._deleted[merged.seg_id] = deleted
+            for doc_id in merged.doc_ids - deleted:
+                self._location[doc_id] = merged.seg_id
+            for seg_id in merged_ids:
+                del self._deleted[seg_id]
+            self._changed()
+
+        # Old files can go once the manifest no longer references them; open
+        # snapshots keep their mmaps alive until they are released
+        for segment in segments:
+            if segment.path is not None:
+                try:
+                    os.remove(segment.path)
+                except OSError:
+                    pass
+
+    # Function to run merges until the policy is satisfied
+    def maybe_merge(self) -> int:
+        merges = 0
+        with self._merge_lock:
+            while True:
+                with self._lock:
+                    segments = self._pick_merge()
+                if not segments:
+                    return merges
+                self._merge(segments)
+                merges += 1
+
+    # Function to merge everything down to a single segment
+    def force_merge(self) -> None:
+        with self._merge_lock:
+            with self._lock:
+                self.flush()
+                segments = list(self._segments)
+            if len(segments) > 1 or any(self._deleted[segment.seg_id] for segment in segments):
+                self._merge(segments)
+
+    def _merge_loop(self):
+        while True:
+            with self._lock:
+                while not self._dirty and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                self._dirty = False
+            self.maybe_merge()
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._closed = True
+            self._wakeup.notify()
+        if self._merger is not None:
+            self._merger.join()
+        with self._lock:
+            if self._tombstone_log is not None:
+                self._tombstone_log.close()
+                self._tombstone_log = None
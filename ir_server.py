@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import ir_assQ2
+from ir_analysis import LEMMATIZERS, TOKENIZERS
+from ir_batch import percentile
+from ir_engine import QUERY_TYPES, SearchEngine, init_worker, worker_engine
+from ir_metrics import brief, metrics
+from ir_phonetic import PHONETIC_ENCODERS
+from ir_query import QuerySyntaxError
+from ir_shards import DEFAULT_SHARD_TIMEOUT, ShardedEngine, ShardTimeoutError
+
+# Local HTTP/JSON query server over one shared, loaded index.
+#
+# The asyncio event loop only parses requests and writes responses; every query is
+# evaluated on a thread or process pool. At most `max_pending` queries may be queued
+# or running at a time; further requests are refused with 503 instead of piling up.
+#
+#   POST /search  {"type": "boolean", "query": "google AND NOT yahoo", "offset": 0, "limit": 10}
+#                 (proximity queries may add "distance" and "ordered")
+#   GET  /health  liveness
+#   GET  /stats   request counters and per-type latency percentiles
+
+DEFAULT_PORT = 8080
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 1000
+MAX_BODY_SIZE = 64 * 1024
+LATENCY_WINDOW = 10_000
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# Function to evaluate a search request and cut out the requested page (runs on the pool)
+def evaluate_page(engine: Optional[SearchEngine], request: dict) -> dict:
+    engine = engine or worker_engine()
+    start = time.perf_counter()
+    with metrics.query(request['type'], request['query']) as stats:
+        result = engine.search(request['type'], request['query'], request.get('distance'),
+                               bool(request.get('ordered', False)))
+    doc_ids = list(result)
+    offset, limit = request['offset'], request['limit']
+    page = doc_ids[offset:offset + limit]
+    response = {
+        'count': len(doc_ids),
+        'offset': offset,
+        'limit': limit,
+        'results': [{'doc_id': doc_id, 'name': engine.name(doc_id)} for doc_id in page],
+        'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+    }
+    if stats is not None:
+        response['metrics'] = brief(stats)
+    return response
+
+
+# Function to validate a /search body and fill in paging defaults
+def _parse_search(body: bytes) -> dict:
+    try:
+        request = json.loads(body or b'{}')
+    except ValueError as error:
+        raise HTTPError(400, f"invalid JSON: {error}")
+    if not isinstance(request, dict):
+        raise HTTPError(400, "request body must be a JSON object")
+    request.setdefault('type', 'boolean')
+    if request['type'] not in QUERY_TYPES:
+        raise HTTPError(400, f"unknown query type {request['type']!r}, expected one of {QUERY_TYPES}")
+    if not isinstance(request.get('query'), str):
+        raise HTTPError(400, "'query' must be a string")
+    try:
+        request['offset'] = max(int(request.get('offset', 0)), 0)
+        request['limit'] = min(max(int(request.get('limit', DEFAULT_PAGE_SIZE)), 0), MAX_PAGE_SIZE)
+        if request.get('distance') is not None:
+            request['distance'] = int(request['distance'])
+    except (TypeError, ValueError):
+        raise HTTPError(400, "'offset', 'limit' and 'distance' must be integers")
+    return request
+
+
+class QueryServer:
+    def __init__(self, engine: SearchEngine, executor: Executor, in_process: bool = True,
+                 max_pending: int = 64, timeout: float = 5.0):
+        self.engine = engine
+        self.executor = executor
+        # Thread pools share self.engine; process-pool workers use their own (see init_worker)
+        self.in_process = in_process
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.started = time.time()
+        self.counters: Counter = Counter()
+        self.latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except HTTPError as error:
+                    await self._respond(writer, error.status, {'error': str(error)}, False)
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                status, payload = await self._dispatch(method, path, body)
+                await self._respond(writer, status, payload, keep_alive)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "request headers too large")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, f"request body over {MAX_BODY_SIZE} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), urlsplit(target).path, headers, body
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        self.counters['requests'] += 1
+        try:
+            if path == '/health':
+                return 200, {'status': 'ok'}
+            if path == '/stats':
+                return 200, self.stats()
+            if path != '/search':
+                raise HTTPError(404, f"no such endpoint {path!r}")
+            if method != 'POST':
+                raise HTTPError(405, "use POST for /search")
+            return 200, await self.search(_parse_search(body))
+        except HTTPError as error:
+            self.counters[f'status_{error.status}'] += 1
+            return error.status, {'error': str(error)}
+        except Exception as error:
+            self.counters['status_500'] += 1
+            return 500, {'error': f"{type(error).__name__}: {error}"}
+
+    # Function to run one search on the pool, refusing work when too much is already pending
+    async def search(self, request: dict) -> dict:
+        if self.pending >= self.max_pending:
+            self.counters['rejected'] += 1
+            raise HTTPError(503, "server busy, retry later")
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        task = self.executor.submit(evaluate_page, self.engine if self.in_process else None, request)
+        # A query that times out still occupies its worker, so it stays pending until it really ends
+        task.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(task), self.timeout)
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            raise HTTPError(504, f"query exceeded {self.timeout}s")
+        except QuerySyntaxError as error:
+            self.counters['errors'] += 1
+            raise HTTPError(400, str(error))
+        except ShardTimeoutError as error:
+            self.counters['shard_timeouts'] += 1
+            raise HTTPError(504, str(error))
+        self.counters['searches'] += 1
+        self.latencies[request['type']].append(response['latency_ms'])
+        if not self.in_process and 'metrics' in response:
+            metrics.absorb(response['metrics'])
+        return response
+
+    def _release(self):
+        self.pending -= 1
+
+    def stats(self) -> dict:
+        by_type = {}
+        for query_type, window in self.latencies.items():
+            values = sorted(window)
+            by_type[query_type] = {'count': len(values), 'p50_ms': percentile(values, 0.50),
+                                   'p95_ms': percentile(values, 0.95), 'p99_ms': percentile(values, 0.99)}
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'documents': len(self.engine.doc_table),
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'counters': dict(self.counters),
+            'latency': by_type,
+            # Only meaningful for the thread pool; process workers keep their own caches
+            'cache': ir_assQ2.query_cache.stats(),
+            **({'metrics': metrics.dump()} if metrics.enabled else {}),
+        }
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload).encode('utf-8')
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                'Content-Type: application/json',
+                f'Content-Length: {len(body)}',
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append('Retry-After: 1')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+# Function to serve the index until cancelled
+async def serve(server: QueryServer, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+    listener = await asyncio.start_server(server.handle, host, port)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve boolean, phrase, proximity and soundex queries over HTTP")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to bind (default: localhost only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--pool', choices=('thread', 'process'), default='thread',
+                        help="where queries are evaluated")
+    parser.add_argument('--workers', type=int, default=4, help="pool size")
+    parser.add_argument('--max-pending', type=int, default=64,
+                        help="queued or running queries before new ones are refused with 503")
+    parser.add_argument('--timeout', type=float, default=5.0, help="seconds before a query answers 504")
+    parser.add_argument('--corpus', default='Corpus.zip', help="corpus to index: .zip, .tar(.gz) or a directory")
+    parser.add_argument('--index', default=None, help="on-disk index file (default: <corpus>.q2.idx)")
+    parser.add_argument('--rebuild', action='store_true', help="ignore the stored index and rebuild it")
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default=None,
+                        help="nltk word_tokenize, or the faster regex tokenizer")
+    parser.add_argument('--lemmatizer', choices=LEMMATIZERS, default=None,
+                        help="WordNet lemmatization, or none (WordNet is then never loaded)")
+    parser.add_argument('--phonetic', choices=sorted(PHONETIC_ENCODERS), default='soundex',
+                        help="phonetic encoder used by soundex queries")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="split the index into this many shards, each queried by its own process")
+    parser.add_argument('--shard-timeout', type=float, default=DEFAULT_SHARD_TIMEOUT,
+                        help="seconds to wait for each shard before the query answers 504")
+    parser.add_argument('--metrics', action='store_true',
+                        help="add per-stage timings and counters to each response and to /stats")
+    args = parser.parse_args(argv)
+    if args.shards and args.pool == 'process':
+        parser.error("--shards already runs the shards in processes; use --pool thread")
+    if args.metrics:
+        metrics.enable()
+
+    engine_options = {'corpus_path': args.corpus, 'index_path': args.index, 'rebuild': args.rebuild,
+                      'tokenizer': args.tokenizer, 'lemmatizer': args.lemmatizer, 'phonetic': args.phonetic}
+    if args.shards:
+        engine = ShardedEngine.open(args.corpus, args.shards, rebuild=args.rebuild, tokenizer=args.tokenizer,
+                                    phonetic=args.phonetic, timeout=args.shard_timeout, lemmatizer=args.lemmatizer)
+    else:
+        engine = SearchEngine.open(**engine_options)
+    if args.pool == 'process':
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                       initargs=(dict(engine_options, metrics=args.metrics),))
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+
+    server = QueryServer(engine, executor, args.pool == 'thread', args.max_pending, args.timeout)
+    print(f"Serving {len(engine.doc_table)} documents on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if args.shards:
+            engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import groupby
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import ir_assQ2
+from ir_analysis import LEMMATIZERS, TOKENIZERS, Analyzer
+from ir_corpus import count_documents
+from ir_engine import QUERY_TYPES, SearchEngine, configure_analyzer
+from ir_metrics import metrics
+from ir_parallel import DEFAULT_MEMORY_BUDGET, parse_size, write_index_parallel
+from ir_phonetic import PHONETIC_ENCODERS
+from ir_postings import PostingList
+from ir_query import QuerySyntaxError
+from ir_ranking import DEFAULT_TOP_K, GlobalStats, ScoredDoc, merge_statistics, merge_top_k, term_statistics
+from ir_storage import MappedIndex, corpus_fingerprint, load_index, save_index
+
+# Sharded index with scatter-gather query execution.
+#
+# The corpus is split into contiguous doc-ID ranges, and every shard is a complete index of
+# its range (inverted, positional and biword postings, ranking statistics) in its own file,
+# <corpus>.shard<i>of<n>.idx. Each shard is owned by one worker process, so shards evaluate
+# queries in parallel without sharing a GIL. The coordinator sends every query to all shards
+# and merges the answers: doc IDs are global and the ranges ascend, so per-shard results are
+# simply concatenated, and ranked queries merge the per-shard top k. BM25 needs collection-wide
+# document frequencies, which the coordinator gathers from the shards first.
+#
+# A shard that does not answer within the timeout fails the query (ShardTimeoutError), or is
+# left out of the result when partial results are allowed. It keeps working on the query,
+# and later queries to that shard queue behind it. A crashed shard process is restarted.
+
+DEFAULT_SHARDS = 4
+DEFAULT_SHARD_TIMEOUT = 5.0
+
+
+class ShardTimeoutError(Exception):
+    def __init__(self, shards: List[int]):
+        super().__init__(f"shard(s) {', '.join(map(str, shards))} did not answer in time")
+        self.shards = shards
+
+
+# Function to split doc IDs 1..doc_count into `shard_count` contiguous (first, last) ranges
+def shard_ranges(doc_count: int, shard_count: int) -> List[Tuple[int, int]]:
+    return [(i * doc_count // shard_count + 1, (i + 1) * doc_count // shard_count) for i in range(shard_count)]
+
+
+# Function to name the index files of the shards of a corpus
+def shard_paths(corpus_path: str, shard_count: int, index_dir: Optional[str] = None) -> List[str]:
+    base = os.path.splitext(corpus_path)[0]
+    if index_dir is not None:
+        base = os.path.join(index_dir, os.path.basename(base))
+    return [f"{base}.shard{i + 1}of{shard_count}.idx" for i in range(shard_count)]
+
+
+# Function to index the corpus into one file per shard, in a single pass over the documents
+def build_shards(corpus_path: str, paths: List[str], workers: int = 1,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+    fingerprint = corpus_fingerprint(corpus_path)
+    ranges = shard_ranges(count_documents(corpus_path), len(paths))
+    lasts = [last for _, last in ranges]
+    doc_members: Dict[int, str] = {}
+    documents = ir_assQ2.iter_documents(corpus_path, doc_members)
+
+    def save(shard: int, contents: Iterable[Tuple[int, str]]):
+        doc_table: Dict[int, str] = {}
+
+        def listed():
+            # Only this shard's documents: iter_documents may already have listed the next one
+            for doc_id, content in contents:
+                doc_table[doc_id] = doc_members.pop(doc_id)
+                yield doc_id, content
+
+        meta = {'analyzer': ir_assQ2.analyzer.tag, 'corpus': fingerprint, 'shard': [shard, len(paths)]}
+        with metrics.stage('index_build'):
+            if workers > 1:
+                write_index_parallel(paths[shard], listed(), ir_assQ2.analyzer.analyze, doc_table, meta,
+                                     workers, memory_budget,
+                                     spill_dir=os.path.dirname(os.path.abspath(paths[shard])))
+            else:
+                inverted_index, biword_index = ir_assQ2.build_inverted_index(listed())
+                with metrics.stage('index_save'):
+                    save_index(paths[shard], inverted_index, doc_table, biword_index, meta=meta)
+
+    built = set()
+    for shard, contents in groupby(documents, key=lambda document: bisect_left(lasts, document[0])):
+        save(shard, contents)
+        built.add(shard)
+    # Ranges without any non-empty document still get an (empty) index
+    for shard in range(len(paths)):
+        if shard not in built:
+            save(shard, iter(()))
+
+
+# Function to get the shard index files of a corpus, rebuilding them all unless every one is current
+def open_shards(corpus_path: str, shard_count: int = DEFAULT_SHARDS, index_dir: Optional[str] = None,
+                rebuild: bool = False, workers: int = 1, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> List[str]:
+    paths = shard_paths(corpus_path, shard_count, index_dir)
+    if not rebuild:
+        with metrics.stage('index_load'):
+            current = True
+            for shard, path in enumerate(paths):
+                index = load_index(path, corpus_path, ir_assQ2.analyzer.tag)
+                if index is None or index.meta.get('shard') != [shard, shard_count]:
+                    current = False
+                    break
+        if current:
+            return paths
+    build_shards(corpus_path, paths, workers, memory_budget)
+    return paths
+
+
+# Engine of a shard worker process, opened once per process by _init_shard
+_shard_engine: Optional[SearchEngine] = None
+
+
+# The worker gets the coordinator's whole Analyzer (tokenizer, lemmatizer, lemma POS), so
+# shard queries are analyzed exactly like the coordinator's and like the indexed documents.
+def _init_shard(path: str, analyzer: Analyzer, phonetic: str):
+    global _shard_engine
+    ir_assQ2.analyzer = analyzer
+    _shard_engine = SearchEngine(MappedIndex(path), phonetic)
+
+
+def _shard_search(query_type: str, query: str, distance: Optional[int], ordered: bool) -> PostingList:
+    return _shard_engine.search(query_type, query, distance, ordered)
+
+
+def _shard_term_statistics(terms: List[str]) -> Tuple[int, int, Dict[str, int]]:
+    return term_statistics(terms, _shard_engine.inverted_index)
+
+
+def _shard_ranked(query: str, k: int, boolean_filter: Optional[str], global_stats: GlobalStats) -> List[ScoredDoc]:
+    return ir_assQ2.ranked_search(query, _shard_engine.inverted_index, k, boolean_filter, global_stats)
+
+
+# Coordinator over the shard worker processes; answers the same queries as SearchEngine
+class ShardedEngine:
+    def __init__(self, paths: List[str], tokenizer: Optional[str] = None, phonetic: str = 'soundex',
+                 timeout: float = DEFAULT_SHARD_TIMEOUT, partial: bool = False, lemmatizer: Optional[str] = None):
+        self.paths = paths
+        self.timeout = timeout
+        self.partial = partial
+        configure_analyzer(tokenizer, lemmatizer)
+        self._initargs = [(path, ir_assQ2.analyzer, phonetic) for path in paths]
+        self.doc_table: Dict[int, str] = {}
+        for path in paths:
+            self.doc_table.update(MappedIndex(path).doc_table)
+        self._lock = threading.Lock()
+        self._executors = [self._start(shard) for shard in range(len(paths))]
+
+    # Function to open (building if needed) the shards of a corpus and start their workers
+    @classmethod
+    def open(cls, corpus_path: str = 'Corpus.zip', shard_count: int = DEFAULT_SHARDS,
+             index_dir: Optional[str] = None, rebuild: bool = False, workers: int = 1,
+             memory_budget: int = DEFAULT_MEMORY_BUDGET, tokenizer: Optional[str] = None,
+             phonetic: str = 'soundex', timeout: float = DEFAULT_SHARD_TIMEOUT,
+             partial: bool = False, lemmatizer: Optional[str] = None) -> 'ShardedEngine':
+        configure_analyzer(tokenizer, lemmatizer)
+        paths = open_shards(corpus_path, shard_count, index_dir, rebuild, workers, memory_budget)
+        return cls(paths, phonetic=phonetic, timeout=timeout, partial=partial)
+
+    def _start(self, shard: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, initializer=_init_shard, initargs=self._initargs[shard])
+
+    def _restart(self, shard: int, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executors[shard] is broken:
+                self._executors[shard] = self._start(shard)
+                broken.shutdown(wait=False)
+                metrics.count('shard_restarts')
+
+    def _submit(self, shard: int, fn: Callable, *args):
+        executor = self._executors[shard]
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._restart(shard, executor)
+            return self._executors[shard].submit(fn, *args)
+
+    # Function to run `fn` on every shard and collect the answers in shard order. Shards that
+    # time out or crash are left out when partial results are allowed; otherwise the query fails.
+    def _gather(self, fn: Callable, *args) -> list:
+        with metrics.stage('scatter_gather'):
+            executors = list(self._executors)
+            futures = [self._submit(shard, fn, *args) for shard in range(len(executors))]
+            done, _ = wait(futures, timeout=self.timeout)
+        results = []
+        missing = []
+        for shard, future in enumerate(futures):
+            if future not in done:
+                future.cancel()
+                missing.append(shard)
+                continue
+            try:
+                results.append(future.result())
+            except BrokenProcessPool:
+                self._restart(shard, executors[shard])
+                missing.append(shard)
+        if missing:
+            metrics.count('shard_timeouts', len(missing))
+            if not self.partial:
+                raise ShardTimeoutError(missing)
+        return results
+
+    # Function to answer one boolean, phrase, proximity or soundex query (see SearchEngine.search)
+    def search(self, query_type: str, query: str, distance: Optional[int] = None,
+               ordered: bool = False) -> PostingList:
+        if query_type not in QUERY_TYPES:
+            raise QuerySyntaxError(f"unknown query type {query_type!r}, expected one of {QUERY_TYPES}")
+        doc_ids = array('I')
+        # Shards own ascending doc-ID ranges, so their sorted results concatenate in order
+        for result in self._gather(_shard_search, query_type, query, distance, ordered):
+            doc_ids.extend(result)
+        return PostingList.from_sorted(doc_ids)
+
+    # Function to return the k best documents by BM25 over all shards, scored with
+    # collection-wide statistics, optionally restricted by a boolean filter
+    def ranked(self, query: str, k: int = DEFAULT_TOP_K, boolean_filter: Optional[str] = None) -> List[ScoredDoc]:
+        terms = ir_assQ2.preprocess(query)
+        if not terms or k <= 0:
+            return []
+        global_stats = merge_statistics(self._gather(_shard_term_statistics, terms))
+        return merge_top_k(self._gather(_shard_ranked, query, k, boolean_filter, global_stats), k)
+
+    # Function to get the file name of a document without reading it
+    def name(self, doc_id: int) -> str:
+        member = self.doc_table.get(doc_id)
+        return member.rsplit('/', 1)[-1] if member else str(doc_id)
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build a sharded index and answer queries from stdin, one per line "
+                                                 "('ranked <query>' for BM25 top-k), as JSON Lines")
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS, help="number of shards (worker processes)")
+    parser.add_argument('--corpus', default='Corpus.zip', help="corpus to index: .zip, .tar(.gz) or a directory")
+    parser.add_argument('--index-dir', default=None, help="directory of the shard files (default: next to the corpus)")
+    parser.add_argument('--rebuild', action='store_true', help="ignore the stored shards and rebuild them")
+    parser.add_argument('--workers', type=int, default=1, help="processes used to build each shard")
+    parser.add_argument('--memory-budget', type=parse_size, default=DEFAULT_MEMORY_BUDGET,
+                        help="partial-index memory before build workers spill to disk, e.g. 512M")
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default=None,
+                        help="nltk word_tokenize, or the faster regex tokenizer")
+    parser.add_argument('--lemmatizer', choices=LEMMATIZERS, default=None,
+                        help="WordNet lemmatization, or none (WordNet is then never loaded)")
+    parser.add_argument('--phonetic', choices=sorted(PHONETIC_ENCODERS), default='soundex',
+                        help="phonetic encoder used by soundex queries")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_SHARD_TIMEOUT, help="seconds to wait for each shard")
+    parser.add_argument('--partial', action='store_true', help="answer without shards that time out")
+    parser.add_argument('--default-type', choices=QUERY_TYPES + ('ranked',), default='boolean',
+                        help="type of queries without a type tag")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help="documents returned by ranked queries")
+    parser.add_argument('--limit', type=int, default=None, help="doc IDs to list per result (default: all)")
+    args = parser.parse_args(argv)
+
+    engine = ShardedEngine.open(args.corpus, args.shards, args.index_dir, args.rebuild, args.workers,
+                                args.memory_budget, args.tokenizer, args.phonetic, args.timeout, args.partial,
+                                args.lemmatizer)
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            tag, _, rest = line.partition(' ')
+            query_type, query = (tag.lower(), rest.strip()) if tag.lower() in QUERY_TYPES + ('ranked',) \
+                else (args.default_type, line)
+            record = {'type': query_type, 'query': query}
+            try:
+                if query_type == 'ranked':
+                    record['results'] = [{'doc_id': hit.doc_id, 'name': engine.name(hit.doc_id),
+                                          'score': round(hit.score, 4)}
+                                         for hit in engine.ranked(query, args.top_k)]
+                else:
+                    doc_ids = list(engine.search(query_type, query))
+                    record['count'] = len(doc_ids)
+                    record['docs'] = [engine.name(doc_id) for doc_id in doc_ids[:args.limit]]
+            except (QuerySyntaxError, ShardTimeoutError) as error:
+                record['error'] = str(error)
+            print(json.dumps(record), flush=True)
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Mapping
+from functools import lru_cache
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ir_corpus import DRIVE_FILE_IDS, iter_corpus
+from ir_dictionary import BiwordIndex, FrozenTerms, PackedPostings, biword_pairs, encode_terms, pack_pair
+from ir_metrics import metrics
+from ir_postings import PositionalPostingList, PostingList, decode_postings, encode_postings
+from ir_ranking import index_statistics, length_table
+
+# Binary index file layout (all integers little-endian):
+#   header   : magic, format version, flags, section count
+#   sections : (section id, offset, length) entries pointing into the file body
+# The term dictionary is stored front-coded (see ir_dictionary) after a table of
+# posting offsets; a term's ID is its position in sorted order, and a lookup is a
+# binary search over the block heads straight over the memory-mapped file. Biwords
+# are stored as a sorted uint64 array of packed (first term ID, second term ID)
+# pairs with their own posting offsets. Postings are stored in the compressed
+# block format of ir_postings and decoded in place.
+# Positional indexes also store the ranking statistics of ir_ranking: a uint32
+# length per doc ID, and a uint32 (max tf, min document length) pair per term
+# in dictionary order.
+INDEX_MAGIC = b'BRMIDX\x00\x00'
+INDEX_VERSION = 4
+
+FLAG_POSITIONS = 0x1
+
+SECTION_META = 1
+SECTION_DOCS = 2
+SECTION_TERMS = 3
+SECTION_POSTINGS = 4
+SECTION_BIWORDS = 5
+SECTION_BIWORD_POSTINGS = 6
+SECTION_DOC_LENGTHS = 7
+SECTION_TERM_BOUNDS = 8
+
+_HEADER = struct.Struct('<8sIII')
+_SECTION = struct.Struct('<IQQ')
+
+
+class IndexFormatError(Exception):
+    pass
+
+
+# Function to fingerprint a corpus (zip file or directory) for staleness checks
+def corpus_fingerprint(corpus_path: str) -> Dict[str, int]:
+    if os.path.isdir(corpus_path):
+        size = 0
+        count = 0
+        mtime_ns = os.stat(corpus_path).st_mtime_ns
+        for root, dirs, files in os.walk(corpus_path):
+            for file in files:
+                st = os.stat(os.path.join(root, file))
+                size += st.st_size
+                count += 1
+                mtime_ns = max(mtime_ns, st.st_mtime_ns)
+        return {'size': size, 'files': count, 'mtime_ns': mtime_ns}
+
+    st = os.stat(corpus_path)
+    return {'size': st.st_size, 'files': 1, 'mtime_ns': st.st_mtime_ns}
+
+
+# Function to encode a sorted term dictionary: count, posting offsets, front-coded terms
+def _encode_dictionary(terms: List[bytes], posting_offsets: array) -> bytes:
+    return b''.join([
+        struct.pack('<Q', len(terms)),
+        posting_offsets.tobytes(),
+        encode_terms(terms),
+    ])
+
+
+# Function to encode one posting list in the compressed block format (see ir_postings)
+def _encode_postings(postings, with_positions: bool) -> bytes:
+    if isinstance(postings, PostingList) and isinstance(postings, PositionalPostingList) == with_positions:
+        return postings.encoded
+    if with_positions:
+        return PositionalPostingList.from_dict(postings).encoded
+    return encode_postings(sorted(postings))
+
+
+# Function to write the sections of an index file to a temp file, then atomically rename it.
+# Each section is an iterable of bytes-like chunks (bytes or arrays) consumed in section
+# order, so a section can be generated from what was collected while earlier ones were written.
+def _write_sections(path: str, flags: int, sections: List[Tuple[int, Iterable[bytes]]]) -> None:
+    table = []
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as file:
+        file.seek(_HEADER.size + _SECTION.size * len(sections))
+        for section_id, chunks in sections:
+            # Keep every section 8-byte aligned so offset tables can be cast in place
+            file.write(b'\x00' * (-file.tell() % 8))
+            start = file.tell()
+            for chunk in chunks:
+                file.write(chunk)
+            table.append((section_id, start, file.tell() - start))
+        file.seek(0)
+        file.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, flags, len(sections)))
+        for entry in table:
+            file.write(_SECTION.pack(*entry))
+    os.replace(tmp_path, path)
+
+
+# Function to persist an index streamed in sorted order; only the term list and the offset
+# tables are held in memory, so the postings can be produced (e.g. merged from spilled runs)
+# while they are written.
+#   terms       : (term, encoded postings, (max tf, min document length) or None) in term order
+#   biwords     : (first term, second term, encoded postings) in (first, second) order,
+#                 read once all the terms are written; every term must be one of `terms`
+#   doc_lengths : analyzed length by doc ID (positional indexes, for the ranking statistics)
+def write_index(path: str,
+                terms: Iterable[Tuple[str, bytes, Optional[Tuple[int, int]]]],
+                doc_table: Dict[int, str],
+                biwords: Optional[Iterable[Tuple[str, str, bytes]]] = None,
+                doc_lengths: Optional[array] = None,
+                meta: Optional[Dict] = None) -> None:
+    words: List[bytes] = []
+    posting_offsets = array('Q', [0])
+    bounds = array('I')
+    keys = array('Q')
+    biword_offsets = array('Q', [0])
+
+    def postings() -> Iterator[bytes]:
+        for term, chunk, term_bounds in terms:
+            words.append(term.encode('utf-8'))
+            posting_offsets.append(posting_offsets[-1] + len(chunk))
+            if term_bounds is not None:
+                bounds.extend(term_bounds)
+            yield chunk
+
+    def biword_postings() -> Iterator[bytes]:
+        # A term's ID is its position in sorted order
+        term_ids = {word.decode('utf-8'): i for i, word in enumerate(words)}
+        for first, second, chunk in biwords:
+            keys.append(pack_pair(term_ids[first], term_ids[second]))
+            biword_offsets.append(biword_offsets[-1] + len(chunk))
+            yield chunk
+
+    def dictionary() -> Iterator[bytes]:
+        yield _encode_dictionary(words, posting_offsets)
+
+    def biword_table() -> Iterator[bytes]:
+        yield struct.pack('<Q', len(keys))
+        yield keys
+        yield biword_offsets
+
+    sections = [
+        (SECTION_META, [json.dumps(meta or {}, sort_keys=True).encode('utf-8')]),
+        (SECTION_DOCS, [json.dumps(sorted(doc_table.items())).encode('utf-8')]),
+        (SECTION_POSTINGS, postings()),
+        (SECTION_TERMS, dictionary()),
+    ]
+    if biwords is not None:
+        sections.append((SECTION_BIWORD_POSTINGS, biword_postings()))
+        sections.append((SECTION_BIWORDS, biword_table()))
+    if doc_lengths is not None:
+        size = max(doc_table, default=0) + 1
+        if len(doc_lengths) < size:
+            doc_lengths = doc_lengths + array('I', bytes(4 * (size - len(doc_lengths))))
+        sections.append((SECTION_DOC_LENGTHS, [doc_lengths]))
+        sections.append((SECTION_TERM_BOUNDS, [bounds]))
+    # Only positional indexes carry the ranking statistics
+    _write_sections(path, FLAG_POSITIONS if doc_lengths is not None else 0, sections)
+
+
+# Function to persist an index to disk (written to a temp file, then atomically renamed)
+def save_index(path: str,
+               inverted_index,
+               doc_table: Dict[int, str],
+               biword_index: Optional[Dict[str, Set[int]]] = None,
+               meta: Optional[Dict] = None) -> None:
+    # Detect whether postings carry positions ({doc_id: [positions]}) or only doc IDs
+    with_positions = any(isinstance(p, (Mapping, PositionalPostingList)) for p in inverted_index.values())
+    doc_lengths = None
+    bounds = {}
+    if with_positions:
+        lengths, bounds = index_statistics(inverted_index)
+        doc_lengths = length_table(lengths, doc_table)
+
+    terms = ((term, _encode_postings(inverted_index[term], with_positions), bounds.get(term))
+             for term in sorted(inverted_index))
+    biwords = None
+    if biword_index is not None:
+        biwords = ((first, second, _encode_postings(postings, False))
+                   for first, second, postings in sorted(biword_pairs(biword_index), key=itemgetter(0, 1)))
+    write_index(path, terms, doc_table, biwords, doc_lengths, meta)
+
+
+# Posting lists a mapped index keeps decoded (least recently used are dropped first)
+POSTINGS_CACHE_SIZE = 1024
+
+
+# Read-only view of a stored term dictionary and its postings, backed by the mmap.
+# Recently used posting lists stay decoded, so a dense list keeps its bitmap between queries.
+class _MappedDictionary(Mapping):
+    def __init__(self, buffer: memoryview, terms: Tuple[int, int], postings: Tuple[int, int],
+                 decode: Callable[[memoryview], object], cache_size: int = POSTINGS_CACHE_SIZE):
+        start, length = terms
+        count = struct.unpack_from('<Q', buffer, start)[0]
+        table_start = start + 8
+        self._posting_offsets = buffer[table_start:table_start + 8 * (count + 1)].cast('Q')
+        self.terms = FrozenTerms(buffer[table_start + 8 * (count + 1):start + length])
+        postings_start, postings_length = postings
+        self._postings = buffer[postings_start:postings_start + postings_length]
+        self._decode = decode
+        self._posting_list = lru_cache(maxsize=cache_size)(self._decode_term)
+
+    # Function to find the ID (sorted position) of a term, or -1
+    def term_id(self, term: str) -> int:
+        return self.terms.term_id(term) if isinstance(term, str) else -1
+
+    def __getitem__(self, term: str):
+        i = self.term_id(term)
+        if i < 0:
+            raise KeyError(term)
+        return self._posting_list(i)
+
+    # Function to decode the posting list of the term with ID i
+    def _decode_term(self, i: int):
+        return self._decode(self._postings[self._posting_offsets[i]:self._posting_offsets[i + 1]])
+
+    def __contains__(self, term) -> bool:
+        return self.term_id(term) >= 0
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
+# Function to open a stored biword section as a BiwordIndex over the term dictionary
+def _mapped_biwords(buffer: memoryview, biwords: Tuple[int, int], postings: Tuple[int, int],
+                    terms: FrozenTerms) -> BiwordIndex:
+    start, length = biwords
+    count = struct.unpack_from('<Q', buffer, start)[0]
+    keys = buffer[start + 8:start + 8 + 8 * count].cast('Q')
+    offsets = buffer[start + 8 + 8 * count:start + 16 + 16 * count].cast('Q')
+    postings_start, postings_length = postings
+    return BiwordIndex(terms, PackedPostings(keys, offsets, buffer[postings_start:postings_start + postings_length],
+                                             decode_postings))
+
+
+# A memory-mapped index file; behaves like the in-memory inverted index dict
+class MappedIndex(Mapping):
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if len(buffer) < _HEADER.size:
+            raise IndexFormatError(f"{path}: truncated header")
+        magic, version, flags, section_count = _HEADER.unpack_from(buffer, 0)
+        if magic != INDEX_MAGIC:
+            raise IndexFormatError(f"{path}: not an index file")
+        if version != INDEX_VERSION:
+            raise IndexFormatError(f"{path}: unsupported index version {version}")
+
+        self.version = version
+        self.flags = flags
+        # A mapped index is read-only, so its generation never changes (see ir_cache.QueryCache)
+        self.generation = 0
+        sections = {}
+        for n in range(section_count):
+            section_id, start, length = _SECTION.unpack_from(buffer, _HEADER.size + n * _SECTION.size)
+            sections[section_id] = (start, length)
+
+        def blob(section_id: int) -> memoryview:
+            start, length = sections[section_id]
+            return buffer[start:start + length]
+
+        self.meta = json.loads(bytes(blob(SECTION_META)))
+        self.doc_table = {doc_id: name for doc_id, name in json.loads(bytes(blob(SECTION_DOCS)))}
+        self.doc_ids = PostingList.from_iterable(self.doc_table)
+
+        self._terms = _MappedDictionary(buffer, sections[SECTION_TERMS], sections[SECTION_POSTINGS],
+                                        decode_postings)
+
+        self.biword_index = None
+        if SECTION_BIWORDS in sections:
+            self.biword_index = _mapped_biwords(buffer, sections[SECTION_BIWORDS], sections[SECTION_BIWORD_POSTINGS],
+                                                self._terms.terms)
+
+        # Ranking statistics (positional indexes only): doc_lengths[doc_id] is the analyzed length
+        self.doc_lengths = None
+        self._term_bounds = None
+        self._avg_doc_length = None
+        if SECTION_DOC_LENGTHS in sections:
+            self.doc_lengths = blob(SECTION_DOC_LENGTHS).cast('I')
+            self._term_bounds = blob(SECTION_TERM_BOUNDS).cast('I')
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.doc_table)
+
+    # The stored terms, in sorted order
+    @property
+    def sorted_terms(self) -> FrozenTerms:
+        return self._terms.terms
+
+    @property
+    def avg_doc_length(self) -> float:
+        if self._avg_doc_length is None:
+            self._avg_doc_length = sum(self.doc_lengths) / self.doc_count if self.doc_count else 0.0
+        return self._avg_doc_length
+
+    # Function to get the stored (max tf, min document length) of a term, or None
+    def term_bounds(self, term: str) -> Optional[Tuple[int, int]]:
+        if self._term_bounds is None:
+            return None
+        i = self._terms.term_id(term)
+        if i < 0:
+            return None
+        return self._term_bounds[2 * i], self._term_bounds[2 * i + 1]
+
+    def __getitem__(self, term: str):
+        return self._terms[term]
+
+    def __contains__(self, term) -> bool:
+        return term in self._terms
+
+    def __iter__(self):
+        return iter(self._terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+
+# Function to open a stored index, returning None when it is missing, unreadable or stale
+def load_index(path: str, corpus_path: Optional[str] = None,
+               analyzer: Optional[str] = None) -> Optional[MappedIndex]:
+    if not os.path.exists(path):
+        return None
+    try:
+        index = MappedIndex(path)
+    except (IndexFormatError, KeyError, ValueError, struct.error):
+        return None
+    if analyzer is not None and index.meta.get('analyzer') != analyzer:
+        return None
+    if corpus_path is not None and index.meta.get('corpus') != corpus_fingerprint(corpus_path):
+        return None
+    return index
+
+
+# Function to load the stored index or rebuild it when the corpus changed.
+# build(path, meta) writes the index file itself (with save_index, or straight from
+# the merged runs with ir_parallel.write_index_parallel), so it never has to be held whole.
+def load_or_build_index(path: str, corpus_path: str, analyzer: str,
+                        build: Callable[[str, Dict], None],
+                        rebuild: bool = False) -> MappedIndex:
+    if not rebuild:
+        with metrics.stage('index_load'):
+            index = load_index(path, corpus_path, analyzer)
+        if index is not None:
+            return index
+
+    meta = {'analyzer': analyzer, 'corpus': corpus_fingerprint(corpus_path)}
+    with metrics.stage('index_build'):
+        build(path, meta)
+    return MappedIndex(path)
+
+
+# Document store layout (all integers little-endian):
+#   header  : magic, format version, document count, table offset, meta length
+#   meta    : JSON (corpus fingerprint), right after the header
+#   records : per document the byte lengths of its name, Google Drive file ID, preview
+#             snippet and text, followed by the four UTF-8 strings
+#   table   : sorted uint32 doc IDs, then the uint64 record offset of each, 8-byte aligned
+# The text is only decoded when it is asked for, and previews are cut at build time, so
+# rendering a result costs the same however long the document is.
+DOCSTORE_MAGIC = b'BRMDOCS\x00'
+DOCSTORE_VERSION = 1
+
+SNIPPET_LINES = 2
+SNIPPET_CHARS = 300
+
+_DOCSTORE_HEADER = struct.Struct('<8sIIQQ')
+_RECORD = struct.Struct('<HHHI')
+
+# What result listings show of a document: its file name, preview and Drive file ID (or None)
+DocumentPreview = namedtuple('DocumentPreview', ['name', 'snippet', 'drive_id'])
+
+
+# Function to cut the preview of a document: its first lines, at most SNIPPET_CHARS long
+def make_snippet(text: str, lines: int = SNIPPET_LINES, limit: int = SNIPPET_CHARS) -> str:
+    return '\n'.join(text[:limit].split('\n')[:lines])
+
+
+# Function to write a document store from a stream of (doc_id, member name, text)
+# (written to a temp file, then atomically renamed)
+def save_document_store(path: str, documents: Iterable[Tuple[int, str, str]],
+                        file_ids: Optional[Dict[str, str]] = None, meta: Optional[Dict] = None) -> None:
+    file_ids = DRIVE_FILE_IDS if file_ids is None else file_ids
+    meta_blob = json.dumps(meta or {}, sort_keys=True).encode('utf-8')
+    table = []
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as file:
+        file.write(b'\x00' * _DOCSTORE_HEADER.size)
+        file.write(meta_blob)
+        for doc_id, member, text in documents:
+            name = os.path.basename(member)
+            text = text.strip()
+            fields = [name.encode('utf-8'), file_ids.get(name, '').encode('utf-8'),
+                      make_snippet(text).encode('utf-8'), text.encode('utf-8')]
+            table.append((doc_id, file.tell()))
+            file.write(_RECORD.pack(*map(len, fields)))
+            file.write(b''.join(fields))
+        table.sort()
+        file.write(b'\x00' * (-file.tell() % 8))
+        table_offset = file.tell()
+        doc_ids = array('I', [doc_id for doc_id, _ in table]).tobytes()
+        file.write(doc_ids + b'\x00' * (-len(doc_ids) % 8))
+        file.write(array('Q', [offset for _, offset in table]).tobytes())
+        file.seek(0)
+        file.write(_DOCSTORE_HEADER.pack(DOCSTORE_MAGIC, DOCSTORE_VERSION, len(table), table_offset,
+                                         len(meta_blob)))
+    os.replace(tmp_path, path)
+
+
+# Read-only, memory-mapped document store: doc_id -> text, plus previews and Drive file IDs
+class DocumentStore(Mapping):
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if len(buffer) < _DOCSTORE_HEADER.size:
+            raise IndexFormatError(f"{path}: truncated header")
+        magic, version, count, table_offset, meta_length = _DOCSTORE_HEADER.unpack_from(buffer, 0)
+        if magic != DOCSTORE_MAGIC:
+            raise IndexFormatError(f"{path}: not a document store")
+        if version != DOCSTORE_VERSION:
+            raise IndexFormatError(f"{path}: unsupported document store version {version}")
+
+        self._buffer = buffer
+        self.meta = json.loads(bytes(buffer[_DOCSTORE_HEADER.size:_DOCSTORE_HEADER.size + meta_length]))
+        ids_end = table_offset + 4 * count
+        self._doc_ids = buffer[table_offset:ids_end].cast('I')
+        offsets_start = ids_end + -ids_end % 8
+        self._offsets = buffer[offsets_start:offsets_start + 8 * count].cast('Q')
+
+    # Function to find the record of a document: (offset of its first string, the four lengths)
+    def _record(self, doc_id: int) -> Tuple[int, Tuple[int, int, int, int]]:
+        i = bisect_left(self._doc_ids, doc_id)
+        if i == len(self._doc_ids) or self._doc_ids[i] != doc_id:
+            raise KeyError(doc_id)
+        offset = self._offsets[i]
+        return offset + _RECORD.size, _RECORD.unpack_from(self._buffer, offset)
+
+    def _strings(self, doc_id: int, count: int) -> List[str]:
+        offset, lengths = self._record(doc_id)
+        strings = []
+        for length in lengths[:count]:
+            strings.append(str(self._buffer[offset:offset + length], 'utf-8'))
+            offset += length
+        return strings
+
+    def name(self, doc_id: int) -> str:
+        return self._strings(doc_id, 1)[0]
+
+    # Function to get what a result listing shows of a document, without touching its text
+    def preview(self, doc_id: int) -> DocumentPreview:
+        name, drive_id, snippet = self._strings(doc_id, 3)
+        return DocumentPreview(name, snippet, drive_id or None)
+
+    def __getitem__(self, doc_id: int) -> str:
+        return self._strings(doc_id, 4)[3]
+
+    def __contains__(self, doc_id) -> bool:
+        i = bisect_left(self._doc_ids, doc_id)
+        return i < len(self._doc_ids) and self._doc_ids[i] == doc_id
+
+    def __iter__(self):
+        return iter(self._doc_ids)
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+
+# Function to open the document store of a corpus, rewriting it when it is missing or stale
+def load_or_build_document_store(path: str, corpus_path: str, rebuild: bool = False) -> DocumentStore:
+    fingerprint = corpus_fingerprint(corpus_path)
+    if not rebuild and os.path.exists(path):
+        try:
+            store = DocumentStore(path)
+        except (IndexFormatError, ValueError, struct.error):
+            store = None
+        if store is not None and store.meta.get('corpus') == fingerprint:
+            return store
+    with metrics.stage('docstore_build'):
+        save_document_store(path, iter_corpus(corpus_path), meta={'corpus': fingerprint})
+    return DocumentStore(path)
@@ -0,0 +1,180 @@
+import re
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ir_metrics import metrics
+from ir_postings import PostingList, derived_cache
+from ir_query import QuerySyntaxError
+
+# Term dictionary for wildcard and fuzzy query operands.
+#
+# The vocabulary is kept as a sorted list, which doubles as a trie: the terms that share a
+# prefix form one contiguous range, found with two binary searches. Prefix wildcards (goog*)
+# are that range. Other wildcards (*gle, g*gle) intersect the lists of a character k-gram index
+# ('$' marks the word boundaries, so 'g*gle' needs '$g' + 'gle$' grams) and verify the few
+# candidates against the pattern. Fuzzy terms (gogle~1) walk the implicit trie depth first,
+# carrying one row of the Levenshtein table per character and abandoning a branch as soon as
+# every entry of its row exceeds the edit bound, so only terms close to the word are visited.
+# Neither lookup scans the vocabulary. An operand expands to at most `max_expansions` terms:
+# the closest and most frequent ones.
+
+WILDCARD = '*'
+FUZZY = '~'
+GRAM_SIZE = 3
+MAX_EDITS = 2
+DEFAULT_EDITS = 1
+DEFAULT_MAX_EXPANSIONS = 64
+
+_BOUNDARY = '$'
+_FUZZY_RE = re.compile(r'(.+)~(\d*)')
+
+# A wildcard or fuzzy query operand; `text` is the lowercased pattern or word
+Expansion = namedtuple('Expansion', ['kind', 'text', 'max_edits'])
+
+
+# Function to recognize a wildcard (goog*, *gle, g*gle) or fuzzy (gogle~, gogle~2) operand;
+# None for a plain word
+def parse_expansion(word: str) -> Optional[Expansion]:
+    if WILDCARD in word:
+        if FUZZY in word:
+            raise QuerySyntaxError(f"{word!r} cannot be both a wildcard and a fuzzy term")
+        if not word.strip(WILDCARD):
+            raise QuerySyntaxError("a wildcard needs at least one letter")
+        return Expansion('wildcard', word.lower(), 0)
+    if FUZZY not in word:
+        return None
+    match = _FUZZY_RE.fullmatch(word)
+    if match is None:
+        raise QuerySyntaxError(f"invalid fuzzy term {word!r}, expected e.g. 'gogle~1'")
+    max_edits = int(match.group(2)) if match.group(2) else DEFAULT_EDITS
+    if max_edits > MAX_EDITS:
+        raise QuerySyntaxError(f"fuzzy terms allow at most {MAX_EDITS} edits")
+    return Expansion('fuzzy', match.group(1).lower(), max_edits)
+
+
+# Function to list the k-grams of a string
+def _grams(text: str) -> Iterable[str]:
+    return (text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1))
+
+
+class TermDictionary:
+    def __init__(self, terms: Iterable[str], presorted: bool = False):
+        self.terms: List[str] = list(terms) if presorted else sorted(terms)
+        # gram -> sorted positions in self.terms, built on the first infix wildcard
+        self._gram_index: Optional[Dict[str, array]] = None
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    # Function to get the (start, end) range of the terms that begin with `prefix`
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix[:-1] + chr(ord(prefix[-1]) + 1), start) if prefix else len(self.terms)
+        return start, end
+
+    def _build_gram_index(self) -> Dict[str, array]:
+        gram_index = defaultdict(lambda: array('I'))
+        for i, term in enumerate(self.terms):
+            for gram in set(_grams(f"{_BOUNDARY}{term}{_BOUNDARY}")):
+                gram_index[gram].append(i)
+        return dict(gram_index)
+
+    # Function to list the terms matching a pattern in which '*' stands for any characters
+    def wildcard(self, pattern: str) -> List[str]:
+        pieces = pattern.split(WILDCARD)
+        head = pieces[0]
+        if len(pieces) == 2 and not pieces[1]:
+            start, end = self.prefix_range(head)
+            return self.terms[start:end]
+
+        pieces[0] = _BOUNDARY + pieces[0] if pieces[0] else ''
+        pieces[-1] = pieces[-1] + _BOUNDARY if pieces[-1] else ''
+        grams = {gram for piece in pieces for gram in _grams(piece)}
+        if grams:
+            if self._gram_index is None:
+                self._gram_index = self._build_gram_index()
+            lists = sorted((self._gram_index.get(gram, ()) for gram in grams), key=len)
+            candidates = set(lists[0])
+            for positions in lists[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(positions)
+            candidates = (self.terms[i] for i in sorted(candidates))
+        elif head:
+            start, end = self.prefix_range(head)
+            candidates = self.terms[start:end]
+        else:
+            raise QuerySyntaxError(f"wildcard {pattern!r} is too unspecific, "
+                                   f"give it a prefix or at least {GRAM_SIZE} letters in a row")
+        matcher = re.compile('.*'.join(map(re.escape, pattern.split(WILDCARD))), re.DOTALL)
+        return [term for term in candidates if matcher.fullmatch(term)]
+
+    # Function to list the (term, edit distance) pairs within `max_edits` Levenshtein edits of a word
+    def fuzzy(self, word: str, max_edits: int = DEFAULT_EDITS) -> List[Tuple[str, int]]:
+        terms = self.terms
+        matches = []
+
+        def walk(prefix: str, start: int, end: int, row: List[int]):
+            depth = len(prefix)
+            # The term equal to the prefix, if any, sorts first in its range
+            if terms[start] == prefix:
+                if row[-1] <= max_edits:
+                    matches.append((prefix, row[-1]))
+                start += 1
+            while start < end:
+                char = terms[start][depth]
+                child_end = bisect_left(terms, prefix + chr(ord(char) + 1), start, end)
+                child_row = [row[0] + 1]
+                for j in range(1, len(row)):
+                    child_row.append(min(child_row[j - 1] + 1, row[j] + 1, row[j - 1] + (word[j - 1] != char)))
+                if min(child_row) <= max_edits:
+                    walk(prefix + char, start, child_end, child_row)
+                start = child_end
+
+        if terms:
+            walk('', 0, len(terms), list(range(len(word) + 1)))
+        return matches
+
+
+# Function to get (building once per index object when possible) the term dictionary of an index
+def term_dictionary_for(inverted_index) -> TermDictionary:
+    cache = derived_cache(inverted_index)
+    if cache is None:
+        # Plain dicts cannot carry the cache; build a one-off dictionary
+        return TermDictionary(inverted_index)
+    if 'terms' not in cache:
+        # A mapped index stores its terms sorted, so they are read in order rather than sorted again
+        sorted_terms = getattr(inverted_index, 'sorted_terms', None)
+        if sorted_terms is not None:
+            cache['terms'] = TermDictionary(sorted_terms, presorted=True)
+        else:
+            cache['terms'] = TermDictionary(inverted_index)
+    return cache['terms']
+
+
+# Function to list the index terms an operand expands to: the closest, then most frequent, ones first
+def expand_terms(expansion: Expansion, inverted_index,
+                 max_expansions: int = DEFAULT_MAX_EXPANSIONS) -> List[str]:
+    with metrics.stage('term_expand'):
+        dictionary = term_dictionary_for(inverted_index)
+        if expansion.kind == 'wildcard':
+            matches = [(term, 0) for term in dictionary.wildcard(expansion.text)]
+        else:
+            matches = dictionary.fuzzy(expansion.text, expansion.max_edits)
+        if len(matches) > max_expansions:
+            matches.sort(key=lambda match: (match[1], -len(inverted_index[match[0]]), match[0]))
+            metrics.count('expansions_capped')
+            matches = matches[:max_expansions]
+    metrics.count('terms_expanded', len(matches))
+    return [term for term, _ in matches]
+
+
+# Function to get the documents containing any of the terms an operand expands to
+def expand_postings(expansion: Expansion, inverted_index,
+                    max_expansions: int = DEFAULT_MAX_EXPANSIONS) -> PostingList:
+    postings = PostingList()
+    for term in expand_terms(expansion, inverted_index, max_expansions):
+        postings = postings | inverted_index[term]
+    return postings
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ir_assQ2
+from ir_analysis import Analyzer
+
+
+# The shared query/indexing analyzer, with the regex tokenizer and no lemmatizer so only the
+# NLTK stopword list is needed; tests that use it are skipped when the list is not installed
+@pytest.fixture
+def analyzer(monkeypatch):
+    analyzer = Analyzer(lemma_pos='v', tokenizer='regex', lemmatizer='none')
+    try:
+        analyzer.analyze('the')
+    except LookupError as e:
+        pytest.skip(str(e))
+    monkeypatch.setattr(ir_assQ2, 'analyzer', analyzer)
+    return analyzer
+
+
+# A small corpus directory; doc IDs follow the sorted file names, and doc 3 (blank) is not indexed
+CORPUS = {
+    '01-google.txt': "Google is a search engine. Google search ranks pages.",
+    '02-yahoo.txt': "Yahoo was a search engine and a web portal.",
+    '03-blank.txt': "   \n",
+    '04-phone.txt': "The phone company sells phones and phone plans.",
+    '05-engine.txt': "The engine of a car is not a search engine.",
+    '06-lehri.txt': "Lehri and Stainford wrote about search.",
+    '07-gogle.txt': "Gogle is a misspelling of Google.",
+    '08-bing.txt': "Bing search engine results compared with Google results.",
+}
+
+
+@pytest.fixture
+def corpus(tmp_path) -> str:
+    directory = tmp_path / 'corpus'
+    directory.mkdir()
+    for name, text in CORPUS.items():
+        (directory / name).write_text(text, encoding='utf-8')
+    return str(directory)
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import ir_analysis
+from ir_analysis import Analyzer
+
+# Importing the modules must not import nltk (it is slow, and used to trigger downloads);
+# nltk is imported on the first analysis, and only the data the configuration needs is loaded.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['ir_analysis', 'ir_assQ1', 'ir_assQ2', 'ir_batch', 'ir_engine', 'ir_server', 'ir_shards', 'ir_storage',
+           'ir_terms', 'ir_query', 'ir_phonetic', 'ir_parallel', 'ir_segments', 'ir_metrics']
+
+
+# Function to run a snippet in a fresh interpreter from the repository root and return its output
+def _run(code: str, **env) -> str:
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, **env}, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def test_importing_does_not_import_nltk():
+    code = f"import sys\nimport {', '.join(MODULES)}\nprint(sorted(m for m in sys.modules if m.split('.')[0] in " \
+           f"('nltk', 'cProfile', 'pstats', 'tracemalloc')))"
+    assert _run(code) == '[]'
+
+
+def test_missing_data_names_the_resource(tmp_path):
+    code = ("import ir_analysis\n"
+            f"ir_analysis.NLTK_DATA_DIR = {str(tmp_path)!r}\n"
+            "nltk = ir_analysis._import_nltk()\n"
+            f"nltk.data.path[:] = [{str(tmp_path)!r}]\n"
+            "try:\n"
+            "    ir_analysis.Analyzer(tokenizer='regex', lemmatizer='none').analyze('a search engine')\n"
+            "except LookupError as e:\n"
+            "    print(e)\n")
+    message = _run(code)
+    assert 'stopwords' in message and '--download' in message
+
+
+class _Unavailable:
+    def __getattr__(self, name):
+        raise AssertionError(f"used {name} from NLTK data this analyzer does not need")
+
+    def __call__(self, *args, **kwargs):
+        raise AssertionError("used NLTK data this analyzer does not need")
+
+
+def test_regex_analyzer_needs_only_stopwords(analyzer, monkeypatch):
+    nltk = ir_analysis._import_nltk()
+    monkeypatch.setattr(nltk.corpus, 'wordnet', _Unavailable())
+    monkeypatch.setattr(nltk, 'word_tokenize', _Unavailable())
+    fresh = Analyzer(tokenizer='regex', lemmatizer='none')
+    assert fresh.analyze("The engines of Google's search") == ['engines', 'google', 'search']
+    assert fresh.tag == 'regex-none-n'
+
+
+def test_unknown_configuration():
+    with pytest.raises(ValueError):
+        Analyzer(tokenizer='spacy')
+    with pytest.raises(ValueError):
+        Analyzer(lemmatizer='porter')
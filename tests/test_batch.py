@@ -0,0 +1,82 @@
+import json
+
+from ir_batch import main, percentile, read_queries, run_batch, summarize
+from ir_engine import SearchEngine
+
+# Batch mode evaluates a query file in input order, on one engine or a pool, and reports one
+# record per query plus a summary; a bad query gets an error record and does not stop the run.
+
+QUERIES = [
+    '# comment lines and blank lines are skipped',
+    '',
+    'google AND NOT yahoo',
+    'phrase search engine',
+    'proximity google engine 3',
+    '{"type": "proximity", "query": "search engine", "distance": 1, "ordered": true, "id": "q-near"}',
+    'soundex gogle',
+    'boolean (search AND',
+    '{"query": 5}',
+    '{not json',
+    'engine OR phone',
+]
+
+
+def test_read_queries():
+    queries = list(read_queries(QUERIES))
+    assert [query.qid for query in queries] == [1, 2, 3, 'q-near', 5, 6, 7, 8, 9]
+    assert [query.type for query in queries[:5]] == ['boolean', 'phrase', 'proximity', 'proximity', 'soundex']
+    assert queries[1].query == 'search engine'
+    assert queries[3].distance == 1 and queries[3].ordered
+    assert queries[6].error and queries[7].error and not queries[5].error
+    assert list(read_queries(['search'], default_type='phrase'))[0].type == 'phrase'
+
+
+# Function to drop the timing of result records so runs can be compared
+def _results(records) -> list:
+    return [{key: value for key, value in record.items() if key != 'latency_ms'} for record in records]
+
+
+def test_batch_results_in_input_order(tmp_path, analyzer, corpus):
+    engine = SearchEngine.open(corpus, str(tmp_path / 'corpus.idx'))
+    queries = list(read_queries(QUERIES))
+    records = list(run_batch(engine, queries))
+    by_id = {record['id']: record for record in records}
+    assert by_id[1]['doc_ids'] == [1, 7, 8] and by_id[1]['docs'] == ['01-google.txt', '07-gogle.txt', '08-bing.txt']
+    assert by_id[2]['doc_ids'] == [1, 2, 5, 8]
+    assert by_id['q-near']['doc_ids'] == [1, 2, 5, 8]
+    assert by_id[5]['doc_ids'] == [1, 7, 8]
+    assert by_id[9]['doc_ids'] == [1, 2, 4, 5, 8]
+    assert 'error' in by_id[6] and by_id[6]['count'] == 0
+    assert all('error' in by_id[qid] for qid in (7, 8))
+    for query, record in zip(queries, records):
+        if 'error' not in record:
+            assert record['doc_ids'] == list(engine.search(query.type, query.query, query.distance, query.ordered))
+
+    threaded = list(run_batch(engine, queries, pool='thread', workers=3))
+    assert _results(threaded) == _results(records)
+    options = {'corpus_path': corpus, 'index_path': str(tmp_path / 'corpus.idx')}
+    processes = list(run_batch(engine, queries, pool='process', workers=2, engine_options=options))
+    assert _results(processes) == _results(records)
+    limited = list(run_batch(engine, queries[:1], limit=1))
+    assert limited[0]['doc_ids'] == [1] and limited[0]['count'] == 3
+
+
+def test_summary():
+    records = [{'type': 'boolean', 'latency_ms': ms} for ms in (1.0, 2.0, 3.0, 4.0)]
+    records.append({'type': 'phrase', 'latency_ms': 5.0, 'error': 'bad'})
+    summary = summarize(records, wall_seconds=0.5)
+    assert summary['queries'] == 5 and summary['qps'] == 10.0
+    assert summary['by_type']['boolean']['p50_ms'] == 2.0 and summary['by_type']['boolean']['p99_ms'] == 4.0
+    assert summary['by_type']['phrase']['errors'] == 1
+    assert percentile([], 0.5) == 0.0 and percentile([7.0], 0.99) == 7.0
+
+
+def test_main_writes_results_and_summary(tmp_path, analyzer, corpus):
+    queries, output, summary = tmp_path / 'queries.txt', tmp_path / 'results.jsonl', tmp_path / 'summary.json'
+    queries.write_text('\n'.join(QUERIES), encoding='utf-8')
+    main([str(queries), '-o', str(output), '--summary', str(summary), '--corpus', corpus,
+          '--index', str(tmp_path / 'corpus.idx')])
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert len(records) == 9 and records[0]['doc_ids'] == [1, 7, 8]
+    report = json.loads(summary.read_text(encoding='utf-8'))
+    assert report['queries'] == 9 and report['by_type']['boolean']['errors'] == 3
@@ -0,0 +1,72 @@
+from ir_cache import QueryCache
+from ir_postings import InvertedIndex, PostingList
+from ir_query import QueryEvaluator, all_doc_ids, compile_query
+from ir_segments import SegmentedIndex
+
+# The query cache evicts least-recently-used entries within its entry and byte budgets, and
+# never serves a result computed for another index or an older generation of the same index.
+
+
+def _postings(*doc_ids) -> PostingList:
+    return PostingList.from_iterable(doc_ids)
+
+
+def test_lru_eviction_by_entries():
+    cache = QueryCache(max_entries=2)
+    cache.put('a', _postings(1))
+    cache.put('b', _postings(2))
+    assert list(cache.get('a')) == [1]
+    cache.put('c', _postings(3))
+    assert cache.get('b') is None and list(cache.get('a')) == [1] and list(cache.get('c')) == [3]
+    assert cache.stats()['evictions'] == 1 and cache.stats()['hits'] == 3
+
+
+def test_byte_budget():
+    big = PostingList.from_iterable(range(0, 200_000, 3))
+    cache = QueryCache(max_bytes=big.nbytes + 300)
+    cache.put('big', big)
+    cache.put('small', _postings(1))
+    # Both do not fit: the older one goes
+    assert cache.get('big') is None and cache.get('small') is not None
+    cache.put('huge', PostingList.from_iterable(range(0, 600_000, 3)))
+    assert cache.get('huge') is None and cache.stats()['bytes'] <= cache.max_bytes
+
+
+def test_validate_ties_the_cache_to_one_index_generation():
+    cache = QueryCache()
+    assert not cache.validate({'a': _postings(1)})
+    first, second = InvertedIndex(a=_postings(1)), InvertedIndex(a=_postings(2))
+    first.generation = second.generation = 0
+    assert cache.validate(first)
+    cache.put('a', _postings(1))
+    assert cache.validate(first) and len(cache) == 1
+    assert cache.validate(second) and len(cache) == 0
+    cache.put('a', _postings(2))
+    second.generation = 1
+    assert cache.validate(second) and cache.get('a') is None
+    assert cache.stats()['invalidations'] == 2
+
+
+# Function to evaluate a query on a snapshot through a shared cache, as boolean_search does
+def _search(query: str, snapshot, cache: QueryCache) -> list:
+    assert cache.validate(snapshot)
+    evaluator = QueryEvaluator(lambda text: snapshot[text] if text in snapshot else PostingList(),
+                               lambda: all_doc_ids(snapshot), cache)
+    return list(evaluator.evaluate(compile_query(query)))
+
+
+def test_updates_invalidate_cached_results():
+    index = SegmentedIndex(None, str.split, background_merge=False)
+    first = index.add_document('alpha beta')
+    second = index.add_document('alpha beta gamma')
+    cache = QueryCache()
+    assert _search('alpha AND beta AND NOT gamma', index.snapshot(), cache) == [first]
+    assert _search('alpha AND beta AND NOT gamma', index.snapshot(), cache) == [first]
+    assert cache.hits > 0
+
+    index.update_document(second, 'alpha beta')
+    assert _search('alpha AND beta AND NOT gamma', index.snapshot(), cache) == [first, second]
+    index.delete_document(first)
+    assert _search('alpha AND beta AND NOT gamma', index.snapshot(), cache) == [second]
+    assert _search('NOT gamma', index.snapshot(), cache) == [second]
+    index.close()
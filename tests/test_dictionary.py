@@ -0,0 +1,68 @@
+from array import array
+
+import pytest
+
+from ir_dictionary import (FRONT_CODING_BLOCK, BiwordIndex, FrozenTerms, PackedPostings, TermIds, biword_pairs,
+                           encode_terms, pack_pair, unpack_pair)
+
+# Term IDs are dense and stable while an index is built; once saved, the front-coded
+# dictionary must give back every term at its sorted position, and biwords keyed by packed
+# ID pairs must look and list exactly like a "word1 word2"-keyed dict.
+
+TERMS = sorted({'a', 'ab', 'abc', 'abd', 'b', 'über', 'übung', 'naïve', 'naive', 'search', 'searching',
+                'research', 'x' * 200, 'x' * 199 + 'y', 'x' * 150 + 'z' * 140} |
+               {f"term{i:03d}" for i in range(50)})
+
+
+def test_term_ids_in_order_of_first_appearance():
+    term_ids = TermIds()
+    assert term_ids.add_all(['b', 'a', 'b', 'c']) == [0, 1, 0, 2]
+    assert term_ids.add('a') == 1 and term_ids.add('d') == 3
+    assert term_ids.add_all([]) == [] and term_ids.add_all(['d', 'e']) == [3, 4]
+    assert len(term_ids) == 5 and term_ids.term(2) == 'c'
+    assert term_ids.term_id('e') == 4 and term_ids.term_id('z') == -1
+
+
+def test_pack_pair_round_trip():
+    for first, second in [(0, 0), (1, 2), (2, 1), (2 ** 32 - 1, 2 ** 32 - 1)]:
+        assert unpack_pair(pack_pair(first, second)) == (first, second)
+    # Packed pairs sort like the (first, second) pairs
+    assert pack_pair(1, 2 ** 32 - 1) < pack_pair(2, 0)
+
+
+@pytest.mark.parametrize('terms', [TERMS, TERMS[:1], TERMS[:FRONT_CODING_BLOCK], TERMS[:FRONT_CODING_BLOCK + 1], []])
+def test_frozen_terms_round_trip(terms):
+    frozen = FrozenTerms(encode_terms([term.encode('utf-8') for term in terms]))
+    assert len(frozen) == len(terms) and list(frozen) == terms
+    for term_id, term in enumerate(terms):
+        assert frozen.term_id(term) == term_id
+        assert frozen.term(term_id) == term
+    for missing in ['', '0', 'aa', 'abe', 'naïv', 'x' * 201, 'zzz', 'übe']:
+        assert frozen.term_id(missing) == -1
+    with pytest.raises(IndexError):
+        frozen.term(len(terms))
+
+
+def test_biword_index_by_string_keys():
+    term_ids = TermIds()
+    term_ids.add_all(['search', 'engine', 'google'])
+    biwords = {'search engine': [1, 2], 'google search': [1], 'engine search': [3]}
+    postings = {}
+    for biword, docs in biwords.items():
+        first, _, second = biword.partition(' ')
+        postings[pack_pair(term_ids.term_id(first), term_ids.term_id(second))] = docs
+    keys = array('Q', sorted(postings))
+    offsets = array('I', [0])
+    flat = []
+    for key in keys:
+        flat.extend(postings[key])
+        offsets.append(len(flat))
+    for index in (BiwordIndex(term_ids, postings), BiwordIndex(term_ids, PackedPostings(keys, offsets, flat, list))):
+        assert len(index) == 3 and dict(index.items()) == biwords
+        assert sorted(biword_pairs(index)) == sorted(biword_pairs(biwords))
+        assert index['search engine'] == [1, 2]
+        for missing in ['engine google', 'search', 'search missing', 'search  engine']:
+            assert missing not in index
+            with pytest.raises(KeyError):
+                index[missing]
+        assert 5 not in index
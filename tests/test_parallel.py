@@ -0,0 +1,69 @@
+import random
+
+import ir_assQ2
+from ir_parallel import build_index_parallel, parse_size, write_index_parallel
+from ir_storage import MappedIndex, save_index
+
+# The process-pool build must produce exactly the index of the serial build, however the
+# documents are batched and however often the memory budget forces runs to disk.
+
+WORDS = ['search', 'engine', 'google', 'index', 'query', 'ranking', 'phrase', 'window', 'term', 'posting',
+         'list', 'merge', 'run', 'spill', 'budget', 'worker', 'batch', 'zipf', 'corpus', 'document']
+
+
+# Function to make (doc_id, text) pairs, with stopwords and an empty document among them
+def _documents(count: int = 120, seed: int = 4) -> list:
+    rnd = random.Random(seed)
+    docs = []
+    for doc_id in range(1, count + 1):
+        words = [] if doc_id == 7 else rnd.choices(WORDS + ['the', 'and', 'of'], k=rnd.randint(1, 30))
+        docs.append((doc_id, ' '.join(words)))
+    return docs
+
+
+def test_parallel_index_file_matches_serial(tmp_path, analyzer):
+    docs = _documents()
+    doc_table = {doc_id: f"corpus/{doc_id}.txt" for doc_id, _ in docs}
+    serial_path, parallel_path = str(tmp_path / 'serial.idx'), str(tmp_path / 'parallel.idx')
+    inverted_index, biword_index = ir_assQ2.build_inverted_index(iter(docs))
+    save_index(serial_path, inverted_index, doc_table, biword_index, meta={'analyzer': analyzer.tag})
+    # A budget of a few runs spills often; batches of 4 give many runs to merge
+    write_index_parallel(parallel_path, iter(docs), analyzer.analyze, doc_table, {'analyzer': analyzer.tag},
+                         workers=2, memory_budget=20_000, batch_size=4, spill_dir=str(tmp_path))
+    with open(serial_path, 'rb') as serial, open(parallel_path, 'rb') as parallel:
+        assert serial.read() == parallel.read()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['parallel.idx', 'serial.idx']
+
+
+def test_parallel_in_memory_build_matches_serial(analyzer):
+    docs = _documents(seed=5)
+    inverted_index, biword_index = ir_assQ2.build_inverted_index(iter(docs))
+    parallel_index, parallel_biwords = build_index_parallel(iter(docs), analyzer.analyze, workers=3,
+                                                            memory_budget=10_000, batch_size=3)
+    assert sorted(parallel_index) == sorted(inverted_index)
+    for term, postings in inverted_index.items():
+        assert dict(parallel_index[term].items()) == dict(postings.items())
+    assert sorted(parallel_biwords) == sorted(biword_index)
+    for biword in biword_index:
+        assert list(parallel_biwords[biword]) == list(biword_index[biword])
+
+
+def test_doc_id_only_parallel_build(tmp_path, analyzer):
+    docs = _documents(seed=6)
+    path = str(tmp_path / 'flat.idx')
+    write_index_parallel(path, iter(docs), analyzer.analyze, {doc_id: str(doc_id) for doc_id, _ in docs},
+                         workers=2, memory_budget=5_000, positional=False, biwords=False, batch_size=5)
+    index = MappedIndex(path)
+    expected = {}
+    for doc_id, text in docs:
+        for term in analyzer.analyze(text):
+            expected.setdefault(term, set()).add(doc_id)
+    assert {term: list(index[term]) for term in index} == {term: sorted(ids) for term, ids in expected.items()}
+    assert index.biword_index is None and index.doc_lengths is None
+
+
+def test_parse_size():
+    assert parse_size('512M') == 512 * 1024 ** 2
+    assert parse_size('2g') == 2 * 1024 ** 3
+    assert parse_size('1.5k') == 1536
+    assert parse_size('100') == 100
@@ -0,0 +1,113 @@
+import random
+from itertools import product
+
+import pytest
+
+from ir_positional import candidate_docs, near_search, phrase_positions, phrase_search, window_match
+from ir_postings import compress_index, compress_positional_index
+
+# Positional queries are answered from the positions in the index alone; they must agree with
+# scanning the documents' token lists.
+
+WORDS = ['a', 'b', 'c', 'd', 'e']
+
+
+# Function to make small documents over a tiny vocabulary, so phrases and windows recur
+def _documents(seed: int, count: int = 150) -> dict:
+    rnd = random.Random(seed)
+    return {doc_id: rnd.choices(WORDS, k=rnd.randint(0, 25)) for doc_id in range(1, count + 1)}
+
+
+# Function to build the positional index and the biword index of some documents
+def _indexes(documents: dict):
+    positions, biwords = {}, {}
+    for doc_id, words in documents.items():
+        for pos, word in enumerate(words):
+            positions.setdefault(word, {}).setdefault(doc_id, []).append(pos)
+        for first, second in zip(words, words[1:]):
+            biwords.setdefault(f"{first} {second}", set()).add(doc_id)
+    return compress_positional_index(positions), compress_index(biwords)
+
+
+# Function to check whether a token list contains a phrase
+def _contains(words: list, phrase: list) -> bool:
+    return any(words[i:i + len(phrase)] == phrase for i in range(len(words) - len(phrase) + 1))
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_phrase_search_matches_a_scan(seed):
+    documents = _documents(seed)
+    inverted_index, biword_index = _indexes(documents)
+    rnd = random.Random(seed)
+    for _ in range(40):
+        phrase = rnd.choices(WORDS, k=rnd.randint(1, 4))
+        expected = [doc_id for doc_id, words in documents.items() if _contains(words, phrase)]
+        assert list(phrase_search(phrase, inverted_index)) == expected
+        # Biword postings only pre-filter the candidates
+        biwords = {f"{first} {second}" for first, second in zip(phrase, phrase[1:])}
+        candidates = candidate_docs(biwords, biword_index) if biwords else None
+        assert list(phrase_search(phrase, inverted_index, candidates)) == expected
+
+
+def test_phrase_with_unknown_term_or_no_terms():
+    inverted_index, _ = _indexes({1: ['a', 'b'], 2: ['b', 'a']})
+    assert list(phrase_search(['a', 'z'], inverted_index)) == []
+    assert list(phrase_search([], inverted_index)) == []
+    assert list(phrase_search(['b', 'a'], inverted_index)) == [2]
+
+
+def test_phrase_positions_with_repeated_terms():
+    # "a a b" in a a a b: starts at 1 only
+    assert phrase_positions([[0, 1, 2], [0, 1, 2], [3]]) == [1]
+    assert phrase_positions([[0, 2], [1, 3]]) == [0, 2]
+    assert phrase_positions([]) == []
+
+
+# Function to decide a NEAR/k (or ONEAR/k) window by trying every combination of occurrences
+def _in_window(words: list, terms: list, distance: int, ordered: bool) -> bool:
+    if not ordered:
+        terms = list(dict.fromkeys(terms))
+    occurrences = [[pos for pos, word in enumerate(words) if word == term] for term in terms]
+    for chosen in product(*occurrences):
+        if ordered and any(later <= earlier for earlier, later in zip(chosen, chosen[1:])):
+            continue
+        if len(set(chosen)) == len(chosen) and max(chosen) - min(chosen) <= distance:
+            return True
+    return False
+
+
+@pytest.mark.parametrize('ordered', [False, True])
+@pytest.mark.parametrize('seed', range(3))
+def test_near_search_matches_a_scan(seed, ordered):
+    documents = _documents(seed + 10)
+    inverted_index, _ = _indexes(documents)
+    rnd = random.Random(seed)
+    for _ in range(40):
+        terms = rnd.choices(WORDS, k=rnd.randint(2, 3))
+        distance = rnd.randint(1, 6)
+        expected = [doc_id for doc_id, words in documents.items() if _in_window(words, terms, distance, ordered)]
+        assert list(near_search(terms, inverted_index, distance, ordered)) == expected, (terms, distance)
+
+
+@pytest.mark.parametrize('position_lists, distance, unordered, ordered', [
+    ([[0], [3]], 3, True, True),
+    ([[0], [4]], 3, False, False),
+    ([[5], [1]], 4, True, False),
+    ([[0, 10], [20, 12]], 2, True, True),
+    ([[1, 9], [3], [7]], 6, True, True),
+    ([[1, 9], [3], [7]], 5, False, False),
+    ([[9], [3], [7]], 6, True, False),
+    ([[2], [0, 4], [5]], 3, True, True),
+    ([[0], []], 5, False, False),
+])
+def test_window_match(position_lists, distance, unordered, ordered):
+    position_lists = [sorted(positions) for positions in position_lists]
+    assert window_match(position_lists, distance) == unordered
+    assert window_match(position_lists, distance, ordered=True) == ordered
+
+
+def test_ordered_window_needs_each_listed_occurrence():
+    inverted_index, _ = _indexes({1: ['a', 'b', 'a'], 2: ['a', 'b', 'b'], 3: ['b', 'a']})
+    assert list(near_search(['a', 'a'], inverted_index, 2, ordered=True)) == [1]
+    assert list(near_search(['a', 'a'], inverted_index, 2)) == [1, 2, 3]
+    assert list(near_search(['a', 'b'], inverted_index, 1, ordered=True)) == [1, 2]
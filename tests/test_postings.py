@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from ir_postings import BLOCK_SIZE, PositionalPostingList, PostingList
+
+# Posting list set algebra must agree with Python sets for every representation: plain
+# sorted IDs, compressed blocks (several of them, so skips are taken) and dense bitmaps.
+
+
+# Function to draw `count` distinct doc IDs below `span`
+def _ids(rnd: random.Random, count: int, span: int) -> set:
+    return set(rnd.sample(range(1, span), min(count, span - 1)))
+
+
+# (left, right) pairs: empty, sparse, dense (bitmap) and mixed, from one to many blocks
+def _pairs():
+    rnd = random.Random(7)
+    shapes = [(0, 10, 100), (5, 0, 100), (3, 4, 20), (40, 300, 5000), (2000, 2500, 6000),
+              (3 * BLOCK_SIZE, 5, 100000), (4000, 4000, 4500), (900, 20, 1000)]
+    for left, right, span in shapes:
+        yield _ids(rnd, left, span), _ids(rnd, right, span)
+
+
+def _plist(ids: set, compress: bool) -> PostingList:
+    return PostingList.from_sorted(sorted(ids), compress=compress)
+
+
+@pytest.mark.parametrize('left, right', list(_pairs()))
+@pytest.mark.parametrize('compress_left', [False, True])
+@pytest.mark.parametrize('compress_right', [False, True])
+def test_set_algebra_matches_set(left, right, compress_left, compress_right):
+    a = _plist(left, compress_left)
+    b = _plist(right, compress_right)
+    assert list(a & b) == sorted(left & right)
+    assert list(a | b) == sorted(left | right)
+    assert list(a - b) == sorted(left - right)
+    assert list(b - a) == sorted(right - left)
+    assert len(a & b) == len(left & right)
+    assert set(right) - a == right - left
+
+
+@pytest.mark.parametrize('left, right', list(_pairs()))
+def test_chained_operations_match_set(left, right):
+    rnd = random.Random(len(left) + len(right))
+    third = set(rnd.sample(sorted(left | right), len(left | right) // 2)) if left | right else set()
+    a, b, c = (_plist(ids, True) for ids in (left, right, third))
+    # Results of earlier operations (possibly bitmaps) feed the next ones
+    assert list((a | b) - c) == sorted((left | right) - third)
+    assert list((a - c) & (b | c)) == sorted((left - third) & (right | third))
+    assert list(a.intersection(b, c)) == sorted(left & right & third)
+    assert list(a.union(b, c)) == sorted(left | right | third)
+    assert list(a.difference(b, c)) == sorted(left - right - third)
+
+
+@pytest.mark.parametrize('left, right', list(_pairs()))
+def test_membership_and_cursor(left, right):
+    ids = left | right
+    plist = _plist(ids, True)
+    probes = sorted(ids)[::7] + [0, 1, 2, max(ids, default=0) + 1]
+    for doc_id in probes:
+        assert (doc_id in plist) == (doc_id in ids)
+    cursor = plist.cursor()
+    for target in sorted(probes):
+        assert cursor.seek(target) == min((doc_id for doc_id in ids if doc_id >= target), default=None)
+
+
+def test_positional_postings_round_trip():
+    rnd = random.Random(3)
+    postings = {doc_id: sorted(rnd.sample(range(500), rnd.randint(1, 6)))
+                for doc_id in _ids(rnd, 3 * BLOCK_SIZE, 2000)}
+    plist = PositionalPostingList.from_dict(postings)
+    assert list(plist) == sorted(postings)
+    assert dict(plist.items()) == postings
+    doc_id = sorted(postings)[BLOCK_SIZE + 1]
+    assert plist[doc_id] == postings[doc_id]
+    cursor = plist.frequency_cursor()
+    assert cursor.seek(doc_id) == doc_id and cursor.tf == len(postings[doc_id])
@@ -0,0 +1,122 @@
+import random
+from itertools import product
+
+import pytest
+
+from ir_postings import PostingList
+from ir_query import (And, Near, Not, Or, QueryEvaluator, QuerySyntaxError, Term, canonical, compile_query,
+                      normalize, parse_query, to_query_string)
+
+# Operator precedence is NEAR > NOT > AND > OR, and normalize() pushes NOT down to the
+# terms with De Morgan's laws (except for NOT (b AND c) beside a positive operand, which stays
+# a single difference) without changing which documents a query matches.
+
+a, b, c, d = Term('a'), Term('b'), Term('c'), Term('d')
+
+
+@pytest.mark.parametrize('query, tree', [
+    ('a OR b AND c', Or((a, And((b, c))))),
+    ('a AND b OR c AND d', Or((And((a, b)), And((c, d))))),
+    ('NOT a AND b', And((Not(a), b))),
+    ('NOT a OR b', Or((Not(a), b))),
+    ('a b OR c', Or((And((a, b)), c))),
+    ('a NOT b', And((a, Not(b)))),
+    ('(a OR b) AND c', And((Or((a, b)), c))),
+    ('NOT (a OR b)', Not(Or((a, b)))),
+    ('NOT NOT a', Not(Not(a))),
+    ('a NEAR/3 b OR c', Or((Near(('a', 'b'), 3, False), c))),
+    ('NOT a ONEAR/2 b c', And((Not(Near(('a', 'b'), 2, True)), c))),
+    ('a near/1 b NEAR/1 c', Near(('a', 'b', 'c'), 1, False)),
+    ('a and b or not c', Or((And((a, b)), Not(c)))),
+])
+def test_precedence(query, tree):
+    assert parse_query(query) == tree
+
+
+@pytest.mark.parametrize('query', [
+    'AND a', 'a OR', 'a AND AND b', '(a OR b', 'a OR b)', '()', 'NOT', 'a NEAR/2', 'NEAR/2 a',
+    'a NEAR/2 (b)', 'a NEAR/2 b ONEAR/2 c', 'goog* NEAR/3 b',
+])
+def test_syntax_errors(query):
+    with pytest.raises(QuerySyntaxError):
+        parse_query(query)
+
+
+def test_empty_query():
+    assert parse_query('   ') is None and compile_query('') is None
+
+
+@pytest.mark.parametrize('query, normalized', [
+    ('NOT (a AND b)', Or((Not(a), Not(b)))),
+    ('NOT (a OR b)', And((Not(a), Not(b)))),
+    ('NOT NOT a', a),
+    ('NOT (a OR NOT b)', And((Not(a), b))),
+    ('NOT (a AND (b OR NOT c))', Or((Not(a), And((Not(b), c))))),
+    ('a AND (b AND c) AND a', And((a, b, c))),
+    ('(a OR b) OR (c OR a)', Or((a, b, c))),
+    ('NOT (a NEAR/2 b)', Not(Near(('a', 'b'), 2, False))),
+    ('a AND NOT (b AND c)', And((a, Not(And((b, c)))))),
+    ('NOT (b AND c) AND a', And((a, Not(And((b, c)))))),
+    ('a AND NOT (b OR c)', And((a, Not(b), Not(c)))),
+    ('NOT (a AND b) AND NOT c', And((Not(c), Or((Not(a), Not(b)))))),
+    ('NOT (a AND b) AND NOT (c AND d)', And((Or((Not(a), Not(b))), Not(And((c, d)))))),
+    ('NOT (NOT a OR (b AND c))', And((a, Not(And((b, c)))))),
+])
+def test_de_morgan_normalization(query, normalized):
+    assert compile_query(query) == normalized
+
+
+def test_canonical_ignores_operand_order():
+    assert canonical(compile_query('(b OR a) AND c')) == canonical(compile_query('c AND (a OR b)'))
+    assert to_query_string(canonical(compile_query('c OR b AND a'))) == '((a AND b) OR c)'
+
+
+# Function to evaluate an AST with Python sets, without any normalization
+def _set_evaluate(node, postings: dict, universe: set) -> set:
+    if isinstance(node, Term):
+        return postings[node.text]
+    if isinstance(node, Not):
+        return universe - _set_evaluate(node.child, postings, universe)
+    results = [_set_evaluate(child, postings, universe) for child in node.children]
+    return set.intersection(*results) if isinstance(node, And) else set.union(*results)
+
+
+@pytest.mark.parametrize('query', [
+    'NOT (a AND b)', 'NOT (a OR b) AND c', 'a AND NOT (b OR NOT c)', 'NOT (NOT a OR NOT b) OR d',
+    'NOT a AND NOT b', '(a OR b) NOT (c AND d)', 'NOT (a AND (b OR NOT (c AND NOT d)))',
+    'a AND NOT (b AND c)', 'NOT (a AND b) AND NOT (c AND d)', 'NOT (NOT a OR (b AND NOT (c AND d)))',
+])
+def test_normalized_queries_match_the_same_documents(query):
+    rnd = random.Random(query)
+    universe = set(range(1, 200))
+    postings = {term: set(rnd.sample(sorted(universe), rnd.randint(0, 120))) for term in 'abcd'}
+    evaluator = QueryEvaluator(lambda text: PostingList.from_iterable(postings[text]),
+                               lambda: PostingList.from_iterable(universe))
+    expected = _set_evaluate(parse_query(query), postings, universe)
+    assert list(evaluator.evaluate(compile_query(query))) == sorted(expected)
+
+
+def test_planning_does_not_build_the_universe():
+    built = []
+    evaluator = QueryEvaluator(lambda text: PostingList.from_iterable([1, 2, 3] if text == 'a' else [2]),
+                               lambda: built.append(True) or PostingList.from_iterable(range(1, 10)))
+    node = compile_query('(a OR NOT b) AND (NOT a OR b)')
+    assert evaluator.estimate(node) > 0 and not built
+    assert list(evaluator.evaluate(compile_query('a AND NOT (a AND b)'))) == [1, 3] and not built
+
+
+# Every AND / OR / NOT combination of two terms normalizes to NOT only directly above terms
+@pytest.mark.parametrize('outer, inner, negate_left', list(product(['AND', 'OR'], ['AND', 'OR'], [False, True])))
+def test_normalized_negations_are_on_terms(outer, inner, negate_left):
+    left = 'NOT a' if negate_left else 'a'
+    node = normalize(parse_query(f"NOT ({left} {outer} NOT (b {inner} c))"))
+
+    def check(n):
+        if isinstance(n, Not):
+            assert isinstance(n.child, (Term, Near))
+        elif isinstance(n, (And, Or)):
+            for child in n.children:
+                assert type(child) is not type(n)
+                check(child)
+
+    check(node)
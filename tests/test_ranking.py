@@ -0,0 +1,107 @@
+import math
+import random
+
+import pytest
+
+from ir_postings import PostingList, compress_positional_index
+from ir_ranking import DEFAULT_B, DEFAULT_K1, idf, merge_statistics, merge_top_k, term_statistics, top_k
+from ir_storage import MappedIndex, save_index
+
+# top_k prunes with MaxScore; whatever it skips, it must return the same documents and
+# scores as scoring every document that contains a query term with BM25.
+
+VOCABULARY = [f"w{i}" for i in range(80)]
+# Zipf-like weights, so queries mix common terms (long lists, low bounds) with rare ones
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+QUERIES = [['w0'], ['w0', 'w1'], ['w0', 'w40'], ['w3', 'w17', 'w55', 'w79'], ['w1', 'w1', 'w2'],
+           ['w5', 'missing'], ['missing'], VOCABULARY[:12], ['w60', 'w70', 'w0', 'w2', 'w9']]
+
+
+@pytest.fixture(scope='module')
+def documents():
+    rnd = random.Random(11)
+    return {doc_id: rnd.choices(VOCABULARY, WEIGHTS, k=rnd.randint(1, 120)) for doc_id in range(1, 801)}
+
+
+@pytest.fixture(scope='module')
+def inverted_index(documents):
+    positions = {}
+    for doc_id, words in documents.items():
+        for pos, word in enumerate(words):
+            positions.setdefault(word, {}).setdefault(doc_id, []).append(pos)
+    return compress_positional_index(positions)
+
+
+# Function to score every candidate document with BM25 and sort by (score desc, doc ID)
+def _brute_force(terms, documents, k, doc_filter=None, k1=DEFAULT_K1, b=DEFAULT_B):
+    doc_count = len(documents)
+    avg_length = sum(len(words) for words in documents.values()) / doc_count
+    terms = list(dict.fromkeys(terms))
+    df = {term: sum(term in words for words in documents.values()) for term in terms}
+    scores = {}
+    for doc_id, words in documents.items():
+        if doc_filter is not None and doc_id not in doc_filter:
+            continue
+        score = 0.0
+        for term in terms:
+            tf = words.count(term)
+            if tf:
+                score += idf(doc_count, df[term]) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(words) / avg_length))
+        if score > 0:
+            scores[doc_id] = score
+    ranked = sorted(scores.items(), key=lambda item: (-round(item[1], 9), item[0]))
+    return [(doc_id, round(score, 9)) for doc_id, score in ranked[:k]]
+
+
+def _rounded(hits):
+    return [(hit.doc_id, round(hit.score, 9)) for hit in hits]
+
+
+@pytest.mark.parametrize('terms', QUERIES)
+@pytest.mark.parametrize('k', [1, 3, 10, 1000])
+def test_top_k_matches_brute_force(terms, k, documents, inverted_index):
+    assert _rounded(top_k(terms, inverted_index, k)) == _brute_force(terms, documents, k)
+
+
+@pytest.mark.parametrize('terms', QUERIES)
+def test_top_k_with_stored_bounds_matches_brute_force(terms, documents, inverted_index, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('ranking') / 'ranked.idx')
+    save_index(path, inverted_index, {doc_id: str(doc_id) for doc_id in documents})
+    index = MappedIndex(path)
+    for k in (1, 5, 50):
+        assert _rounded(top_k(terms, index, k)) == _brute_force(terms, documents, k)
+
+
+@pytest.mark.parametrize('terms', QUERIES[:5])
+def test_top_k_with_filter_matches_brute_force(terms, documents, inverted_index):
+    rnd = random.Random(len(terms))
+    allowed = set(rnd.sample(sorted(documents), 200))
+    doc_filter = PostingList.from_iterable(allowed)
+    assert _rounded(top_k(terms, inverted_index, 10, doc_filter)) == _brute_force(terms, documents, 10, allowed)
+
+
+@pytest.mark.parametrize('k1, b', [(0.5, 0.0), (2.0, 1.0), (1.2, 0.3)])
+def test_top_k_parameters_match_brute_force(k1, b, documents, inverted_index):
+    terms = ['w0', 'w4', 'w33']
+    assert _rounded(top_k(terms, inverted_index, 10, k1=k1, b=b)) == _brute_force(terms, documents, 10, k1=k1, b=b)
+
+
+def test_sharded_scores_match_unsharded(documents, inverted_index):
+    terms = ['w0', 'w7', 'w21']
+    shards = []
+    for first, last in ((1, 300), (301, 550), (551, 800)):
+        positions = {}
+        for doc_id in range(first, last + 1):
+            for pos, word in enumerate(documents[doc_id]):
+                positions.setdefault(word, {}).setdefault(doc_id, []).append(pos)
+        shards.append(compress_positional_index(positions))
+    global_stats = merge_statistics(term_statistics(terms, shard) for shard in shards)
+    merged = merge_top_k([top_k(terms, shard, 10, global_stats=global_stats) for shard in shards], 10)
+    assert [hit.doc_id for hit in merged] == [doc_id for doc_id, _ in _brute_force(terms, documents, 10)]
+    assert all(math.isclose(hit.score, score) for hit, (_, score) in zip(merged, _brute_force(terms, documents, 10)))
+
+
+def test_no_terms_or_no_k():
+    index = compress_positional_index({'a': {1: [0]}})
+    assert top_k([], index) == [] and top_k(['a'], index, 0) == [] and top_k(['b'], index) == []
@@ -0,0 +1,106 @@
+import os
+import random
+
+from ir_segments import MANIFEST, TOMBSTONE_LOG, SegmentedIndex
+
+# After any sequence of adds, deletes, updates, flushes and merges, a snapshot must match an
+# index built from scratch over the live documents; deleted documents must never reappear.
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+
+
+# Function to invert {doc_id: text} the way a fresh build would: {term: {doc_id: positions}}
+def _expected(documents: dict) -> dict:
+    index = {}
+    for doc_id, text in documents.items():
+        for pos, word in enumerate(text.split()):
+            index.setdefault(word, {}).setdefault(doc_id, []).append(pos)
+    return index
+
+
+# Function to check that a snapshot holds exactly the live documents
+def _check(index: SegmentedIndex, documents: dict):
+    snapshot = index.snapshot()
+    assert list(snapshot.doc_ids) == sorted(documents)
+    assert sorted(snapshot.doc_table) == sorted(documents)
+    expected = _expected(documents)
+    actual = {term: dict(snapshot[term].items()) for term in snapshot if snapshot[term]}
+    assert actual == expected
+    biwords = {}
+    for doc_id, text in documents.items():
+        words = text.split()
+        for first, second in zip(words, words[1:]):
+            biwords.setdefault(f"{first} {second}", set()).add(doc_id)
+    view = snapshot.biword_index
+    assert {biword: set(view[biword]) for biword in view if view[biword]} == biwords
+
+
+def _random_text(rnd: random.Random) -> str:
+    return ' '.join(rnd.choices(WORDS, k=rnd.randint(1, 12)))
+
+
+def test_updates_and_deletes_match_a_fresh_build():
+    rnd = random.Random(7)
+    index = SegmentedIndex(None, str.split, flush_threshold=5, merge_factor=3, background_merge=False)
+    documents = {}
+    for step in range(200):
+        action = rnd.random()
+        if action < 0.6 or not documents:
+            text = _random_text(rnd)
+            documents[index.add_document(text)] = text
+        elif action < 0.8:
+            doc_id = rnd.choice(sorted(documents))
+            assert index.delete_document(doc_id)
+            del documents[doc_id]
+        else:
+            doc_id = rnd.choice(sorted(documents))
+            documents[doc_id] = _random_text(rnd)
+            index.update_document(doc_id, documents[doc_id])
+        if step % 25 == 0:
+            _check(index, documents)
+            index.maybe_merge()
+    _check(index, documents)
+    index.force_merge()
+    assert len(index.snapshot().segments) == 1
+    _check(index, documents)
+    assert not index.delete_document(10_000)
+    index.close()
+
+
+def test_snapshot_is_unchanged_by_later_deletes():
+    index = SegmentedIndex(None, str.split, background_merge=False)
+    first = index.add_document('alpha beta')
+    second = index.add_document('alpha gamma')
+    snapshot = index.snapshot()
+    index.delete_document(first)
+    index.force_merge()
+    assert list(snapshot['alpha']) == [first, second]
+    assert list(index.snapshot()['alpha']) == [second]
+    assert 'beta' not in index.snapshot() or not index.snapshot()['beta']
+    index.close()
+
+
+def test_tombstones_survive_a_restart(tmp_path):
+    directory = str(tmp_path / 'segments')
+    index = SegmentedIndex(directory, str.split, flush_threshold=2, background_merge=False)
+    documents = {}
+    for text in ['alpha beta', 'beta gamma', 'gamma delta', 'delta alpha', 'alpha alpha']:
+        documents[index.add_document(text, name=text.replace(' ', '-'))] = text
+    index.flush()
+    deleted = sorted(documents)[1]
+    index.delete_document(deleted)
+    del documents[deleted]
+    # The deletion is only in the tombstone log until the manifest is next rewritten
+    with open(os.path.join(directory, TOMBSTONE_LOG)) as log:
+        assert log.read().split()[-1] == str(deleted)
+    index.close()
+
+    reopened = SegmentedIndex(directory, str.split, background_merge=False)
+    _check(reopened, documents)
+    assert reopened.snapshot().doc_table[sorted(documents)[0]] == 'alpha-beta'
+    # Doc IDs are never reused, so a new document cannot pick up the old tombstone
+    assert reopened.add_document('epsilon') > max(documents) and reopened.add_document('zeta') != deleted
+    reopened.force_merge()
+    files = sorted(name for name in os.listdir(directory) if name.endswith('.idx'))
+    assert len(files) == 1 and os.path.exists(os.path.join(directory, MANIFEST))
+    reopened.close()
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ir_engine import SearchEngine
+from ir_server import QueryServer
+
+# The server answers /search, /health and /stats over HTTP/1.1 keep-alive connections,
+# evaluates queries on its pool and maps bad requests, overload and slow queries to 4xx/5xx.
+
+
+# Function to send requests over one connection and read back (status, payload) per request
+async def _exchange(port: int, requests: list) -> list:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    responses = []
+    try:
+        for method, path, body in requests:
+            data = json.dumps(body).encode('utf-8') if isinstance(body, dict) else (body or b'')
+            writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n"
+                         .encode('latin-1') + data)
+            await writer.drain()
+            head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+            headers = dict(line.split(': ', 1) for line in head[1:] if line)
+            payload = json.loads(await reader.readexactly(int(headers['Content-Length'])))
+            responses.append((int(head[0].split(' ')[1]), payload))
+    finally:
+        writer.close()
+    return responses
+
+
+# Function to run a server on a free port for the duration of some client requests
+def _serve(server: QueryServer, requests: list) -> list:
+    async def run():
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        async with listener:
+            return await _exchange(listener.sockets[0].getsockname()[1], requests)
+
+    return asyncio.run(run())
+
+
+def test_search_health_and_stats(tmp_path, analyzer, corpus):
+    engine = SearchEngine.open(corpus, str(tmp_path / 'corpus.idx'))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        server = QueryServer(engine, executor)
+        responses = _serve(server, [
+            ('GET', '/health', None),
+            ('POST', '/search', {'query': 'search AND engine'}),
+            ('POST', '/search', {'type': 'phrase', 'query': 'search engine', 'offset': 1, 'limit': 2}),
+            ('POST', '/search', {'type': 'proximity', 'query': 'google engine', 'distance': 3}),
+            ('GET', '/stats', None),
+        ])
+    (health, _), (status, boolean), (_, phrase), (_, proximity), (_, stats) = responses
+    assert health == 200 and status == 200
+    assert [hit['doc_id'] for hit in boolean['results']] == list(engine.search('boolean', 'search AND engine'))
+    assert boolean['results'][0]['name'] == '01-google.txt'
+    assert phrase['count'] == 4 and [hit['doc_id'] for hit in phrase['results']] == [2, 5]
+    assert [hit['doc_id'] for hit in proximity['results']] == [1, 8]
+    assert stats['documents'] == 7 and stats['counters']['searches'] == 3
+    assert stats['latency']['boolean']['count'] == 1
+
+
+def test_request_errors(tmp_path, analyzer, corpus):
+    engine = SearchEngine.open(corpus, str(tmp_path / 'corpus.idx'))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        responses = _serve(QueryServer(engine, executor), [
+            ('POST', '/search', b'{not json'),
+            ('POST', '/search', {'type': 'fuzzy', 'query': 'x'}),
+            ('POST', '/search', {'query': '(google AND'}),
+            ('POST', '/search', {'query': 'google', 'limit': 'ten'}),
+            ('GET', '/search', None),
+            ('GET', '/missing', None),
+            ('GET', '/health', None),
+        ])
+    assert [status for status, _ in responses] == [400, 400, 400, 400, 405, 404, 200]
+    assert all('error' in payload for _, payload in responses[:-1])
+
+
+# An engine whose queries take longer than the server's timeout
+class _SlowEngine(SearchEngine):
+    def search(self, query_type, query, distance=None, ordered=False):
+        time.sleep(0.5)
+        return super().search(query_type, query, distance, ordered)
+
+
+def test_overload_and_timeouts(tmp_path, analyzer, corpus):
+    engine = SearchEngine.open(corpus, str(tmp_path / 'corpus.idx'))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        busy = _serve(QueryServer(engine, executor, max_pending=0), [('POST', '/search', {'query': 'google'})])
+        slow = QueryServer(_SlowEngine(engine.inverted_index), executor, timeout=0.1)
+        timed_out = _serve(slow, [('POST', '/search', {'query': 'google'})])
+    assert busy[0][0] == 503
+    assert timed_out[0][0] == 504 and slow.counters['timeouts'] == 1
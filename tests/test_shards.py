@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import ir_assQ2
+from ir_engine import SearchEngine
+from ir_query import QuerySyntaxError
+from ir_shards import ShardedEngine, shard_paths, shard_ranges
+
+# A sharded engine must answer every query exactly like one index over the whole corpus:
+# per-shard results concatenate in doc-ID order, and ranked queries score with the
+# collection-wide statistics the coordinator gathers, so even the BM25 scores agree.
+
+QUERIES = [
+    ('boolean', 'google AND NOT yahoo'),
+    ('boolean', 'search OR phone'),
+    ('boolean', 'NOT engine'),
+    ('phrase', 'search engine'),
+    ('proximity', 'google search 3'),
+    ('proximity', 'engine search 2'),
+    ('soundex', 'gogle'),
+    ('soundex', 'lehri OR phone'),
+    ('boolean', 'missing'),
+]
+
+RANKED = [('search engine', 3, None), ('google results', 10, None), ('search', 10, 'NOT google'), ('missing', 5, None)]
+
+
+def test_shard_ranges():
+    assert shard_ranges(8, 3) == [(1, 2), (3, 5), (6, 8)]
+    assert shard_ranges(2, 4) == [(1, 0), (1, 1), (2, 1), (2, 2)]
+    for doc_count, shard_count in [(8, 3), (10, 4), (3, 5), (0, 2)]:
+        ranges = shard_ranges(doc_count, shard_count)
+        covered = [doc_id for first, last in ranges for doc_id in range(first, last + 1)]
+        assert covered == list(range(1, doc_count + 1))
+
+
+@pytest.mark.parametrize('shard_count', [3, 10])
+def test_sharded_engine_matches_one_index(tmp_path, analyzer, corpus, shard_count):
+    engine = SearchEngine.open(corpus, str(tmp_path / 'corpus.idx'))
+    sharded = ShardedEngine.open(corpus, shard_count, index_dir=str(tmp_path), tokenizer='regex', lemmatizer='none')
+    try:
+        assert all(os.path.exists(path) for path in shard_paths(corpus, shard_count, str(tmp_path)))
+        assert sharded.doc_table == engine.doc_table
+        assert sharded.name(7) == '07-gogle.txt'
+        for query_type, query in QUERIES:
+            assert list(sharded.search(query_type, query)) == list(engine.search(query_type, query)), query
+        for query, k, boolean_filter in RANKED:
+            expected = ir_assQ2.ranked_search(query, engine.inverted_index, k, boolean_filter)
+            result = sharded.ranked(query, k, boolean_filter)
+            assert [hit.doc_id for hit in result] == [hit.doc_id for hit in expected], query
+            assert [hit.score for hit in result] == pytest.approx([hit.score for hit in expected])
+        with pytest.raises(QuerySyntaxError):
+            sharded.search('fuzzy', 'google')
+    finally:
+        sharded.close()
@@ -0,0 +1,59 @@
+import pytest
+
+import ir_assQ2
+from ir_phonetic import PhoneticIndex, soundex
+from ir_postings import PostingList, compress_positional_index
+from ir_storage import MappedIndex, save_index
+
+# Sound-alike queries: names match every term with the same phonetic code; AND / OR combine
+# left to right, "a AND NOT b" is a difference and a leading NOT complements against all documents.
+
+DOCUMENTS = {1: ['google', 'search'], 2: ['gogle', 'engine'], 3: ['yahoo', 'search'], 4: ['lehri'],
+             5: ['stainford', 'lehri'], 6: ['yahu']}
+
+
+@pytest.fixture
+def index():
+    positions = {}
+    for doc_id, words in DOCUMENTS.items():
+        for pos, word in enumerate(words):
+            positions.setdefault(word, {}).setdefault(doc_id, []).append(pos)
+    return compress_positional_index(positions)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('gugel', [1, 2]),
+    ('google OR yahoo', [1, 2, 3, 6]),
+    ('search AND yahoo', [3]),
+    ('lehri AND NOT stainford', [4]),
+    ('NOT google', [3, 4, 5, 6]),
+    ('NOT yahoo AND search', [1]),
+    ('google OR NOT lehri', [1, 2, 3, 6]),
+    ('NOT NOT google', [1, 2]),
+    ('search AND NOT NOT yahoo', [3]),
+])
+def test_soundex_boolean_search(index, query, expected):
+    assert soundex('gugel') == soundex('google')
+    assert list(ir_assQ2.soundex_boolean_search(query, index, PhoneticIndex(index), cache=None)) == expected
+
+
+@pytest.mark.parametrize('query', ['', 'not', 'and or'])
+def test_queries_without_names_give_an_empty_posting_list(index, query):
+    result = ir_assQ2.soundex_boolean_search(query, index, PhoneticIndex(index), cache=None)
+    assert isinstance(result, PostingList) and not result
+
+
+def test_single_name_lookup(index):
+    phonetic_index = PhoneticIndex(index)
+    assert sorted(phonetic_index.terms('yahoo')) == ['yahoo', 'yahu']
+    assert list(ir_assQ2.soundex_search_single('yahoo', index, phonetic_index)) == [3, 6]
+    assert list(ir_assQ2.soundex_search_single('xqzv', index, phonetic_index)) == []
+
+
+def test_complements_on_a_mapped_index(tmp_path, index):
+    path = str(tmp_path / 'names.idx')
+    save_index(path, index, {doc_id: str(doc_id) for doc_id in [*DOCUMENTS, 7]})
+    mapped = MappedIndex(path)
+    # Doc 7 has no names: the live documents come from the doc table, not the postings
+    assert list(ir_assQ2.soundex_boolean_search('NOT google', mapped, PhoneticIndex(mapped), cache=None)) == \
+        [3, 4, 5, 6, 7]
@@ -0,0 +1,149 @@
+import os
+import random
+
+import pytest
+
+from ir_dictionary import BiwordIndex, TermIds, pack_pair
+from ir_postings import compress_index, compress_positional_index
+from ir_ranking import index_statistics
+from ir_storage import (SNIPPET_CHARS, DocumentStore, MappedIndex, load_index, load_or_build_document_store,
+                        save_document_store, save_index)
+
+# save_index followed by MappedIndex must give back exactly what was saved: the terms and
+# their postings (with positions), the biwords, the doc table and the ranking statistics.
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta', 'iota', 'kappa',
+         'lambda', 'mu', 'über', 'naïve', 'a', 'ab', 'abc', 'abd', 'b'] + [f"term{i:03d}" for i in range(60)]
+
+
+# Function to make a small corpus of analyzed documents: {doc_id: [terms]}
+def _documents(seed: int = 1, count: int = 300) -> dict:
+    rnd = random.Random(seed)
+    # Doc 5 has no terms at all, like a document made only of stopwords
+    return {doc_id: [] if doc_id == 5 else rnd.choices(WORDS, k=rnd.randint(1, 40))
+            for doc_id in range(1, count + 1)}
+
+
+# Function to invert documents the way ir_assQ2.build_inverted_index does
+def _invert(documents: dict):
+    positions = {}
+    term_ids = TermIds()
+    biwords = {}
+    for doc_id, words in documents.items():
+        for pos, word in enumerate(words):
+            positions.setdefault(word, {}).setdefault(doc_id, []).append(pos)
+        ids = term_ids.add_all(words)
+        for pair in set(map(pack_pair, ids, ids[1:])):
+            biwords.setdefault(pair, set()).add(doc_id)
+    return compress_positional_index(positions), BiwordIndex(term_ids, compress_index(biwords))
+
+
+@pytest.fixture
+def documents():
+    return _documents()
+
+
+def test_positional_round_trip(tmp_path, documents):
+    inverted_index, biword_index = _invert(documents)
+    doc_table = {doc_id: f"corpus/{doc_id}.txt" for doc_id in documents}
+    path = str(tmp_path / 'test.idx')
+    save_index(path, inverted_index, doc_table, biword_index, meta={'analyzer': 'test'})
+
+    index = MappedIndex(path)
+    assert index.meta == {'analyzer': 'test'}
+    assert index.doc_table == doc_table
+    assert list(index.doc_ids) == sorted(doc_table)
+    assert list(index) == sorted(inverted_index)
+    for term, postings in inverted_index.items():
+        assert term in index
+        assert dict(index[term].items()) == dict(postings.items())
+    assert 'missing' not in index and index.get('missing') is None
+
+    assert sorted(index.biword_index) == sorted(biword_index)
+    for biword in biword_index:
+        assert list(index.biword_index[biword]) == list(biword_index[biword])
+    assert 'alpha missing' not in index.biword_index
+
+    lengths, bounds = index_statistics(inverted_index)
+    assert index.doc_lengths[5] == 0
+    assert {doc_id: index.doc_lengths[doc_id] for doc_id in lengths} == lengths
+    assert {term: index.term_bounds(term) for term in index} == bounds
+
+
+def test_plain_dict_biwords_round_trip(tmp_path, documents):
+    inverted_index, biword_index = _invert(documents)
+    plain = {biword: set(biword_index[biword]) for biword in biword_index}
+    path = str(tmp_path / 'plain.idx')
+    save_index(path, inverted_index, {doc_id: str(doc_id) for doc_id in documents}, plain)
+    index = MappedIndex(path)
+    assert {biword: set(index.biword_index[biword]) for biword in index.biword_index} == plain
+
+
+def test_doc_id_only_round_trip(tmp_path, documents):
+    inverted_index = compress_index({word: {doc_id for doc_id, words in documents.items() if word in words}
+                                     for word in WORDS})
+    path = str(tmp_path / 'flat.idx')
+    save_index(path, inverted_index, {doc_id: str(doc_id) for doc_id in documents})
+    index = MappedIndex(path)
+    assert {term: list(index[term]) for term in index} == {term: list(p) for term, p in inverted_index.items()}
+    assert index.biword_index is None
+    assert index.doc_lengths is None and index.term_bounds('alpha') is None
+
+
+def test_load_index_rejects_stale_and_damaged_files(tmp_path, documents):
+    inverted_index, biword_index = _invert(documents)
+    path = str(tmp_path / 'test.idx')
+    save_index(path, inverted_index, {1: 'one'}, biword_index, meta={'analyzer': 'regex-none-n'})
+    assert load_index(path, analyzer='regex-none-n') is not None
+    assert load_index(path, analyzer='nltk-wordnet-n') is None
+    assert load_index(str(tmp_path / 'missing.idx')) is None
+    with open(path, 'r+b') as file:
+        file.write(b'NOTANIDX')
+    assert load_index(path) is None
+
+
+def test_mapped_posting_lists_stay_decoded(tmp_path, documents):
+    inverted_index, biword_index = _invert(documents)
+    path = str(tmp_path / 'test.idx')
+    save_index(path, inverted_index, {doc_id: str(doc_id) for doc_id in documents}, biword_index)
+    index = MappedIndex(path)
+    postings = index['alpha']
+    assert postings.dense
+    # The bitmap built by the first query is reused by the next one
+    assert list(postings & index['beta']) == sorted(set(postings) & set(index['beta']))
+    assert index['alpha'] is postings and postings.bits is postings.bits
+
+
+def test_document_store_round_trip(tmp_path):
+    long_text = '\n'.join(f"line {i} " + 'x' * 100 for i in range(10))
+    documents = [(9, 'corpus/nine.txt', '  first line\nsecond line\nthird line\n'),
+                 (2, 'corpus/sub/naïve.txt', 'über alles'),
+                 (4, 'long.txt', long_text),
+                 (5, 'empty.txt', '')]
+    path = str(tmp_path / 'docs.store')
+    save_document_store(path, iter(documents), file_ids={'nine.txt': 'drive-9'}, meta={'corpus': 1})
+
+    store = DocumentStore(path)
+    assert store.meta == {'corpus': 1}
+    assert list(store) == [2, 4, 5, 9] and len(store) == 4 and 9 in store and 3 not in store
+    assert store[9] == 'first line\nsecond line\nthird line'
+    assert store.name(2) == 'naïve.txt' and store[2] == 'über alles'
+    nine = store.preview(9)
+    assert (nine.name, nine.snippet, nine.drive_id) == ('nine.txt', 'first line\nsecond line', 'drive-9')
+    assert store.preview(2).drive_id is None
+    assert len(store.preview(4).snippet) <= SNIPPET_CHARS and store[4] == long_text
+    assert store[5] == '' and store.preview(5).snippet == ''
+    with pytest.raises(KeyError):
+        store[3]
+
+
+def test_document_store_follows_the_corpus(tmp_path, corpus):
+    path = str(tmp_path / 'corpus.docs')
+    store = load_or_build_document_store(path, corpus)
+    assert len(store) == 8 and store.name(1) == '01-google.txt' and store[3] == ''
+    mtime = os.stat(path).st_mtime_ns
+    assert len(load_or_build_document_store(path, corpus)) == 8 and os.stat(path).st_mtime_ns == mtime
+    with open(os.path.join(corpus, '09-new.txt'), 'w', encoding='utf-8') as file:
+        file.write('A new document.')
+    store = load_or_build_document_store(path, corpus)
+    assert len(store) == 9 and store[9] == 'A new document.'
@@ -0,0 +1,77 @@
+import re
+
+import pytest
+
+from ir_postings import compress_index
+from ir_query import QuerySyntaxError
+from ir_storage import MappedIndex, save_index
+from ir_terms import (DEFAULT_EDITS, Expansion, TermDictionary, expand_postings, expand_terms, parse_expansion,
+                      term_dictionary_for)
+
+# Wildcard and fuzzy operands expand over the sorted term dictionary of an index.
+
+VOCABULARY = ['google', 'goggle', 'gogle', 'good', 'goods', 'go', 'engine', 'engines', 'engineer', 'search',
+              'searching', 'research', 'über', 'naïve', 'zebra', 'a', 'ab', 'abc', 'b', 'bb']
+
+
+def test_mapped_dictionary_is_read_in_stored_order(tmp_path):
+    path = str(tmp_path / 'terms.idx')
+    save_index(path, compress_index({term: [i + 1] for i, term in enumerate(VOCABULARY)}), {1: 'one'})
+    assert term_dictionary_for(MappedIndex(path)).terms == sorted(VOCABULARY)
+
+
+# Function to compute the Levenshtein distance the slow way, to check the trie walk against
+def _levenshtein(a: str, b: str) -> int:
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j in range(1, len(b) + 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (char != b[j - 1]))
+    return row[-1]
+
+
+@pytest.mark.parametrize('pattern', ['goo*', 'go*', 'g*gle', '*gle', '*ing', 'eng*s', '*ear*', 'a*', '*ab',
+                                     'ab*c', 'über*', '*ïve', 'zebra*', 'x*', '*xyz*'])
+def test_wildcard_matches_brute_force(pattern):
+    matcher = re.compile('.*'.join(map(re.escape, pattern.split('*'))))
+    expected = sorted(term for term in VOCABULARY if matcher.fullmatch(term))
+    assert TermDictionary(VOCABULARY).wildcard(pattern) == expected
+
+
+def test_wildcard_needs_a_prefix_or_a_gram():
+    dictionary = TermDictionary(VOCABULARY)
+    for pattern in ['*a*', '*b', '*ab*', '*a*b*']:
+        with pytest.raises(QuerySyntaxError):
+            dictionary.wildcard(pattern)
+    # A prefix alone narrows the candidates even without a full gram
+    assert dictionary.wildcard('a*b*c') == ['abc']
+
+
+@pytest.mark.parametrize('word', ['gogle', 'google', 'engin', 'serch', 'x', 'ab', 'naive', 'uber', ''])
+@pytest.mark.parametrize('max_edits', [0, 1, 2])
+def test_fuzzy_matches_brute_force(word, max_edits):
+    expected = sorted((term, _levenshtein(word, term)) for term in VOCABULARY
+                      if _levenshtein(word, term) <= max_edits)
+    assert sorted(TermDictionary(VOCABULARY).fuzzy(word, max_edits)) == expected
+    assert TermDictionary([]).fuzzy(word, max_edits) == []
+
+
+def test_parse_expansion():
+    assert parse_expansion('Google') is None
+    assert parse_expansion('GOO*') == Expansion('wildcard', 'goo*', 0)
+    assert parse_expansion('gogle~') == Expansion('fuzzy', 'gogle', DEFAULT_EDITS)
+    assert parse_expansion('gogle~2') == Expansion('fuzzy', 'gogle', 2)
+    for word in ['***', 'go*~1', '~1', 'gogle~3', 'gogle~x']:
+        with pytest.raises(QuerySyntaxError):
+            parse_expansion(word)
+
+
+def test_expansions_are_capped_closest_and_most_frequent_first():
+    index = compress_index({'gogle': [1], 'google': [1, 2, 3], 'goggle': [2], 'goggles': [1, 2, 3, 4],
+                            'giggle': [5], 'engine': [6]})
+    assert sorted(expand_terms(parse_expansion('gogle~2'), index)) == ['giggle', 'goggle', 'goggles', 'gogle',
+                                                                       'google']
+    assert expand_terms(parse_expansion('gogle~2'), index, max_expansions=3) == ['gogle', 'google', 'goggle']
+    assert expand_terms(parse_expansion('g*gle*'), index, max_expansions=2) == ['goggles', 'google']
+    assert list(expand_postings(parse_expansion('go*'), index)) == [1, 2, 3, 4]
+    assert list(expand_postings(parse_expansion('zz*'), index)) == []